@@ -1,21 +1,32 @@
 import os
+import hashlib
 import logging
 from functools import lru_cache
+from typing import Optional
 
-import firebase_admin
-from firebase_admin import auth, credentials
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
+from app.auth.key_store import get_key_store
+from app.core.config import get_settings
+from app.utils.cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 # Removed @lru_cache() as it was causing issues with environment variable changes
 def get_firebase_app():
+    # The SDK is imported on first use (normally during the lifespan warm-up)
+    # rather than on the app's import path.
+    import firebase_admin
+    from firebase_admin import credentials
+
     # Check if the app is already initialized to prevent errors in hot-reload environments.
     if not firebase_admin._apps:
-        logger.info(f"Initializing Firebase Admin SDK...")
-        logger.info(f"GOOGLE_APPLICATION_CREDENTIALS: {os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')}")
-        logger.info(f"GOOGLE_CLOUD_PROJECT: {os.environ.get('GOOGLE_CLOUD_PROJECT')}")
+        logger.info("Initializing Firebase Admin SDK...")
+        logger.info(
+            "GOOGLE_APPLICATION_CREDENTIALS: %s", os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+        )
+        logger.info("GOOGLE_CLOUD_PROJECT: %s", os.environ.get('GOOGLE_CLOUD_PROJECT'))
 
         # In a production (Cloud Run) environment, GOOGLE_APPLICATION_CREDENTIALS
         # will be set to the path of the service account key file.
@@ -25,16 +36,50 @@ def get_firebase_app():
             firebase_admin.initialize_app(cred, {'projectId': os.environ.get('GOOGLE_CLOUD_PROJECT')})
             logger.info("Firebase Admin SDK initialized successfully.")
         except Exception as e:
-            logger.error(f"Error initializing Firebase Admin SDK: {e}")
+            logger.error("Error initializing Firebase Admin SDK: %s", e)
             raise
     return firebase_admin.get_app()
 
+@lru_cache()
+def get_token_cache() -> Optional[TTLCache]:
+    """
+    Returns the process-wide cache of decoded ID tokens, or None when disabled.
+
+    Entries are keyed by a SHA-256 digest of the raw token so the tokens
+    themselves are never kept in memory, and expire at the token's `exp` claim.
+    """
+    max_size = get_settings().TOKEN_CACHE_MAX_SIZE
+    if max_size <= 0:
+        return None
+    return TTLCache(maxsize=max_size)
+
+
+def _token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def cached_uid(token: str) -> Optional[str]:
+    """
+    Returns the UID of a token `verify_token` has already verified, or None.
+
+    Only consults the token cache, so it is cheap enough for middleware; a
+    None result says nothing about the token's validity.
+    """
+    token_cache = get_token_cache()
+    if token_cache is None:
+        return None
+    cached_token = token_cache.get(_token_cache_key(token))
+    return cached_token.get("uid") if cached_token is not None else None
+
+
 def verify_token(token: str = Depends(OAuth2PasswordBearer(tokenUrl="token"))):
     """
     Verifies a Firebase ID token and returns the decoded token (user payload).
 
     This function is a dependency that can be used in FastAPI endpoints to protect them.
     """
+    from firebase_admin import auth
+
     if not token:
         logger.info("No token provided.")
         raise HTTPException(
@@ -42,21 +87,35 @@ def verify_token(token: str = Depends(OAuth2PasswordBearer(tokenUrl="token"))):
             detail="Missing authentication token",
         )
 
+    token_cache = get_token_cache()
+    cache_key = _token_cache_key(token) if token_cache is not None else None
+    if token_cache is not None:
+        cached_token = token_cache.get(cache_key)
+        if cached_token is not None:
+            return dict(cached_token)
+
     try:
-        logger.info(f"Attempting to verify token: {token[:30]}...") # Log first 30 chars of token
         # Ensure the Firebase app is initialized before trying to use it.
-        get_firebase_app()
-        decoded_token = auth.verify_id_token(token)
-        logger.info(f"Token verified successfully for user: {decoded_token.get('uid')}")
+        firebase_app = get_firebase_app()
+        if os.environ.get("FIREBASE_AUTH_EMULATOR_HOST"):
+            decoded_token = auth.verify_id_token(token)
+        else:
+            # Verify locally against the prefetched signing certificates.
+            decoded_token = get_key_store().verify_id_token(
+                token, firebase_app.project_id or get_settings().GOOGLE_CLOUD_PROJECT
+            )
+        logger.info("Token verified successfully for user: %s", decoded_token.get('uid'))
+        if token_cache is not None and "exp" in decoded_token:
+            token_cache.set(cache_key, dict(decoded_token), float(decoded_token["exp"]))
         return decoded_token
     except auth.InvalidIdTokenError as e:
-        logger.error(f"Invalid Firebase ID token: {e}")
+        logger.error("Invalid Firebase ID token: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token"
         )
     except Exception as e:
         # Catch other potential Firebase errors
-        logger.error(f"Unexpected error during token verification: {e}")
+        logger.error("Unexpected error during token verification: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error verifying token: {e}",
@@ -0,0 +1,253 @@
+import abc
+import json
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+import httpx
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Public certificates Google uses to sign Firebase ID tokens.
+ID_TOKEN_CERT_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+# Refresh once this fraction of the Cache-Control max-age has elapsed.
+REFRESH_RATIO = 0.8
+# Bounds for the refresh interval, in seconds.
+MIN_REFRESH_INTERVAL = 60
+DEFAULT_REFRESH_INTERVAL = 3600
+RETRY_INTERVAL = 30
+# Minimum time between reloads triggered by a token with an unknown key ID.
+MIN_REFETCH_INTERVAL = 30
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class KeyStore(abc.ABC):
+    """
+    Holds the public certificates used to verify Firebase ID tokens.
+
+    Subclasses only need to implement `load()`; verification happens locally
+    against the certificates currently held, so the request path normally
+    performs no network I/O. A token signed with a key ID the store does not
+    hold (after Google rotates its keys, or if the first load failed) triggers
+    a reload, at most once per `refetch_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        refetch_interval: float = MIN_REFETCH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._certs: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.refetch_interval = refetch_interval
+        self._clock = clock
+        self._last_refetch: Optional[float] = None
+        self._refetch_lock = threading.Lock()
+        self._started = False
+
+    @abc.abstractmethod
+    def load(self) -> None:
+        """(Re)loads the certificates."""
+
+    def start(self) -> None:
+        """Loads the certificates and starts any background refresh. Idempotent."""
+        if self._started:
+            return
+        self._started = True
+        self.load()
+
+    def stop(self) -> None:
+        """Stops any background refresh."""
+        self._started = False
+
+    def get_certs(self) -> Dict[str, str]:
+        with self._lock:
+            return self._certs
+
+    def _set_certs(self, certs: Dict[str, str]) -> None:
+        with self._lock:
+            self._certs = certs
+
+    def verify_id_token(
+        self, token: str, project_id: str, clock_skew_seconds: int = 0
+    ) -> dict:
+        """
+        Verifies a Firebase ID token against the held certificates.
+
+        Performs the same checks as `firebase_admin.auth.verify_id_token`
+        (signature, algorithm, audience, issuer, subject and expiry) and raises
+        the same `InvalidIdTokenError`/`ExpiredIdTokenError` exceptions.
+        """
+        # Imported here to keep the Firebase SDK off the app's import path;
+        # the lifespan handler loads it while warming up Firebase.
+        from firebase_admin import auth
+        from google.auth import jwt
+
+        try:
+            header = jwt.decode_header(token)
+        except ValueError as e:
+            raise auth.InvalidIdTokenError(str(e), cause=e)
+
+        kid = header.get("kid")
+        if not kid:
+            raise auth.InvalidIdTokenError('Firebase ID token has no "kid" claim.')
+        if header.get("alg") != "RS256":
+            raise auth.InvalidIdTokenError(
+                f'Firebase ID token has incorrect algorithm. Expected "RS256" but got '
+                f'"{header.get("alg")}".'
+            )
+
+        cert = self.get_certs().get(kid)
+        if cert is None and self._refetch():
+            cert = self.get_certs().get(kid)
+        if cert is None:
+            raise auth.InvalidIdTokenError(
+                f'Firebase ID token has an unknown "kid" claim: {kid}.'
+            )
+
+        try:
+            claims = jwt.decode(
+                token,
+                certs={kid: cert},
+                audience=project_id,
+                clock_skew_in_seconds=clock_skew_seconds,
+            )
+        except ValueError as e:
+            if "Token expired" in str(e):
+                raise auth.ExpiredIdTokenError(str(e), cause=e)
+            raise auth.InvalidIdTokenError(str(e), cause=e)
+
+        expected_issuer = ID_TOKEN_ISSUER_PREFIX + project_id
+        if claims.get("iss") != expected_issuer:
+            raise auth.InvalidIdTokenError(
+                f'Firebase ID token has incorrect "iss" (issuer) claim. Expected '
+                f'"{expected_issuer}" but got "{claims.get("iss")}".'
+            )
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise auth.InvalidIdTokenError(
+                'Firebase ID token has an invalid "sub" (subject) claim.'
+            )
+
+        claims["uid"] = subject
+        return claims
+
+    def _refetch(self) -> bool:
+        """Reloads the certificates unless that was tried recently; returns whether it did."""
+        # Requests racing on the same unknown key wait for one reload.
+        with self._refetch_lock:
+            now = self._clock()
+            last = self._last_refetch
+            if last is not None and now - last < self.refetch_interval:
+                return False
+            self._last_refetch = now
+            try:
+                self.load()
+            except Exception as e:
+                logger.error("Error reloading Firebase signing certificates: %s", e)
+                return False
+            return True
+
+
+class GoogleKeyStore(KeyStore):
+    """
+    Fetches Google's signing certificates over HTTPS and keeps them fresh.
+
+    A daemon thread refreshes the certificates before the Cache-Control
+    max-age returned by Google elapses. Failed refreshes keep the previous
+    certificates and are retried after `RETRY_INTERVAL` seconds.
+    """
+
+    def __init__(self, cert_url: str = ID_TOKEN_CERT_URL, timeout: float = 10.0, **kwargs):
+        super().__init__(**kwargs)
+        self.cert_url = cert_url
+        self.timeout = timeout
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_refresh_in: float = DEFAULT_REFRESH_INTERVAL
+
+    def load(self) -> None:
+        response = httpx.get(self.cert_url, timeout=self.timeout)
+        response.raise_for_status()
+        self._set_certs(response.json())
+
+        max_age = _parse_max_age(response.headers.get("cache-control", ""))
+        if max_age is None:
+            self._next_refresh_in = DEFAULT_REFRESH_INTERVAL
+        else:
+            self._next_refresh_in = max(MIN_REFRESH_INTERVAL, max_age * REFRESH_RATIO)
+        logger.info(
+            "Loaded %s Firebase signing certificates, next refresh in %.0fs",
+            len(self.get_certs()), self._next_refresh_in
+        )
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        try:
+            self.load()
+        except Exception as e:
+            logger.error("Error loading Firebase signing certificates: %s", e)
+            self._next_refresh_in = RETRY_INTERVAL
+        self._thread = threading.Thread(
+            target=self._refresh_loop, name="firebase-key-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout)
+            self._thread = None
+
+    def _refresh_loop(self) -> None:
+        while not self._stop_event.wait(self._next_refresh_in):
+            try:
+                self.load()
+            except Exception as e:
+                logger.error("Error refreshing Firebase signing certificates: %s", e)
+                self._next_refresh_in = RETRY_INTERVAL
+
+
+class FileKeyStore(KeyStore):
+    """
+    Loads signing certificates from a JSON file mapping key IDs to PEM certs.
+
+    This is the same format Google serves, so a saved copy of the live
+    certificates works, as does a file generated by tests.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def load(self) -> None:
+        with open(self.path) as f:
+            self._set_certs(json.load(f))
+        logger.info("Loaded Firebase signing certificates from %s", self.path)
+
+
+def _parse_max_age(cache_control: str) -> Optional[int]:
+    match = _MAX_AGE_RE.search(cache_control)
+    return int(match.group(1)) if match else None
+
+
+@lru_cache()
+def get_key_store() -> KeyStore:
+    """Returns the process-wide key store, file-backed if FIREBASE_CERTS_FILE is set."""
+    certs_file = get_settings().FIREBASE_CERTS_FILE
+    if certs_file:
+        return FileKeyStore(certs_file)
+    return GoogleKeyStore()
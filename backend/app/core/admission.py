@@ -0,0 +1,235 @@
+"""
+Admission control: per-tenant rate and concurrency limits, plus a global
+in-flight limit that sheds load before the database pools run dry.
+
+Tenants are identified by Firebase UID (see `tenant_key`); requests over a
+tenant's limits get 429, requests beyond the global limit get 503, both with
+Retry-After.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence
+
+from starlette.responses import JSONResponse
+
+from app.auth.firebase_auth import cached_uid
+from app.core.config import get_settings
+from app.core.metrics import ADMISSION_REJECTIONS
+from app.utils.rate_limit import TokenBucket
+
+# Never limited: monitoring must keep working while the instance is overloaded.
+EXEMPT_PATH_PREFIXES = ("/metrics", "/api/health")
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(f"Request rejected ({reason}), retry after {retry_after:.1f}s")
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class TenantState:
+    tenant: str
+    bucket: TokenBucket
+    in_flight: int = 0
+
+
+class _Shard:
+    __slots__ = ("lock", "tenants")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tenants: "OrderedDict[str, TenantState]" = OrderedDict()
+
+
+class AdmissionController:
+    """
+    Decides whether a request may start, and tracks it until it finishes.
+
+    Each tenant gets a token bucket (`tenant_rate` requests per second, bursts
+    of `tenant_burst`) and at most `tenant_max_in_flight` concurrent requests;
+    `max_in_flight` caps requests across all tenants. Tenant state is spread
+    over `shards` independently locked LRU maps, so tenants rarely contend
+    with each other and idle tenants are forgotten beyond `max_tenants`.
+    Tenants with requests in flight are never forgotten, so their limits
+    cannot be reset by churning other tenants through the map.
+    """
+
+    def __init__(
+        self,
+        tenant_rate: float,
+        tenant_burst: int,
+        tenant_max_in_flight: int,
+        max_in_flight: int,
+        shards: int = 16,
+        max_tenants: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tenant_rate = tenant_rate
+        self.tenant_burst = tenant_burst
+        self.tenant_max_in_flight = tenant_max_in_flight
+        self.max_in_flight = max_in_flight
+        self._clock = clock
+        self._shards: List[_Shard] = [_Shard() for _ in range(max(1, shards))]
+        self._shard_capacity = max(1, max_tenants // len(self._shards))
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _shard(self, tenant: str) -> _Shard:
+        return self._shards[hash(tenant) % len(self._shards)]
+
+    def acquire(self, tenant: str) -> TenantState:
+        """Admits a request for `tenant`, or raises Rejected."""
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                raise Rejected(503, "global_concurrency", 1.0)
+            self._in_flight += 1
+        try:
+            return self._acquire_tenant(tenant)
+        except Rejected:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+    def _acquire_tenant(self, tenant: str) -> TenantState:
+        shard = self._shard(tenant)
+        with shard.lock:
+            state = shard.tenants.get(tenant)
+            if state is None:
+                state = TenantState(
+                    tenant, TokenBucket(self.tenant_burst, self.tenant_rate, clock=self._clock)
+                )
+                shard.tenants[tenant] = state
+                if len(shard.tenants) > self._shard_capacity:
+                    self._evict_idle(shard, keep=tenant)
+            else:
+                shard.tenants.move_to_end(tenant)
+
+            # Checked before the bucket, so rejected requests cost no tokens.
+            if state.in_flight >= self.tenant_max_in_flight:
+                raise Rejected(429, "tenant_concurrency", 1.0)
+            wait = state.bucket.try_acquire()
+            if wait > 0:
+                raise Rejected(429, "tenant_rate", wait)
+            state.in_flight += 1
+            return state
+
+    @staticmethod
+    def _evict_idle(shard: _Shard, keep: str) -> None:
+        # Forgets the least recently used tenant without requests in flight.
+        # Busy tenants are bounded by max_in_flight, so if all are busy the
+        # shard stays over capacity only until some finish.
+        for tenant, state in shard.tenants.items():
+            if state.in_flight == 0 and tenant != keep:
+                del shard.tenants[tenant]
+                return
+
+    def release(self, state: TenantState) -> None:
+        """Marks a request admitted by `acquire` as finished."""
+        with self._lock:
+            self._in_flight -= 1
+        with self._shard(state.tenant).lock:
+            state.in_flight -= 1
+
+
+def _header(headers: Sequence, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def tenant_key(scope) -> str:
+    """
+    Identifies who a request counts against.
+
+    A bearer token already verified by `verify_token` maps to its Firebase
+    UID. Anonymous requests, and tokens not (yet) in the token cache, are
+    keyed by client address: not by the token's unverified claims, so a
+    forged token cannot use up someone else's budget, and not by the token
+    itself, so cycling random tokens does not buy fresh buckets.
+    """
+    headers = scope.get("headers") or []
+    authorization = _header(headers, b"authorization")
+    if authorization and authorization[:7].lower() == "bearer ":
+        uid = cached_uid(authorization[7:].strip())
+        if uid:
+            return f"uid:{uid}"
+
+    # Cloud Run's front end appends the address it saw to X-Forwarded-For.
+    # Earlier entries come from the client and can be forged, so use the last.
+    forwarded = _header(headers, b"x-forwarded-for")
+    if forwarded:
+        return "ip:" + forwarded.split(",")[-1].strip()
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware applying an AdmissionController to API requests.
+
+    `get_controller` is called per request rather than when the app is
+    built, so settings are not read at import time.
+    """
+
+    def __init__(self, app, get_controller: Callable[[], Optional[AdmissionController]]):
+        self.app = app
+        self.get_controller = get_controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.get_controller() if scope["type"] == "http" else None
+        if (
+            controller is None
+            # CORS preflights carry no credentials.
+            or scope["method"] == "OPTIONS"
+            or scope["path"].startswith(EXEMPT_PATH_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            state = controller.acquire(tenant_key(scope))
+        except Rejected as e:
+            ADMISSION_REJECTIONS.labels(e.reason).inc()
+            detail = "Too many requests" if e.status_code == 429 else "Server busy"
+            response = JSONResponse(
+                {"detail": detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(state)
+
+
+@lru_cache()
+def get_admission_controller() -> Optional[AdmissionController]:
+    """Returns the process-wide admission controller, or None when disabled."""
+    settings = get_settings()
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        return None
+    return AdmissionController(
+        tenant_rate=settings.ADMISSION_TENANT_RATE,
+        tenant_burst=settings.ADMISSION_TENANT_BURST,
+        tenant_max_in_flight=settings.ADMISSION_TENANT_MAX_IN_FLIGHT,
+        max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+        shards=settings.ADMISSION_SHARDS,
+        max_tenants=settings.ADMISSION_MAX_TENANTS,
+    )
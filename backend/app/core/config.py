@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,12 +10,142 @@ class Settings(BaseSettings):
 
     DATABASE_URL: str
     CREDENTIAL_ENCRYPTION_KEY: str
+    # Comma-separated retired keys, still accepted for decryption during rotation.
+    CREDENTIAL_ENCRYPTION_OLD_KEYS: str = ""
     GOOGLE_CLOUD_PROJECT: str
     OUTLOOK_CLIENT_ID: str
     OUTLOOK_CLIENT_SECRET: str
     PIPEDRIVE_CLIENT_ID: str
     PIPEDRIVE_CLIENT_SECRET: str
 
+    # Verified Firebase ID tokens are cached until their own `exp` claim.
+    # Set TOKEN_CACHE_MAX_SIZE to 0 to verify every request against Firebase.
+    TOKEN_CACHE_MAX_SIZE: int = 1024
+
+    # Path to a JSON file of {key_id: PEM certificate} used instead of fetching
+    # Google's Firebase signing certificates (e.g. for offline tests).
+    FIREBASE_CERTS_FILE: Optional[str] = None
+
+    # Pooled outbound HTTP clients (one per provider, see app.core.http_clients).
+    # HTTP/2 additionally requires the 'h2' package.
+    HTTP2_ENABLED: bool = False
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    HTTP_TIMEOUT_SECONDS: float = 10.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+
+    # Database connection pools (applied to both the sync and async engines).
+    # Each Cloud Run instance may open up to 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    # connections, so size these against the instance concurrency and the
+    # database's connection limit. DB_POOL_RECYCLE_SECONDS should stay below the
+    # idle time after which Neon suspends compute and drops connections.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 240
+    DB_POOL_PRE_PING: bool = True
+    # Open a fresh connection per checkout instead of pooling in-process.
+    # Useful behind an external pooler such as PgBouncer or Neon's pooled endpoint.
+    DB_USE_NULL_POOL: bool = False
+    # Transaction-pooler compatibility: disables server-side prepared statements.
+    DB_PGBOUNCER_MODE: bool = False
+
+    # Admission control (app.core.admission). Each tenant (Firebase UID) may
+    # send ADMISSION_TENANT_RATE requests per second in bursts of up to
+    # ADMISSION_TENANT_BURST, with at most ADMISSION_TENANT_MAX_IN_FLIGHT at
+    # once (429 beyond that). Past ADMISSION_MAX_IN_FLIGHT requests in total
+    # the instance answers 503, before requests queue up on the database pools
+    # (2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections).
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_TENANT_RATE: float = 10.0
+    ADMISSION_TENANT_BURST: int = 20
+    ADMISSION_TENANT_MAX_IN_FLIGHT: int = 8
+    ADMISSION_MAX_IN_FLIGHT: int = 30
+    ADMISSION_SHARDS: int = 16
+    ADMISSION_MAX_TENANTS: int = 10000
+
+    # Pending OAuth flows (/initiate/* until the provider callback).
+    # Set OAUTH_SESSION_REDIS_URL to share sessions across instances
+    # (requires the 'redis' package).
+    OAUTH_SESSION_TTL_SECONDS: int = 600
+    OAUTH_SESSION_MAX_ENTRIES: int = 10000
+    OAUTH_SESSION_REDIS_URL: Optional[str] = None
+
+    # Decrypted provider access tokens, cached until expires_at minus the margin.
+    CREDENTIAL_CACHE_MAX_ENTRIES: int = 10000
+    CREDENTIAL_CACHE_SAFETY_MARGIN_SECONDS: int = 60
+
+    # Users this instance has already created/updated from their ID token
+    # (see app.services.user_provisioning); re-checked after the TTL.
+    USER_PROVISION_CACHE_MAX_ENTRIES: int = 10000
+    USER_PROVISION_CACHE_TTL_SECONDS: int = 3600
+
+    # Background refresh of provider tokens before they expire
+    # (see app.services.token_refresh).
+    TOKEN_REFRESH_ENABLED: bool = True
+    TOKEN_REFRESH_INTERVAL_SECONDS: int = 60
+    TOKEN_REFRESH_WINDOW_SECONDS: int = 600
+    TOKEN_REFRESH_BATCH_SIZE: int = 200
+    TOKEN_REFRESH_CONCURRENCY: int = 5
+    TOKEN_REFRESH_JITTER_SECONDS: float = 2.0
+    # Bound on one provider refresh call, made while holding a pooled database
+    # connection and the credential's refresh lock (also on request-time
+    # refreshes in app.services.access_tokens).
+    TOKEN_REFRESH_TIMEOUT_SECONDS: float = 5.0
+
+    # Pipedrive API client (app.services.pipedrive). Requests are paced per
+    # company to at most PIPEDRIVE_BURST_LIMIT per PIPEDRIVE_BURST_WINDOW_SECONDS,
+    # and further limited by the rate-limit headers Pipedrive returns.
+    PIPEDRIVE_BURST_LIMIT: int = 20
+    PIPEDRIVE_BURST_WINDOW_SECONDS: float = 2.0
+    PIPEDRIVE_MAX_RETRIES: int = 4
+    PIPEDRIVE_BACKOFF_SECONDS: float = 0.5
+
+    # Microsoft Graph mail client (app.services.outlook). GRAPH_API_URL can
+    # point at a local fake Graph server in development and tests.
+    GRAPH_API_URL: str = "https://graph.microsoft.com/v1.0"
+    GRAPH_MAX_RETRIES: int = 4
+    GRAPH_BACKOFF_SECONDS: float = 0.5
+
+    # Per-tenant cache of stable provider reads (app.services.response_cache).
+    # Entries are served for PROVIDER_CACHE_TTL_SECONDS, then for up to
+    # PROVIDER_CACHE_STALE_SECONDS more while revalidating in the background.
+    # Set PROVIDER_CACHE_MAX_ENTRIES to 0 to disable.
+    PROVIDER_CACHE_MAX_ENTRIES: int = 5000
+    PROVIDER_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    PROVIDER_CACHE_TTL_SECONDS: float = 300.0
+    PROVIDER_CACHE_STALE_SECONDS: float = 600.0
+
+    # Transactional outbox (app.services.outbox). The dispatcher publishes
+    # pending events in batches of OUTBOX_BATCH_SIZE to OUTBOX_SINK: "broker"
+    # (an in-process stand-in for Pub/Sub) or "queue" (a bounded asyncio.Queue
+    # of OUTBOX_QUEUE_SIZE events for in-process consumers). Off by default:
+    # nothing subscribes to the broker yet, so dispatching would delete every
+    # event unread. While off, no events are recorded either, so the outbox
+    # table does not grow with nothing to drain it.
+    OUTBOX_DISPATCH_ENABLED: bool = False
+    OUTBOX_SINK: str = "broker"
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0
+    OUTBOX_QUEUE_SIZE: int = 1000
+
+    # Email processing pipeline (app.services.mail_pipeline): queue bound
+    # between stages, workers per stage, and messages in flight per tenant.
+    MAIL_PIPELINE_QUEUE_SIZE: int = 100
+    MAIL_PIPELINE_FETCH_CONCURRENCY: int = 4
+    MAIL_PIPELINE_CLASSIFY_CONCURRENCY: int = 8
+    MAIL_PIPELINE_WRITE_CONCURRENCY: int = 4
+    MAIL_PIPELINE_TENANT_IN_FLIGHT: int = 20
+
+    # Logging (app.core.logging_config). LOG_FORMAT is "json" (Cloud Logging)
+    # or "text". LOG_SAMPLE_RATES keeps a fraction of the INFO lines of
+    # high-volume loggers, e.g. "app.main=0.1,app.auth.firebase_auth=0.05".
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_SAMPLE_RATES: str = ""
+    LOG_QUEUE_SIZE: int = 10000
+
 
 @lru_cache()
 def get_settings():
@@ -1,18 +1,166 @@
+from functools import lru_cache
+from uuid import uuid4
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app.core.config import Settings, get_settings
+from app.core.metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument_engine
+
+# Query parameters understood by libpq/psycopg2 but not by asyncpg.
+_LIBPQ_ONLY_PARAMS = ("sslmode", "channel_binding")
+
+
+def get_async_database_url(database_url: str):
+    """
+    Converts a sync PostgreSQL URL into an asyncpg URL plus connect_args.
+
+    Neon connection strings carry libpq options such as `sslmode=require`
+    that asyncpg rejects as query parameters, so they are stripped and the
+    SSL mode (which asyncpg accepts under the same names) is passed through
+    connect_args instead.
+    """
+    url = make_url(database_url)
+    connect_args = {}
+    if url.get_backend_name() == "sqlite":
+        # Local stand-in (e.g. for benchmarks); needs the aiosqlite package.
+        return url.set(drivername="sqlite+aiosqlite"), connect_args
+    if url.get_backend_name() != "postgresql":
+        return url, connect_args
+
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        connect_args["ssl"] = sslmode
+    url = url.difference_update_query(_LIBPQ_ONLY_PARAMS).set(
+        drivername="postgresql+asyncpg"
+    )
+    return url, connect_args
+
+
+def get_pool_options(settings: Settings) -> dict:
+    """Returns the create_engine() pool keyword arguments configured in settings."""
+    if settings.DB_USE_NULL_POOL:
+        return {"poolclass": NullPool, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def get_async_connect_args(settings: Settings, connect_args: dict) -> dict:
+    """
+    Adds asyncpg options needed behind a transaction-mode pooler.
+
+    PgBouncer in transaction mode may run consecutive statements on different
+    server connections, so asyncpg must not cache prepared statements and must
+    give each one a unique name.
+    """
+    if not settings.DB_PGBOUNCER_MODE:
+        return connect_args
+    return {
+        **connect_args,
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
 
-from app.core.config import get_settings
+# Engines and session factories are created on first use rather than at import,
+# so importing the app neither reads settings nor loads the database drivers.
+# The lifespan handler in app.main opens the first connection during startup.
 
-settings = get_settings()
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@lru_cache()
+def get_engine() -> Engine:
+    """
+    Returns the sync engine, used by Alembic tooling and sync (threadpool)
+    endpoints. psycopg2 never uses server-side prepared statements, so it
+    needs no special handling for DB_PGBOUNCER_MODE.
+    """
+    settings = get_settings()
+    options = get_pool_options(settings)
+    options.setdefault("poolclass", TimedQueuePool)
+    engine = create_engine(settings.DATABASE_URL, **options)
+    instrument_engine(engine, "sync")
+    return engine
+
+
+@lru_cache()
+def get_async_engine() -> AsyncEngine:
+    """Returns the async engine, used by async endpoints so queries don't block the event loop."""
+    settings = get_settings()
+    url, connect_args = get_async_database_url(settings.DATABASE_URL)
+    options = get_pool_options(settings)
+    options.setdefault("poolclass", TimedAsyncAdaptedQueuePool)
+    engine = create_async_engine(
+        url,
+        connect_args=get_async_connect_args(settings, connect_args),
+        **options,
+    )
+    instrument_engine(engine.sync_engine, "async")
+    return engine
+
+
+@lru_cache()
+def get_session_factory() -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+@lru_cache()
+def get_async_session_factory() -> async_sessionmaker:
+    return async_sessionmaker(
+        bind=get_async_engine(), class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+
+async def dispose_engines() -> None:
+    """Closes the pooled connections of whichever engines were created."""
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
+
+
+def get_pool_stats() -> dict:
+    """Returns connection pool usage for the engines created so far."""
+    stats = {}
+    for name, factory in (("sync", get_engine), ("async", get_async_engine)):
+        if not factory.cache_info().currsize:
+            stats[name] = {"pool": None}
+            continue
+        pool = factory().pool
+        if isinstance(pool, QueuePool):
+            stats[name] = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            }
+        else:
+            stats[name] = {"pool": type(pool).__name__}
+    return stats
+
 
 Base = declarative_base()
 
 def get_db():
-    db = SessionLocal()
+    db = get_session_factory()()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with get_async_session_factory()() as db:
+        yield db
@@ -0,0 +1,96 @@
+import logging
+from typing import Dict, Optional
+
+import httpx
+from fastapi import Request
+
+from app.core.config import Settings
+from app.core.metrics import http_event_hooks
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per upstream provider, so a slow or saturated provider
+# cannot exhaust the connections used to talk to the others.
+MICROSOFT = "microsoft"
+PIPEDRIVE = "pipedrive"
+PROVIDERS = (MICROSOFT, PIPEDRIVE)
+
+# Provider serving each Credential.service_name.
+SERVICE_PROVIDERS = {"outlook": MICROSOFT, "pipedrive": PIPEDRIVE}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client(
+    settings: Settings,
+    provider: str,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> httpx.AsyncClient:
+    """
+    Creates a keep-alive pooled AsyncClient for a provider, configured from settings.
+
+    `transport` replaces the network, e.g. with an httpx.MockTransport in
+    tests and benchmarks.
+    """
+    http2 = settings.HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed; using HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            settings.HTTP_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS
+        ),
+        event_hooks=http_event_hooks(provider),
+        transport=transport,
+    )
+
+
+class HTTPClients:
+    """
+    Holds the app-wide outbound HTTP clients, one per provider.
+
+    Created and closed by the FastAPI lifespan handler in `app.main` and
+    exposed to endpoints through the `get_*_client` dependencies below.
+    """
+
+    def __init__(
+        self, settings: Settings, transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self._clients: Dict[str, httpx.AsyncClient] = {
+            provider: create_http_client(settings, provider, transport)
+            for provider in PROVIDERS
+        }
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        return self._clients[provider]
+
+    def for_service(self, service_name: str) -> httpx.AsyncClient:
+        """Returns the client for the provider behind a Credential.service_name."""
+        return self._clients[SERVICE_PROVIDERS[service_name]]
+
+    async def aclose(self) -> None:
+        for client in self._clients.values():
+            await client.aclose()
+
+
+def get_microsoft_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the pooled client for Microsoft identity and Graph calls."""
+    return request.app.state.http_clients.get(MICROSOFT)
+
+
+def get_pipedrive_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the pooled client for Pipedrive OAuth and API calls."""
+    return request.app.state.http_clients.get(PIPEDRIVE)
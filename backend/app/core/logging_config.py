@@ -0,0 +1,164 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, Optional
+
+from app.core.config import Settings
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and is
+# included in the JSON entry.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class CloudLoggingFormatter(logging.Formatter):
+    """Formats records as one-line JSON entries understood by Cloud Logging."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            # Error Reporting picks up tracebacks appended to the message.
+            message = f"{message}\n{record.exc_text}"
+        entry = {
+            "severity": record.levelname,
+            "message": message,
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "logger": record.name,
+            "logging.googleapis.com/sourceLocation": {
+                "file": record.pathname,
+                "line": record.lineno,
+                "function": record.funcName,
+            },
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the INFO-and-below records of selected loggers.
+
+    `rates` maps logger names to the fraction to keep; a rate applies to the
+    logger and its children, the most specific name winning. Warnings and
+    errors are never dropped.
+    """
+
+    def __init__(self, rates: Dict[str, float], random_func: Callable[[], float] = random.random):
+        super().__init__()
+        self.rates = rates
+        self._random = random_func
+
+    def _rate(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or self._random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without formatting them.
+
+    The stock QueueHandler renders the message in the logging thread; here
+    that is left to the listener, so a request only pays for creating the
+    record. Exception tracebacks are still rendered up front, as they keep the
+    caller's frames alive. If the queue is full the record is dropped rather
+    than blocking the caller.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parses "app.main=0.1,app.auth=0.5" into {"app.main": 0.1, "app.auth": 0.5}."""
+    rates = {}
+    for item in value.split(","):
+        if item.strip():
+            name, _, rate = item.partition("=")
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(settings: Settings) -> None:
+    """
+    Routes all logging through a queue to a background listener thread.
+
+    Log calls only enqueue the record; formatting (JSON for Cloud Logging, or
+    plain text when LOG_FORMAT=text) and writing to stdout happen on the
+    listener thread. Safe to call more than once; `stop_logging()` undoes it.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        stream_handler.setFormatter(CloudLoggingFormatter())
+    else:
+        stream_handler.setFormatter(
+            logging.Formatter("%(levelname)s:%(name)s:%(message)s")
+        )
+
+    log_queue: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(settings.LOG_SAMPLE_RATES)))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+    _queue_handler = queue_handler
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """
+    Flushes queued records and stops the listener thread.
+
+    Later records are written directly by the listener's handler, so nothing
+    logged after shutdown (or between two app lifespans) is lost.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = None
+    _queue_handler = None
@@ -0,0 +1,177 @@
+"""
+Prometheus metrics for the API, the database and outbound provider calls.
+
+Exposed in the Prometheus/OpenMetrics text format by the `/metrics` endpoint
+in `app.main`.
+"""
+import time
+from typing import Optional, Tuple
+
+import httpx
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.openmetrics.exposition import (
+    CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE,
+    generate_latest as generate_openmetrics,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Buckets from 1ms to 10s, covering both cached and provider-bound requests.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling API requests, by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing database statements.",
+    ["engine"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection, including connecting.",
+    ["engine"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Database pool connections by state.",
+    ["engine", "state"],
+)
+PROVIDER_REQUEST_DURATION = Histogram(
+    "provider_request_duration_seconds",
+    "Time until response headers for outbound provider calls.",
+    ["provider", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+PROVIDER_CACHE_LOOKUPS = Counter(
+    "provider_cache_lookups_total",
+    "Provider response cache lookups by result (hit, stale, miss).",
+    ["provider", "result"],
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "Requests shed by admission control, by reason.",
+    ["reason"],
+)
+
+_QUERY_START_KEY = "metrics_query_start"
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long checkouts wait for a connection."""
+
+    metrics_engine = ""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.metrics_engine).observe(
+                time.perf_counter() - started
+            )
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    metrics_engine = "sync"
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics_engine = "async"
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Records statement durations for a (sync, or an async engine's sync) engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info[_QUERY_START_KEY].pop()
+        DB_QUERY_DURATION.labels(name).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get(_QUERY_START_KEY):
+            conn.info[_QUERY_START_KEY].pop()
+
+
+def http_event_hooks(provider: str) -> dict:
+    """httpx event hooks timing each request to `provider`."""
+
+    async def on_request(request: httpx.Request) -> None:
+        request.extensions["metrics_start"] = time.perf_counter()
+
+    async def on_response(response: httpx.Response) -> None:
+        started = response.request.extensions.get("metrics_start")
+        if started is not None:
+            PROVIDER_REQUEST_DURATION.labels(
+                provider, response.request.method, str(response.status_code)
+            ).observe(time.perf_counter() - started)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Set by the router once the request has been matched. Labelling by
+            # the route template rather than the raw path keeps cardinality bounded.
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+            ).observe(time.perf_counter() - started)
+
+
+def update_pool_gauges(pool_stats: dict) -> None:
+    for engine, stats in pool_stats.items():
+        for state in ("checked_in", "checked_out", "overflow"):
+            if state in stats:
+                DB_POOL_CONNECTIONS.labels(engine, state).set(stats[state])
+
+
+def render(accept: Optional[str]) -> Tuple[bytes, str]:
+    """Renders all metrics, as OpenMetrics if the scraper asks for it."""
+    if accept and "application/openmetrics-text" in accept:
+        return generate_openmetrics(REGISTRY), OPENMETRICS_CONTENT_TYPE
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,172 @@
+"""
+Brings the database schema up to date.
+
+Usage: python -m app.core.migrate [--write-head]
+
+The app runs the check at startup, in its lifespan, on a connection from its
+own engine; the command line is for migrating by hand.
+
+Compares the revisions in `alembic_version` with the head revision baked into
+the image at build time (`--write-head`) and returns after that single query
+when they match, which is the case on almost every start. Only when they
+differ does it take an advisory lock and run `alembic upgrade head`, so
+instances starting concurrently never migrate at the same time.
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import Optional, Set
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+ALEMBIC_INI = BACKEND_DIR / "alembic.ini"
+# Written at image build time by `--write-head`; one revision per line.
+HEAD_FILE = BACKEND_DIR / "migrations" / "HEAD"
+
+# Transaction-level advisory lock held while migrating. Released by the
+# migration's own COMMIT, so it also holds behind PgBouncer's transaction
+# pooling, where the statements of one session can reach different servers.
+MIGRATION_LOCK_ID = 7302
+
+
+def _alembic_config():
+    from alembic.config import Config
+
+    return Config(str(ALEMBIC_INI))
+
+
+def compute_heads() -> Set[str]:
+    """Reads the head revisions from the migration scripts (no database access)."""
+    from alembic.script import ScriptDirectory
+
+    return set(ScriptDirectory.from_config(_alembic_config()).get_heads())
+
+
+def write_heads(path: Path = HEAD_FILE) -> Set[str]:
+    heads = compute_heads()
+    path.write_text("\n".join(sorted(heads)) + "\n")
+    return heads
+
+
+def read_heads(path: Path = HEAD_FILE) -> Set[str]:
+    """The baked-in head revisions, computed from the scripts if not baked in."""
+    if path.exists():
+        return set(path.read_text().split())
+    return compute_heads()
+
+
+def current_revisions(conn: Connection) -> Set[str]:
+    try:
+        result = conn.execute(text("SELECT version_num FROM alembic_version"))
+    except ProgrammingError:
+        # No alembic_version table: a fresh database.
+        conn.rollback()
+        return set()
+    return set(result.scalars())
+
+
+def _locked_revisions(conn: Connection) -> Set[str]:
+    # Like current_revisions, but without a failing query (and the rollback
+    # it needs) that would end the transaction holding the migration lock.
+    if not inspect(conn).has_table("alembic_version"):
+        return set()
+    return set(conn.execute(text("SELECT version_num FROM alembic_version")).scalars())
+
+
+def upgrade(conn: Connection) -> None:
+    from alembic import command
+
+    config = _alembic_config()
+    # migrations/env.py runs on this connection instead of opening its own.
+    config.attributes["connection"] = conn
+    command.upgrade(config, "head")
+
+
+def migrate_connection(conn: Connection, heads: Optional[Set[str]] = None) -> bool:
+    """Migrates the database to `heads` on `conn` if needed. Returns whether it migrated."""
+    heads = heads if heads is not None else read_heads()
+    if current_revisions(conn) == heads:
+        conn.commit()
+        logger.info("Database schema is current (%s)", ', '.join(sorted(heads)))
+        return False
+
+    # Lock, re-check and migrate in one transaction; committing (or rolling
+    # back) the migration releases the lock.
+    conn.rollback()
+    try:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        # Another instance may have migrated while we waited for the lock.
+        current = _locked_revisions(conn)
+        if current == heads:
+            conn.commit()
+            logger.info("Database schema was migrated by another instance")
+            return False
+        logger.info(
+            "Migrating database schema from %s to %s",
+            sorted(current) or 'empty', sorted(heads)
+        )
+        upgrade(conn)
+        conn.commit()
+        return True
+    finally:
+        # Releases the lock if the migration failed; a no-op after COMMIT.
+        conn.rollback()
+
+
+def ensure_schema_current(database_url: str, heads: Optional[Set[str]] = None) -> bool:
+    """Migrates the database at `database_url` on a one-off connection."""
+    engine = create_engine(database_url, poolclass=NullPool)
+    try:
+        with engine.connect() as conn:
+            return migrate_connection(conn, heads)
+    finally:
+        engine.dispose()
+
+
+async def ensure_schema_current_async(
+    engine: AsyncEngine, heads: Optional[Set[str]] = None
+) -> bool:
+    """
+    Migrates the database on a connection from the app's async engine.
+
+    The connection goes back into the pool afterwards, so the check also
+    warms up the engine for the first request.
+    """
+    async with engine.connect() as conn:
+        return await conn.run_sync(migrate_connection, heads)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--write-head",
+        action="store_true",
+        help=f"write the head revision to {HEAD_FILE} and exit (run at image build time)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.write_head:
+        heads = write_heads()
+        logger.info("Wrote head revision %s to %s", ', '.join(sorted(heads)), HEAD_FILE)
+        return
+
+    from app.core.config import get_settings
+
+    try:
+        ensure_schema_current(get_settings().DATABASE_URL)
+    except Exception as e:
+        logger.error("Database migration failed: %s", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
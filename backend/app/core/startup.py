@@ -0,0 +1,126 @@
+"""
+Boot timing: how long the app's imports and startup phases took.
+
+This module only uses the standard library, so `app.main` can import it first
+and have every later import timed. Import timing wraps a private importlib
+hook, so it is a debugging aid, off unless STARTUP_IMPORT_TIMING is set;
+`python -X importtime -c "import app.main"` gives the same numbers without
+touching the running app.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import _frozen_importlib
+except ImportError:  # pragma: no cover - not CPython
+    _frozen_importlib = None
+
+
+# Read from the environment rather than Settings, which is among the imports
+# being timed.
+IMPORT_TIMING_ENV = "STARTUP_IMPORT_TIMING"
+
+
+def import_timing_enabled() -> bool:
+    return os.environ.get(IMPORT_TIMING_ENV, "").lower() in ("1", "true", "yes")
+
+
+class StartupReport:
+    """
+    Collects per-module import times and per-phase durations for one boot.
+
+    `track_imports()` wraps the interpreter's module loader (the same hook
+    `python -X importtime` reports on) until `stop_tracking_imports()`, so
+    it costs nothing once startup is over. `log()` emits the report once.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self.started_at = clock()
+        self.phases: Dict[str, float] = {}
+        # Module name -> (self seconds, cumulative seconds).
+        self.imports: Dict[str, Tuple[float, float]] = {}
+        self._original_find_and_load = None
+        self._local = threading.local()
+        self._logged = False
+
+    def track_imports(self) -> None:
+        if _frozen_importlib is None or self._original_find_and_load is not None:
+            return
+        original = _frozen_importlib._find_and_load
+        self._original_find_and_load = original
+        report = self
+
+        def _timed_find_and_load(name, import_):
+            stack = report._import_stack()
+            stack.append(0.0)
+            started = report._clock()
+            try:
+                return original(name, import_)
+            finally:
+                elapsed = report._clock() - started
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                report.imports[name] = (elapsed - nested, elapsed)
+
+        _frozen_importlib._find_and_load = _timed_find_and_load
+
+    def stop_tracking_imports(self) -> None:
+        if self._original_find_and_load is not None:
+            _frozen_importlib._find_and_load = self._original_find_and_load
+            self._original_find_and_load = None
+
+    def _import_stack(self) -> List[float]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def mark(self, name: str) -> None:
+        """Records the time from the start of the boot until now as a phase."""
+        self.phases[name] = self._clock() - self.started_at
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Times a startup phase; usable around sync code and awaits alike."""
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.phases[name] = self._clock() - started
+
+    def as_dict(self, top: int = 15) -> dict:
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            "total_ms": round((self._clock() - self.started_at) * 1000, 1),
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            "modules_imported": len(self.imports),
+            "slowest_imports_ms": [
+                {
+                    "module": name,
+                    "self": round(own * 1000, 1),
+                    "cumulative": round(cumulative * 1000, 1),
+                }
+                for name, (own, cumulative) in slowest[:top]
+            ],
+        }
+
+    def log(self, top: int = 15) -> None:
+        """Logs the report, once per process."""
+        if self._logged:
+            return
+        self._logged = True
+        logger.info("Startup report: %s", self.as_dict(top))
+
+
+@lru_cache()
+def get_startup_report() -> StartupReport:
+    return StartupReport()
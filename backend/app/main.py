@@ -1,29 +1,123 @@
-from fastapi import FastAPI, Depends, HTTPException
+from app.core.startup import get_startup_report, import_timing_enabled
+
+# The report is logged once startup completes. With STARTUP_IMPORT_TIMING set,
+# it also times every import from here on.
+startup_report = get_startup_report()
+if import_timing_enabled():
+    startup_report.track_imports()
+
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.auth.firebase_auth import verify_token
+from app.auth.firebase_auth import get_firebase_app, verify_token
+from app.auth.key_store import get_key_store
 from app.api.oauth import router as oauth_router
-from app.core.database import get_db
-from app.models.database import User, Credential
-from app.services.encryption import decrypt_data
+from app.core.database import (
+    dispose_engines,
+    get_async_engine,
+    get_async_session_factory,
+    get_async_db,
+    get_pool_stats,
+)
+from app.core.migrate import ensure_schema_current_async
+from app.core.http_clients import HTTPClients, get_pipedrive_client
+from app.services.access_tokens import get_access_token
+from app.services.outbox import OutboxDispatcher, create_sink
+from app.services.pipedrive import PipedriveAPIError, PipedriveService
+from app.services.response_cache import get_response_cache
+from app.services.token_refresh import TokenRefreshScheduler
+from app.services.user_provisioning import ensure_user
 from app.core.config import get_settings
-from sqlalchemy.orm import Session
+from app.core.admission import AdmissionControlMiddleware, get_admission_controller
+from app.core.metrics import MetricsMiddleware, render, update_pool_gauges
+from app.core.logging_config import setup_logging, stop_logging
+from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 import logging
 import os
-import traceback
 
-# Configure basic logging
-logging.basicConfig(level=logging.INFO)
+startup_report.mark("imports")
+
 logger = logging.getLogger(__name__)
 
-logger.info(
-    f"App starting. GOOGLE_APPLICATION_CREDENTIALS: {os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')}"
-)
-logger.info(
-    f"App starting. GOOGLE_CLOUD_PROJECT: {os.environ.get('GOOGLE_CLOUD_PROJECT')}"
-)
 
-app = FastAPI()
+async def _warm_up_firebase():
+    # Initialize Firebase and prefetch its token signing certificates up front,
+    # so the first authenticated request does not pay for it.
+    with startup_report.phase("firebase"):
+        try:
+            await run_in_threadpool(get_firebase_app)
+        except Exception as e:
+            logger.error("Firebase warm-up failed, will retry on first request: %s", e)
+        # Independent of the Firebase app, which may already have been
+        # initialized (e.g. on reload). If this fails, the first token with an
+        # unknown key ID loads the certificates.
+        try:
+            await run_in_threadpool(get_key_store().start)
+        except Exception as e:
+            logger.error("Loading Firebase signing certificates failed: %s", e)
+
+
+async def _warm_up_database():
+    # Bring the schema up to date on the app's own engine (a single query when
+    # it is already current), which also opens the first pooled connection
+    # before the first request needs it. Failing here fails startup, so an
+    # instance never serves requests against an outdated schema.
+    with startup_report.phase("database"):
+        await ensure_schema_current_async(get_async_engine())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    # Log through a background thread, as JSON for Cloud Logging, for as long
+    # as the app runs.
+    setup_logging(settings)
+    logger.info(
+        "App starting. GOOGLE_APPLICATION_CREDENTIALS: %s",
+        os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+    )
+    logger.info("App starting. GOOGLE_CLOUD_PROJECT: %s", os.environ.get('GOOGLE_CLOUD_PROJECT'))
+    with startup_report.phase("warm_up"):
+        # Independent of each other, so run concurrently.
+        await asyncio.gather(_warm_up_firebase(), _warm_up_database())
+    app.state.http_clients = HTTPClients(settings)
+    token_refresh_scheduler = None
+    if settings.TOKEN_REFRESH_ENABLED:
+        token_refresh_scheduler = TokenRefreshScheduler(
+            get_async_session_factory(), app.state.http_clients, settings
+        )
+        token_refresh_scheduler.start()
+    # Consumers of outbox events subscribe to (or read from) app.state.outbox_sink,
+    # which only exists while dispatching is enabled.
+    app.state.outbox_sink = None
+    outbox_dispatcher = None
+    if settings.OUTBOX_DISPATCH_ENABLED:
+        app.state.outbox_sink = create_sink(settings)
+        outbox_dispatcher = OutboxDispatcher(
+            get_async_session_factory(), app.state.outbox_sink, settings
+        )
+        outbox_dispatcher.start()
+    startup_report.stop_tracking_imports()
+    startup_report.mark("startup")
+    startup_report.log()
+    yield
+    if token_refresh_scheduler is not None:
+        await token_refresh_scheduler.stop()
+    if outbox_dispatcher is not None:
+        await outbox_dispatcher.stop()
+    await app.state.http_clients.aclose()
+    await dispose_engines()
+    get_key_store().stop()
+    stop_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Inside CORS, so rejections still carry the CORS headers the browser needs.
+app.add_middleware(AdmissionControlMiddleware, get_controller=get_admission_controller)
 
 # Enable CORS for all origins (for local development)
 app.add_middleware(
@@ -34,6 +128,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so recorded latencies include the other middleware.
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(oauth_router, prefix="/api/auth")
 
 
@@ -49,100 +146,81 @@ def test_endpoint():
     return {"message": "Backend test endpoint working!", "status": "success"}
 
 
+@app.get("/api/health/db-pool")
+def db_pool_stats():
+    """Report database connection pool usage for monitoring."""
+    return get_pool_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    """Prometheus/OpenMetrics scrape endpoint."""
+    update_pool_gauges(get_pool_stats())
+    body, content_type = render(request.headers.get("accept"))
+    return Response(content=body, media_type=content_type)
+
+
 @app.get("/api/test-pipedrive")
 async def test_pipedrive(
-    user: dict = Depends(verify_token), db: Session = Depends(get_db)
+    user: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_async_db),
+    client: httpx.AsyncClient = Depends(get_pipedrive_client),
 ):
     """Test Pipedrive API connectivity using stored credentials."""
     try:
         logger.info(
-            f"Testing Pipedrive API for user: {user.get('name', user.get('email', user.get('uid')))}"
+            "Testing Pipedrive API for user: %s",
+            user.get('name', user.get('email', user.get('uid')))
         )
 
-        # Find user and their Pipedrive credentials
-        db_user = db.query(User).filter(User.firebase_id == user["uid"]).first()
-        if not db_user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        credential = (
-            db.query(Credential)
-            .filter(
-                Credential.user_id == db_user.id, Credential.service_name == "pipedrive"
-            )
-            .first()
-        )
-
-        if not credential:
+        # Get the user's decrypted Pipedrive access token
+        access_token = await get_access_token(db, user["uid"], "pipedrive", client)
+        if not access_token:
             raise HTTPException(
                 status_code=404, detail="Pipedrive credentials not found"
             )
 
-        # Decrypt the access token
-        access_token = decrypt_data(
-            credential.access_token, get_settings().CREDENTIAL_ENCRYPTION_KEY
-        )
-
         # Test Pipedrive API by fetching user info
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://api.pipedrive.com/v1/users/me",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json",
-                },
+        try:
+            service = PipedriveService(
+                client, access_token, tenant=user["uid"], cache=get_response_cache()
+            )
+            pipedrive_user = await service.get_current_user()
+        except PipedriveAPIError as e:
+            logger.error(str(e))
+            raise HTTPException(
+                status_code=400,
+                detail=f"Pipedrive API error: {e.status_code}",
             )
 
-            if response.status_code == 200:
-                user_data = response.json()
-                logger.info("Successfully connected to Pipedrive API")
-                return {
-                    "message": "Pipedrive API test successful!",
-                    "pipedrive_user": {
-                        "name": user_data.get("data", {}).get("name"),
-                        "email": user_data.get("data", {}).get("email"),
-                        "company": user_data.get("data", {}).get("company_name"),
-                    },
-                }
-            else:
-                logger.error(
-                    f"Pipedrive API error: {response.status_code} - {response.text}"
-                )
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Pipedrive API error: {response.status_code}",
-                )
+        logger.info("Successfully connected to Pipedrive API")
+        return {
+            "message": "Pipedrive API test successful!",
+            "pipedrive_user": {
+                "name": pipedrive_user.get("name"),
+                "email": pipedrive_user.get("email"),
+                "company": pipedrive_user.get("company_name"),
+            },
+        }
 
     except Exception as e:
-        logger.error(f"Error testing Pipedrive API: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error testing Pipedrive API: %s", e)
         raise HTTPException(
             status_code=500, detail=f"Error testing Pipedrive API: {str(e)}"
         )
 
 
 @app.get("/api/profile")
-def get_profile(user: dict = Depends(verify_token), db: Session = Depends(get_db)):
+async def get_profile(user: dict = Depends(verify_token)):
     try:
         logger.info(
-            f"Profile endpoint accessed by user: {user.get('name', user.get('email', user.get('uid')))}"
+            "Profile endpoint accessed by user: %s",
+            user.get('name', user.get('email', user.get('uid')))
         )
-        logger.info(f"Full user object: {user}")
-
-        # Find or create user in database and update email if available
-        db_user = db.query(User).filter(User.firebase_id == user["uid"]).first()
-        if not db_user:
-            logger.info(f"Creating new user for Firebase UID: {user['uid']}")
-            db_user = User(firebase_id=user["uid"], email=user.get("email"))
-            db.add(db_user)
-            db.commit()
-            db.refresh(db_user)
-        elif user.get("email") and db_user.email != user.get("email"):
-            # Update email if it has changed
-            logger.info(
-                f"Updating email for user {user['uid']}: {db_user.email} -> {user.get('email')}"
-            )
-            db_user.email = user.get("email")
-            db.commit()
+
+        # Create the user, or update its email, unless this instance already
+        # has; the frontend calls this on every page load.
+        await ensure_user(user["uid"], user.get("email"))
 
         # The user object is the decoded Firebase token, which contains user info.
         return {
@@ -150,6 +228,5 @@ def get_profile(user: dict = Depends(verify_token), db: Session = Depends(get_db
             "user_id": user["uid"],
         }
     except Exception as e:
-        logger.error(f"Error in profile endpoint: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in profile endpoint: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
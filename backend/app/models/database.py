@@ -1,13 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+    func,
+)
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Covers `id` so resolving a Firebase UID to a user id is index-only.
+        Index(
+            "ix_users_firebase_id", "firebase_id", unique=True, postgresql_include=["id"]
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    firebase_id = Column(String, unique=True, index=True, nullable=False)
+    firebase_id = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=True)
 
     credentials = relationship("Credential", back_populates="user")
@@ -15,12 +32,39 @@ class User(Base):
 
 class Credential(Base):
     __tablename__ = "credentials"
+    __table_args__ = (
+        # One credential per user and service. Its index serves lookups by
+        # (user_id, service_name) and is the ON CONFLICT target for upserts.
+        UniqueConstraint(
+            "user_id", "service_name", name="uq_credentials_user_id_service_name"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     service_name = Column(String, nullable=False)  # e.g., "outlook", "pipedrive"
     access_token = Column(String, nullable=False)
     refresh_token = Column(String, nullable=True)
-    expires_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
+    # Graph delta link where the next incremental mail sync resumes (Outlook only).
+    delta_link = Column(String, nullable=True)
 
     user = relationship("User", back_populates="credentials")
+
+
+class OutboxEvent(Base):
+    """
+    An event waiting to be published (see app.services.outbox).
+
+    Written in the same transaction as the change it describes and deleted
+    once the dispatcher has published it.
+    """
+
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    event_type = Column(String, nullable=False)  # e.g., "credential_connected"
+    # The entity the event is about (a Firebase UID), for ordering downstream.
+    key = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import get_settings
+from app.core.database import get_async_session_factory
+from app.services.credential_cache import get_credential_cache
+from app.services.credentials import get_credential_for_firebase_uid
+from app.services.encryption import get_keyring
+from app.services.oauth_tokens import refresh_access_token
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# First key of the two-key PostgreSQL advisory locks taken while refreshing a
+# credential; the second key is the credential id.
+REFRESH_LOCK_NAMESPACE = 7301
+
+_refresh_flight = SingleFlight()
+
+
+def credential_refresh_lock(credential_id):
+    """Blocking transaction-scoped advisory lock for refreshing a credential."""
+    return func.pg_advisory_xact_lock(REFRESH_LOCK_NAMESPACE, credential_id)
+
+
+def try_credential_refresh_lock(credential_id):
+    """Non-blocking variant of `credential_refresh_lock`, returning a boolean."""
+    return func.pg_try_advisory_xact_lock(REFRESH_LOCK_NAMESPACE, credential_id)
+
+
+def needs_refresh(expires_at: Optional[datetime]) -> bool:
+    """True if a credential expires within the credential cache safety margin."""
+    if expires_at is None:
+        return False
+    margin = timedelta(seconds=get_settings().CREDENTIAL_CACHE_SAFETY_MARGIN_SECONDS)
+    return expires_at <= datetime.utcnow() + margin
+
+
+async def get_access_token(
+    db: AsyncSession,
+    firebase_uid: str,
+    service_name: str,
+    client: Optional[httpx.AsyncClient] = None,
+) -> Optional[str]:
+    """
+    Returns a user's decrypted access token for a service, or None.
+
+    Served from the in-process credential cache when possible; on a miss the
+    credential is loaded, decrypted and cached until shortly before it expires.
+    If the stored token is about to expire and a `client` for the provider is
+    given, it is refreshed first (see `refresh_credential`).
+    """
+    cache = get_credential_cache()
+    access_token = cache.get(firebase_uid, service_name)
+    if access_token is not None:
+        return access_token
+
+    generation = cache.generation()
+    credential = await get_credential_for_firebase_uid(db, firebase_uid, service_name)
+    if credential is None:
+        return None
+    if client is not None and credential.refresh_token and needs_refresh(credential.expires_at):
+        return await refresh_credential(client, firebase_uid, service_name)
+
+    access_token = get_keyring().decrypt(credential.access_token)
+    cache.set(firebase_uid, service_name, access_token, credential.expires_at, generation)
+    return access_token
+
+
+async def refresh_credential(
+    client: httpx.AsyncClient,
+    firebase_uid: str,
+    service_name: str,
+    session_factory: Optional[async_sessionmaker] = None,
+) -> Optional[str]:
+    """
+    Refreshes a credential's access token exactly once across all callers.
+
+    Concurrent calls in this process for the same user and service share one
+    in-flight refresh. Across instances, the refresh runs under a PostgreSQL
+    advisory lock on the credential; whoever acquires it second re-reads the
+    row and returns the token the first one stored instead of refreshing
+    again (which, with rotating refresh tokens, would invalidate it).
+    """
+    session_factory = session_factory or get_async_session_factory()
+    return await _refresh_flight.do(
+        (firebase_uid, service_name),
+        lambda: _refresh_locked(client, firebase_uid, service_name, session_factory),
+    )
+
+
+async def _refresh_locked(
+    client: httpx.AsyncClient,
+    firebase_uid: str,
+    service_name: str,
+    session_factory: async_sessionmaker,
+) -> Optional[str]:
+    keyring = get_keyring()
+    cache = get_credential_cache()
+    generation = cache.generation()
+    # The provider call is made inside the transaction, holding the lock (and
+    # so a pooled connection) on purpose: with rotating refresh tokens, a
+    # second instance refreshing with the same token would invalidate the
+    # first's. TOKEN_REFRESH_TIMEOUT_SECONDS bounds how long that can take.
+    async with session_factory() as db:
+        async with db.begin():
+            credential = await get_credential_for_firebase_uid(
+                db, firebase_uid, service_name
+            )
+            if credential is None:
+                return None
+            await db.execute(select(credential_refresh_lock(credential.id)))
+            # Re-read under the lock: another instance may have just refreshed it.
+            await db.refresh(credential)
+
+            if not credential.refresh_token or not needs_refresh(credential.expires_at):
+                access_token = keyring.decrypt(credential.access_token)
+            else:
+                logger.info("Refreshing %s token for Firebase UID: %s", service_name, firebase_uid)
+                tokens = await asyncio.wait_for(
+                    refresh_access_token(
+                        client, service_name, keyring.decrypt(credential.refresh_token)
+                    ),
+                    get_settings().TOKEN_REFRESH_TIMEOUT_SECONDS,
+                )
+                access_token = tokens["access_token"]
+                credential.access_token = keyring.encrypt(access_token)
+                if tokens.get("refresh_token"):
+                    credential.refresh_token = keyring.encrypt(tokens["refresh_token"])
+                credential.expires_at = datetime.utcnow() + timedelta(
+                    seconds=tokens["expires_in"]
+                )
+            expires_at = credential.expires_at
+
+    # Replaces the entry unless a reconnect invalidated it meanwhile.
+    cache.set(firebase_uid, service_name, access_token, expires_at, generation)
+    return access_token
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+
+from app.core.config import get_settings
+from app.utils.cache import TTLCache
+
+
+class CachedSecret:
+    """
+    A decrypted secret held in a mutable buffer so it can be zeroed on eviction.
+
+    `reveal()` necessarily returns an immutable str copy for use in request
+    headers; only the long-lived cached copy is wiped. Once wiped, `reveal()`
+    returns None, never a partially zeroed secret.
+    """
+
+    __slots__ = ("_buffer", "_lock", "_wiped")
+
+    def __init__(self, secret: str):
+        self._buffer = bytearray(secret.encode())
+        self._lock = threading.Lock()
+        self._wiped = False
+
+    def reveal(self) -> Optional[str]:
+        with self._lock:
+            return None if self._wiped else self._buffer.decode()
+
+    def wipe(self) -> None:
+        with self._lock:
+            self._buffer[:] = bytes(len(self._buffer))
+            self._wiped = True
+
+
+def _wipe_evicted(key: Tuple[str, str], secret: CachedSecret) -> None:
+    secret.wipe()
+
+
+class CredentialCache:
+    """
+    In-process cache of decrypted provider access tokens.
+
+    Keyed by (firebase_uid, service_name). Entries expire `safety_margin`
+    seconds before the credential's `expires_at`, so a cached token is never
+    used right up to its expiry. Evicted or invalidated secrets are zeroed.
+
+    A caller that loads a token from the database should take `generation()`
+    before the read and pass it to `set()`: if the entry was invalidated in
+    between, the token it read may be the replaced one and is not cached.
+    Invalidations are remembered for the last `max_entries` credentials; for
+    older ones `set()` conservatively assumes the latest forgotten one, which
+    at worst skips caching a token once.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        safety_margin_seconds: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.safety_margin_seconds = safety_margin_seconds
+        self._cache = TTLCache(maxsize=max_entries, clock=clock, on_evict=_wipe_evicted)
+        self._max_invalidations = max_entries
+        # Counts invalidate() calls; each credential's last one is recorded in
+        # _invalidated_at, least recent first, and the highest generation
+        # dropped from it in _forgotten.
+        self._generation = 0
+        self._invalidated_at: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._forgotten = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, firebase_uid: str, service_name: str) -> Optional[str]:
+        secret = self._cache.get((firebase_uid, service_name))
+        return secret.reveal() if secret is not None else None
+
+    def generation(self) -> int:
+        """Returns how many invalidations happened so far, for `set()`."""
+        return self._generation
+
+    def set(
+        self,
+        firebase_uid: str,
+        service_name: str,
+        access_token: str,
+        expires_at: Optional[datetime],
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Caches a token until `expires_at` (naive UTC) minus the safety margin.
+
+        If `generation` is given and the entry has been invalidated since it
+        was taken, the token is not cached.
+        """
+        if expires_at is None:
+            return
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        key = (firebase_uid, service_name)
+        with self._lock:
+            if generation is not None and generation < self._invalidated_at.get(
+                key, self._forgotten
+            ):
+                return
+            self._cache.set(
+                key,
+                CachedSecret(access_token),
+                expires_at.timestamp() - self.safety_margin_seconds,
+            )
+
+    def invalidate(self, firebase_uid: str, service_name: str) -> None:
+        key = (firebase_uid, service_name)
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at.pop(key, None)
+            self._invalidated_at[key] = self._generation
+            while len(self._invalidated_at) > self._max_invalidations:
+                _, generation = self._invalidated_at.popitem(last=False)
+                self._forgotten = max(self._forgotten, generation)
+            self._cache.invalidate(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+@lru_cache()
+def get_credential_cache() -> CredentialCache:
+    """Returns the process-wide credential cache configured from settings."""
+    settings = get_settings()
+    return CredentialCache(
+        settings.CREDENTIAL_CACHE_MAX_ENTRIES,
+        settings.CREDENTIAL_CACHE_SAFETY_MARGIN_SECONDS,
+    )
@@ -0,0 +1,168 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import User, Credential
+from app.services.credential_cache import get_credential_cache
+from app.services.outbox import CREDENTIAL_CONNECTED, USER_PROVISIONED, add_event
+from app.services.response_cache import get_response_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def get_user_by_firebase_id(
+    db: AsyncSession, firebase_uid: str
+) -> Optional[User]:
+    """Returns the user with the given Firebase UID, or None."""
+    result = await db.execute(select(User).where(User.firebase_id == firebase_uid))
+    return result.scalars().first()
+
+
+async def upsert_user(db: AsyncSession, firebase_uid: str, email: Optional[str]) -> bool:
+    """
+    Creates the user for a Firebase UID, or updates its email if it changed.
+
+    A single INSERT ... ON CONFLICT DO UPDATE whose update only applies when
+    the email is given and differs, so an unchanged user is not rewritten.
+    A created or updated user is announced through the outbox in the same
+    transaction. Returns whether the row changed.
+    """
+    user_insert = insert(User).values(firebase_id=firebase_uid, email=email)
+    result = await db.execute(
+        user_insert.on_conflict_do_update(
+            index_elements=[User.firebase_id],
+            set_={"email": user_insert.excluded.email},
+            where=and_(
+                user_insert.excluded.email.is_not(None),
+                User.email.is_distinct_from(user_insert.excluded.email),
+            ),
+        ).returning(User.id)
+    )
+    # No row comes back when the conflict's WHERE left the user unchanged.
+    user_id = result.scalar_one_or_none()
+    if user_id is not None:
+        await add_event(
+            db,
+            USER_PROVISIONED,
+            firebase_uid,
+            {"user_id": user_id, "firebase_uid": firebase_uid, "email": email},
+        )
+    await db.commit()
+    return user_id is not None
+
+
+async def get_credential_for_firebase_uid(
+    db: AsyncSession, firebase_uid: str, service_name: str
+) -> Optional[Credential]:
+    """
+    Returns a user's stored credential for a service by Firebase UID, or None.
+
+    Resolves the user and the credential in one joined query: an index-only
+    probe of ix_users_firebase_id followed by a probe of the
+    (user_id, service_name) unique index on credentials.
+    """
+    result = await db.execute(
+        select(Credential)
+        .join(User, User.id == Credential.user_id)
+        .where(User.firebase_id == firebase_uid, Credential.service_name == service_name)
+    )
+    return result.scalars().first()
+
+
+async def save_credential(
+    db: AsyncSession,
+    firebase_uid: str,
+    service_name: str,
+    access_token: str,
+    refresh_token: Optional[str],
+    expires_at: Optional[datetime],
+) -> int:
+    """
+    Creates or updates a user's credential for a service, returning its id.
+
+    The tokens must already be encrypted. The user is created if it does not
+    exist yet, and any cached copy of the old access token, or provider data
+    read with it, is invalidated. Both upserts run as a single INSERT ... ON
+    CONFLICT statement (the user upsert is a CTE feeding the credential
+    upsert), so this costs one round-trip and is safe against concurrent
+    callbacks for the same user. A credential_connected event is added to the
+    outbox in the same transaction.
+    """
+    user_insert = insert(User).values(firebase_id=firebase_uid)
+    # The no-op update makes RETURNING yield the id of an existing user too.
+    upserted_user = (
+        user_insert.on_conflict_do_update(
+            index_elements=[User.firebase_id],
+            set_={"firebase_id": user_insert.excluded.firebase_id},
+        )
+        .returning(User.id)
+        .cte("upserted_user")
+    )
+
+    credential_insert = insert(Credential).from_select(
+        ["user_id", "service_name", "access_token", "refresh_token", "expires_at"],
+        select(
+            upserted_user.c.id,
+            literal(service_name, Credential.service_name.type),
+            literal(access_token, Credential.access_token.type),
+            literal(refresh_token, Credential.refresh_token.type),
+            literal(expires_at, Credential.expires_at.type),
+        ),
+    )
+    credential_upsert = credential_insert.on_conflict_do_update(
+        index_elements=[Credential.user_id, Credential.service_name],
+        set_={
+            "access_token": credential_insert.excluded.access_token,
+            "refresh_token": credential_insert.excluded.refresh_token,
+            "expires_at": credential_insert.excluded.expires_at,
+            # A reconnect may be a different mailbox; start mail sync over.
+            "delta_link": None,
+        },
+    ).returning(Credential.id)
+
+    result = await db.execute(credential_upsert)
+    credential_id = result.scalar_one()
+    await add_event(
+        db,
+        CREDENTIAL_CONNECTED,
+        firebase_uid,
+        {
+            "credential_id": credential_id,
+            "firebase_uid": firebase_uid,
+            "service_name": service_name,
+        },
+    )
+    await db.commit()
+    get_credential_cache().invalidate(firebase_uid, service_name)
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        # The reconnected account may be a different one.
+        response_cache.invalidate_tenant(firebase_uid)
+    logger.info("Saved %s credentials for Firebase UID: %s", service_name, firebase_uid)
+    return credential_id
+
+
+async def save_delta_link(
+    db: AsyncSession, credential_id: int, delta_link: str, refresh_token: Optional[str]
+) -> bool:
+    """
+    Stores where the next incremental mail sync for a credential resumes.
+
+    Only if the credential still has `refresh_token` (encrypted, as read when
+    the sync started): a reconnect since then may be a different mailbox, and
+    has reset the link. Returns whether the link was stored.
+    """
+    result = await db.execute(
+        update(Credential)
+        .where(
+            Credential.id == credential_id,
+            Credential.refresh_token.is_not_distinct_from(refresh_token),
+        )
+        .values(delta_link=delta_link)
+    )
+    await db.commit()
+    return result.rowcount == 1
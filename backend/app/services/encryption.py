@@ -1,18 +1,82 @@
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
+from functools import lru_cache
+from typing import Iterable, List, Sequence
 import os
 
+from app.core.config import get_settings
+
 def generate_key():
     """Generates a Fernet key."""
     return Fernet.generate_key().decode()
 
+@lru_cache(maxsize=8)
+def _get_fernet(key: str) -> Fernet:
+    return Fernet(key.encode())
+
 def encrypt_data(data: str, key: str) -> str:
     """Encrypts a string using Fernet encryption."""
-    f = Fernet(key.encode())
+    f = _get_fernet(key)
     encrypted_data = f.encrypt(data.encode())
     return encrypted_data.decode()
 
 def decrypt_data(encrypted_data: str, key: str) -> str:
     """Decrypts a string using Fernet encryption."""
-    f = Fernet(key.encode())
+    f = _get_fernet(key)
     decrypted_data = f.decrypt(encrypted_data.encode())
     return decrypted_data.decode()
+
+
+class CredentialKeyring:
+    """
+    A long-lived set of Fernet keys for encrypting stored credentials.
+
+    The first key is the primary key: it encrypts all new data. Every key can
+    decrypt, so data written under a retired key stays readable until it is
+    re-encrypted with `rotate()`.
+    """
+
+    def __init__(self, keys: Sequence[str]):
+        if not keys:
+            raise ValueError("At least one encryption key is required")
+        self._fernet = MultiFernet([Fernet(key.encode()) for key in keys])
+
+    def encrypt(self, data: str) -> str:
+        """Encrypts a string with the primary key."""
+        return self._fernet.encrypt(data.encode()).decode()
+
+    def decrypt(self, encrypted_data: str) -> str:
+        """Decrypts a string encrypted with any key in the keyring."""
+        return self._fernet.decrypt(encrypted_data.encode()).decode()
+
+    def encrypt_many(self, items: Iterable[bytes]) -> List[bytes]:
+        """Encrypts a batch of byte strings with the primary key."""
+        encrypt = self._fernet.encrypt
+        return [encrypt(item) for item in items]
+
+    def decrypt_many(self, tokens: Iterable[bytes]) -> List[bytes]:
+        """Decrypts a batch of Fernet tokens encrypted with any key in the keyring."""
+        decrypt = self._fernet.decrypt
+        return [decrypt(token) for token in tokens]
+
+    def rotate(self, token: bytes) -> bytes:
+        """Re-encrypts a token with the primary key, keeping its original timestamp."""
+        return self._fernet.rotate(token)
+
+
+def parse_keys(value: str) -> List[str]:
+    """Splits a comma-separated list of keys, ignoring blanks."""
+    return [key.strip() for key in value.split(",") if key.strip()]
+
+@lru_cache()
+def get_keyring() -> CredentialKeyring:
+    """
+    Returns the app-wide keyring built from settings.
+
+    CREDENTIAL_ENCRYPTION_KEY is the primary key; CREDENTIAL_ENCRYPTION_OLD_KEYS
+    lists retired keys that are still accepted for decryption.
+    """
+    settings = get_settings()
+    return CredentialKeyring(
+        parse_keys(settings.CREDENTIAL_ENCRYPTION_KEY)
+        + parse_keys(settings.CREDENTIAL_ENCRYPTION_OLD_KEYS)
+    )
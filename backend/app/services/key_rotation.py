@@ -0,0 +1,191 @@
+"""
+Re-encrypts stored credentials with the current primary encryption key.
+
+To rotate CREDENTIAL_ENCRYPTION_KEY without downtime:
+
+1. Deploy with the new key as CREDENTIAL_ENCRYPTION_KEY and the old key in
+   CREDENTIAL_ENCRYPTION_OLD_KEYS. Both keys now decrypt; new writes use the
+   new key.
+2. Run `python -m app.services.key_rotation` (from the backend directory).
+   The job can be interrupted and re-run; it resumes from its checkpoint.
+3. Once it completes, remove the old key from CREDENTIAL_ENCRYPTION_OLD_KEYS.
+"""
+import argparse
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from cryptography.fernet import InvalidToken
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.engine import Engine
+
+from app.models.database import Credential
+from app.services.encryption import CredentialKeyring
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = ".credential_rotation_checkpoint.json"
+
+credentials_table = Credential.__table__
+
+# Only overwrite a row if its tokens are still the ones we read, so a
+# concurrent OAuth callback or token refresh is never clobbered.
+_update_statement = (
+    update(credentials_table)
+    .where(
+        and_(
+            credentials_table.c.id == bindparam("b_id"),
+            credentials_table.c.access_token == bindparam("b_old_access_token"),
+            credentials_table.c.refresh_token.is_not_distinct_from(
+                bindparam("b_old_refresh_token")
+            ),
+        )
+    )
+    .values(
+        access_token=bindparam("b_access_token"),
+        refresh_token=bindparam("b_refresh_token"),
+    )
+)
+
+
+@dataclass
+class RotationResult:
+    rotated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    last_id: int = 0
+
+
+def read_checkpoint(path: Optional[str]) -> int:
+    """Returns the last credential id processed, or 0 if there is no checkpoint."""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return int(json.load(f)["last_id"])
+
+
+def write_checkpoint(path: Optional[str], last_id: int) -> None:
+    """Atomically records the last credential id processed."""
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_id": last_id}, f)
+    os.replace(tmp_path, path)
+
+
+def _rotate_token(keyring: CredentialKeyring, token: Optional[str]) -> Optional[str]:
+    if token is None:
+        return None
+    return keyring.rotate(token.encode()).decode()
+
+
+def reencrypt_credentials(
+    engine: Engine,
+    keyring: CredentialKeyring,
+    batch_size: int = 500,
+    page_size: int = 10000,
+    checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH,
+) -> RotationResult:
+    """
+    Re-encrypts every credential's tokens with the keyring's primary key.
+
+    Rows are read in keyset-paginated pages of `page_size` ordered by id, each
+    streamed through a server-side cursor in batches of `batch_size`. Every
+    batch is written and committed on a separate connection, then the
+    checkpoint is advanced, so at most one batch is held in memory and an
+    interrupted run resumes where it stopped. The checkpoint is removed once
+    the whole table has been processed.
+    """
+    result = RotationResult(last_id=read_checkpoint(checkpoint_path))
+    if result.last_id:
+        logger.info("Resuming credential re-encryption after id %s", result.last_id)
+
+    while True:
+        page_rows = 0
+        query = (
+            select(
+                credentials_table.c.id,
+                credentials_table.c.access_token,
+                credentials_table.c.refresh_token,
+            )
+            .where(credentials_table.c.id > result.last_id)
+            .order_by(credentials_table.c.id)
+            .limit(page_size)
+        )
+        with engine.connect() as read_conn:
+            rows = read_conn.execution_options(
+                stream_results=True, yield_per=batch_size
+            ).execute(query)
+            for batch in rows.partitions():
+                page_rows += len(batch)
+                params = []
+                for row in batch:
+                    try:
+                        params.append(
+                            {
+                                "b_id": row.id,
+                                "b_old_access_token": row.access_token,
+                                "b_old_refresh_token": row.refresh_token,
+                                "b_access_token": _rotate_token(keyring, row.access_token),
+                                "b_refresh_token": _rotate_token(keyring, row.refresh_token),
+                            }
+                        )
+                    except InvalidToken:
+                        logger.error("Could not decrypt credential %s, skipping", row.id)
+                        result.failed += 1
+
+                if params:
+                    with engine.begin() as write_conn:
+                        updated = write_conn.execute(_update_statement, params).rowcount
+                    # rowcount may be unavailable (-1) for executemany on some drivers.
+                    if updated >= 0:
+                        result.rotated += updated
+                        result.skipped += len(params) - updated
+                    else:
+                        result.rotated += len(params)
+
+                result.last_id = batch[-1].id
+                write_checkpoint(checkpoint_path, result.last_id)
+                logger.info(
+                    "Re-encrypted credentials up to id %s (%s rotated, %s changed concurrently, "
+                    "%s failed)",
+                    result.last_id, result.rotated, result.skipped, result.failed
+                )
+
+        if page_rows < page_size:
+            break
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=10000)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    args = parser.parse_args()
+
+    from app.core.database import get_engine
+    from app.services.encryption import get_keyring
+
+    logging.basicConfig(level=logging.INFO)
+    result = reencrypt_credentials(
+        get_engine(),
+        get_keyring(),
+        batch_size=args.batch_size,
+        page_size=args.page_size,
+        checkpoint_path=args.checkpoint,
+    )
+    logger.info(
+        "Credential re-encryption complete: %s rotated, %s changed concurrently, %s failed",
+        result.rotated, result.skipped, result.failed
+    )
+
+
+if __name__ == "__main__":
+    main()
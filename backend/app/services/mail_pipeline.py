@@ -0,0 +1,352 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased
+
+from app.core.config import Settings
+from app.models.database import User, Credential
+from app.services.access_tokens import get_access_token
+from app.services.credentials import get_credential_for_firebase_uid
+from app.services.outlook import MailboxSync, OutlookService
+
+logger = logging.getLogger(__name__)
+
+# classify(tenant, message) returns what to write to the CRM, or None to skip
+# the message; write(tenant, result) performs it.
+Classifier = Callable[[str, Dict[str, Any]], Awaitable[Optional[Any]]]
+Writer = Callable[[str, Any], Awaitable[None]]
+Source = Callable[[], AsyncIterator[Dict[str, Any]]]
+# Called with a tenant once all of its messages were written without errors.
+Completion = Callable[[str], Awaitable[None]]
+
+FETCH = "fetch"
+CLASSIFY = "classify"
+WRITE = "write"
+STAGES = (FETCH, CLASSIFY, WRITE)
+
+# Marks the end of a stage's input.
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+
+    def snapshot(self, elapsed: float) -> Dict[str, float]:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "per_second": round(self.processed / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+@dataclass
+class _Tenant:
+    name: str
+    slots: asyncio.Semaphore
+    pending: int = 0
+    fetched: bool = False
+    failed: bool = False
+
+
+@dataclass
+class _Item:
+    tenant: _Tenant
+    payload: Any
+
+
+class MailPipeline:
+    """
+    Streams messages through fetch -> classify -> write without storing them.
+
+    Each tenant's messages come from an async iterator (see `OutlookMailbox`).
+    Stages are connected by bounded queues, so a slow stage backs up into the
+    fetchers instead of buffering mail in memory, and each stage runs a fixed
+    number of workers. For fairness, a tenant may have at most
+    `tenant_in_flight` messages anywhere in the pipeline; a large mailbox then
+    waits on its own limit while other tenants' messages keep flowing, and
+    only holds one of the `fetch_concurrency` fetch slots while it is actually
+    reading from its source. A message is referenced only while it is in a
+    queue or being worked on.
+
+    Once every message of a tenant has been written (or skipped) without an
+    error, `on_complete` is called with the tenant, e.g. to advance its sync
+    position; a tenant with any failed message is left to be fetched again.
+    """
+
+    def __init__(
+        self,
+        classify: Classifier,
+        write: Writer,
+        queue_size: int = 100,
+        fetch_concurrency: int = 4,
+        classify_concurrency: int = 8,
+        write_concurrency: int = 4,
+        tenant_in_flight: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.classify = classify
+        self.write = write
+        self.queue_size = queue_size
+        self.fetch_concurrency = fetch_concurrency
+        self.classify_concurrency = classify_concurrency
+        self.write_concurrency = write_concurrency
+        self.tenant_in_flight = tenant_in_flight
+        self._clock = clock
+        self.stats: Dict[str, StageStats] = {stage: StageStats() for stage in STAGES}
+        self._started_at: Optional[float] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._on_complete: Optional[Completion] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings, classify: Classifier, write: Writer) -> "MailPipeline":
+        return cls(
+            classify,
+            write,
+            queue_size=settings.MAIL_PIPELINE_QUEUE_SIZE,
+            fetch_concurrency=settings.MAIL_PIPELINE_FETCH_CONCURRENCY,
+            classify_concurrency=settings.MAIL_PIPELINE_CLASSIFY_CONCURRENCY,
+            write_concurrency=settings.MAIL_PIPELINE_WRITE_CONCURRENCY,
+            tenant_in_flight=settings.MAIL_PIPELINE_TENANT_IN_FLIGHT,
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-stage counters and current queue depths."""
+        elapsed = self._clock() - self._started_at if self._started_at is not None else 0.0
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "stages": {stage: stats.snapshot(elapsed) for stage, stats in self.stats.items()},
+            "queued": {stage: queue.qsize() for stage, queue in self._queues.items()},
+        }
+
+    async def run(
+        self, sources: Dict[str, Source], on_complete: Optional[Completion] = None
+    ) -> None:
+        """
+        Processes every message from `sources`, a mapping of tenant to a
+        callable returning that tenant's message iterator. Returns once all
+        messages have been written or dropped.
+        """
+        self._on_complete = on_complete
+        self._started_at = self._clock()
+        classify_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._queues = {CLASSIFY: classify_queue, WRITE: write_queue}
+
+        fetch_slots = asyncio.Semaphore(self.fetch_concurrency)
+        classifiers = [
+            asyncio.create_task(self._classify_worker(classify_queue, write_queue))
+            for _ in range(self.classify_concurrency)
+        ]
+        writers = [
+            asyncio.create_task(self._write_worker(write_queue))
+            for _ in range(self.write_concurrency)
+        ]
+        try:
+            await asyncio.gather(
+                *(
+                    self._fetch(tenant, source, fetch_slots, classify_queue)
+                    for tenant, source in sources.items()
+                )
+            )
+            for _ in classifiers:
+                await classify_queue.put(_DONE)
+            await asyncio.gather(*classifiers)
+            for _ in writers:
+                await write_queue.put(_DONE)
+            await asyncio.gather(*writers)
+        finally:
+            for task in classifiers + writers:
+                task.cancel()
+
+    async def _fetch(
+        self,
+        name: str,
+        source: Source,
+        fetch_slots: asyncio.Semaphore,
+        classify_queue: asyncio.Queue,
+    ) -> None:
+        stats = self.stats[FETCH]
+        tenant = _Tenant(name, asyncio.Semaphore(self.tenant_in_flight))
+        messages = source()
+        try:
+            while True:
+                # Wait for room in the pipeline before taking a fetch slot,
+                # and count only the time spent reading as busy.
+                await tenant.slots.acquire()
+                async with fetch_slots:
+                    started = self._clock()
+                    try:
+                        message = await anext(messages)
+                    except StopAsyncIteration:
+                        tenant.slots.release()
+                        break
+                    finally:
+                        stats.busy_seconds += self._clock() - started
+                stats.processed += 1
+                tenant.pending += 1
+                await classify_queue.put(_Item(tenant, message))
+        except Exception as e:
+            tenant.slots.release()
+            tenant.failed = True
+            stats.failed += 1
+            logger.error("Error fetching mail for tenant %s: %s", name, e)
+        finally:
+            aclose = getattr(messages, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        tenant.fetched = True
+        await self._settle(tenant)
+
+    async def _classify_worker(self, classify_queue: asyncio.Queue, write_queue: asyncio.Queue) -> None:
+        # Items are handled in helpers so an idle worker holds no message.
+        while (item := await classify_queue.get()) is not _DONE:
+            await self._classify_one(item, write_queue)
+
+    async def _classify_one(self, item: _Item, write_queue: asyncio.Queue) -> None:
+        stats = self.stats[CLASSIFY]
+        started = self._clock()
+        try:
+            result = await self.classify(item.tenant.name, item.payload)
+        except Exception as e:
+            stats.failed += 1
+            logger.error("Error classifying message for tenant %s: %s", item.tenant.name, e)
+            await self._finish(item.tenant, failed=True)
+            return
+        finally:
+            stats.busy_seconds += self._clock() - started
+
+        stats.processed += 1
+        if result is None:
+            await self._finish(item.tenant)
+            return
+        # Hand on only the classification result; the message is dropped here.
+        await write_queue.put(_Item(item.tenant, result))
+
+    async def _write_worker(self, write_queue: asyncio.Queue) -> None:
+        while (item := await write_queue.get()) is not _DONE:
+            await self._write_one(item)
+
+    async def _write_one(self, item: _Item) -> None:
+        stats = self.stats[WRITE]
+        started = self._clock()
+        failed = False
+        try:
+            await self.write(item.tenant.name, item.payload)
+            stats.processed += 1
+        except Exception as e:
+            failed = True
+            stats.failed += 1
+            logger.error("Error writing CRM action for tenant %s: %s", item.tenant.name, e)
+        finally:
+            stats.busy_seconds += self._clock() - started
+        await self._finish(item.tenant, failed)
+
+    async def _finish(self, tenant: _Tenant, failed: bool = False) -> None:
+        """Marks one of a tenant's messages as done with."""
+        tenant.slots.release()
+        tenant.pending -= 1
+        tenant.failed = tenant.failed or failed
+        await self._settle(tenant)
+
+    async def _settle(self, tenant: _Tenant) -> None:
+        # Runs exactly once per tenant: after its last message, or after the
+        # fetch if that finished last.
+        if not tenant.fetched or tenant.pending or self._on_complete is None:
+            return
+        if tenant.failed:
+            logger.warning("Not completing mail sync for tenant %s after errors", tenant.name)
+            return
+        try:
+            await self._on_complete(tenant.name)
+        except Exception as e:
+            logger.error("Error completing mail sync for tenant %s: %s", tenant.name, e)
+
+
+async def load_mail_tenants(db: AsyncSession) -> List[str]:
+    """Firebase UIDs of users with both Outlook and Pipedrive connected."""
+    pipedrive = aliased(Credential)
+    result = await db.execute(
+        select(User.firebase_id)
+        .join(Credential, Credential.user_id == User.id)
+        .join(pipedrive, pipedrive.user_id == User.id)
+        .where(Credential.service_name == "outlook", pipedrive.service_name == "pipedrive")
+        .order_by(User.id)
+    )
+    return list(result.scalars())
+
+
+class OutlookMailbox:
+    """
+    A tenant's new and changed Outlook messages since the last sync.
+
+    The delta link advances in `complete()`, which the pipeline calls only
+    once every message has been written, so messages still queued or
+    failing when the process dies are fetched again on the next pass.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        client: httpx.AsyncClient,
+        firebase_uid: str,
+    ):
+        self.session_factory = session_factory
+        self.client = client
+        self.firebase_uid = firebase_uid
+        self._sync: Optional[MailboxSync] = None
+
+    async def messages(self) -> AsyncIterator[Dict[str, Any]]:
+        async with self.session_factory() as db:
+            access_token = await get_access_token(db, self.firebase_uid, "outlook", self.client)
+            if access_token is None:
+                return
+            # Read after any refresh above, so the sync starts from the
+            # current refresh token (see MailboxSync.commit).
+            credential = await get_credential_for_firebase_uid(db, self.firebase_uid, "outlook")
+        if credential is None:
+            return
+
+        # No connection is held while mail is fetched.
+        self._sync = MailboxSync(OutlookService(self.client, access_token), credential)
+        async for message in self._sync.messages():
+            yield message
+
+    async def complete(self) -> None:
+        if self._sync is None:
+            return
+        async with self.session_factory() as db:
+            await self._sync.commit(db)
+
+
+async def run_mail_pipeline(
+    session_factory: async_sessionmaker,
+    client: httpx.AsyncClient,
+    settings: Settings,
+    classify: Classifier,
+    write: Writer,
+) -> Dict[str, Any]:
+    """Runs one pass of the pipeline over every connected tenant and returns its counters."""
+    async with session_factory() as db:
+        tenants = await load_mail_tenants(db)
+
+    mailboxes = {tenant: OutlookMailbox(session_factory, client, tenant) for tenant in tenants}
+    pipeline = MailPipeline.from_settings(settings, classify, write)
+    await pipeline.run(
+        {tenant: mailbox.messages for tenant, mailbox in mailboxes.items()},
+        on_complete=lambda tenant: mailboxes[tenant].complete(),
+    )
+    snapshot = pipeline.snapshot()
+    logger.info("Mail pipeline processed %s tenants: %s", len(tenants), snapshot)
+    return snapshot
@@ -0,0 +1,138 @@
+import abc
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OAuthSession:
+    """A pending OAuth flow, created by /initiate/* and consumed by its callback."""
+
+    user_id: str
+    service: str
+    created_at: float
+
+
+class OAuthSessionStore(abc.ABC):
+    """
+    Interface for storing pending OAuth sessions.
+
+    Sessions are single-use: `pop()` returns and removes a session, so a
+    callback cannot be replayed. Sessions older than the store's TTL are
+    treated as missing.
+    """
+
+    @abc.abstractmethod
+    async def put(self, session_token: str, session: OAuthSession) -> None:
+        """Stores a session under its token."""
+
+    @abc.abstractmethod
+    async def pop(self, session_token: str) -> Optional[OAuthSession]:
+        """Removes and returns a session, or None if missing or expired."""
+
+
+class InMemoryOAuthSessionStore(OAuthSessionStore):
+    """
+    Process-local session store with TTL expiry and a size cap.
+
+    Every session has the same TTL, so insertion order is also expiry order:
+    expired sessions are swept from the front of an OrderedDict on each
+    `put()`, in amortized O(1). When `max_entries` is reached the oldest
+    session is dropped. Only suitable for a single instance.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._sessions: "OrderedDict[str, OAuthSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expired(self, session: OAuthSession, now: float) -> bool:
+        return session.created_at + self.ttl_seconds <= now
+
+    def _sweep(self, now: float) -> None:
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if not self._expired(session, now):
+                break
+            self._sessions.popitem(last=False)
+
+    async def put(self, session_token: str, session: OAuthSession) -> None:
+        self._sweep(self._clock())
+        self._sessions.pop(session_token, None)
+        self._sessions[session_token] = session
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+
+    async def pop(self, session_token: str) -> Optional[OAuthSession]:
+        session = self._sessions.pop(session_token, None)
+        if session is None or self._expired(session, self._clock()):
+            return None
+        return session
+
+
+class RedisOAuthSessionStore(OAuthSessionStore):
+    """
+    Session store backed by Redis, shared by all instances.
+
+    `client` is any object implementing the `set(name, value, ex=...)` and
+    `getdel(name)` coroutines of `redis.asyncio.Redis` (GETDEL needs Redis
+    6.2+). Expiry is delegated to Redis key TTLs; the size bound is the
+    server's `maxmemory` policy.
+    """
+
+    def __init__(self, client: Any, ttl_seconds: int, key_prefix: str = "oauth_session:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    async def put(self, session_token: str, session: OAuthSession) -> None:
+        await self.client.set(
+            self.key_prefix + session_token,
+            json.dumps(asdict(session)),
+            ex=self.ttl_seconds,
+        )
+
+    async def pop(self, session_token: str) -> Optional[OAuthSession]:
+        value = await self.client.getdel(self.key_prefix + session_token)
+        if value is None:
+            return None
+        return OAuthSession(**json.loads(value))
+
+
+@lru_cache()
+def get_oauth_session_store() -> OAuthSessionStore:
+    """
+    Returns the app-wide OAuth session store.
+
+    Uses Redis when OAUTH_SESSION_REDIS_URL is set (requires the optional
+    'redis' package), otherwise an in-memory store.
+    """
+    settings = get_settings()
+    if settings.OAUTH_SESSION_REDIS_URL:
+        import redis.asyncio as redis
+
+        logger.info("Using Redis OAuth session store")
+        return RedisOAuthSessionStore(
+            redis.from_url(settings.OAUTH_SESSION_REDIS_URL),
+            settings.OAUTH_SESSION_TTL_SECONDS,
+        )
+    return InMemoryOAuthSessionStore(
+        settings.OAUTH_SESSION_TTL_SECONDS, settings.OAUTH_SESSION_MAX_ENTRIES
+    )
@@ -0,0 +1,41 @@
+import httpx
+
+from app.core.config import get_settings
+
+OUTLOOK_SCOPES = "openid profile offline_access User.Read Mail.ReadWrite"
+OUTLOOK_TOKEN_URL = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
+PIPEDRIVE_TOKEN_URL = "https://oauth.pipedrive.com/oauth/token"
+
+
+async def refresh_access_token(
+    client: httpx.AsyncClient, service_name: str, refresh_token: str
+) -> dict:
+    """
+    Exchanges a refresh token for new tokens with the provider.
+
+    Returns the provider's token response (`access_token`, `expires_in` and,
+    when the provider rotates it, a new `refresh_token`). Raises
+    httpx.HTTPStatusError if the provider rejects the refresh.
+    """
+    settings = get_settings()
+    if service_name == "outlook":
+        token_url = OUTLOOK_TOKEN_URL
+        token_data = {
+            "client_id": settings.OUTLOOK_CLIENT_ID,
+            "client_secret": settings.OUTLOOK_CLIENT_SECRET,
+            "scope": OUTLOOK_SCOPES,
+        }
+    elif service_name == "pipedrive":
+        token_url = PIPEDRIVE_TOKEN_URL
+        token_data = {
+            "client_id": settings.PIPEDRIVE_CLIENT_ID,
+            "client_secret": settings.PIPEDRIVE_CLIENT_SECRET,
+        }
+    else:
+        raise ValueError(f"Unknown service: {service_name}")
+
+    token_data["grant_type"] = "refresh_token"
+    token_data["refresh_token"] = refresh_token
+    response = await client.post(token_url, data=token_data)
+    response.raise_for_status()
+    return response.json()
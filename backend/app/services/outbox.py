@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import Settings, get_settings
+from app.models.database import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Event types.
+CREDENTIAL_CONNECTED = "credential_connected"
+USER_PROVISIONED = "user_provisioned"
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    event_type: str
+    key: str
+    payload: Dict[str, Any]
+    created_at: datetime
+
+
+async def add_event(
+    db: AsyncSession, event_type: str, key: str, payload: Dict[str, Any]
+) -> None:
+    """
+    Records an event in the outbox as part of the session's transaction.
+
+    The event is published only if, and once, the transaction commits. While
+    OUTBOX_DISPATCH_ENABLED is off nothing would ever publish or delete it,
+    so it is not recorded at all.
+    """
+    if not get_settings().OUTBOX_DISPATCH_ENABLED:
+        return
+    await db.execute(
+        insert(OutboxEvent).values(event_type=event_type, key=key, payload=payload)
+    )
+
+
+class Sink(Protocol):
+    async def publish(self, messages: List[OutboxMessage]) -> None:
+        """Publishes a batch; raising leaves the whole batch in the outbox."""
+
+
+class QueueSink:
+    """Hands events to in-process consumers through a bounded asyncio.Queue."""
+
+    def __init__(self, maxsize: int):
+        self.queue: "asyncio.Queue[OutboxMessage]" = asyncio.Queue(maxsize)
+
+    async def publish(self, messages: List[OutboxMessage]) -> None:
+        # Refuse the batch rather than part of it: the dispatcher retries it
+        # whole, so a partially delivered batch would be delivered twice.
+        if self.queue.maxsize and self.queue.qsize() + len(messages) > self.queue.maxsize:
+            raise asyncio.QueueFull(f"Outbox queue cannot take {len(messages)} events")
+        for message in messages:
+            self.queue.put_nowait(message)
+
+
+Handler = Callable[[OutboxMessage], Awaitable[None]]
+
+
+class FakeBroker:
+    """
+    A local stand-in for a Pub/Sub broker: one topic per event type.
+
+    Subscribers are awaited as each event is published; events of a type no
+    one subscribes to are acknowledged and dropped, as with a topic without
+    subscriptions.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Handler]] = defaultdict(list)
+        self.published = 0
+
+    def subscribe(self, event_type: str, handler: Handler) -> None:
+        self._subscribers[event_type].append(handler)
+
+    async def publish(self, messages: List[OutboxMessage]) -> None:
+        for message in messages:
+            for handler in self._subscribers.get(message.event_type, ()):
+                await handler(message)
+        self.published += len(messages)
+
+
+def create_sink(settings: Settings) -> Sink:
+    if settings.OUTBOX_SINK == "queue":
+        return QueueSink(settings.OUTBOX_QUEUE_SIZE)
+    if settings.OUTBOX_SINK == "broker":
+        return FakeBroker()
+    raise ValueError(f"Unknown OUTBOX_SINK: {settings.OUTBOX_SINK}")
+
+
+class OutboxDispatcher:
+    """
+    Publishes outbox events to a sink in batches.
+
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    instances can drain the outbox concurrently without publishing an event
+    twice, then published with one `sink.publish` call and removed with a
+    single bulk DELETE in the same transaction. If publishing fails the
+    transaction rolls back and the batch is retried on the next poll, so
+    delivery is at least once. Each batch is in outbox order, but with
+    several instances skipping each other's locked rows, a later event for
+    a key can be published before an earlier one; consumers must not rely
+    on per-key order.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        sink: Sink,
+        settings: Settings,
+    ):
+        self.session_factory = session_factory
+        self.sink = sink
+        self.batch_size = settings.OUTBOX_BATCH_SIZE
+        self.interval = settings.OUTBOX_POLL_INTERVAL_SECONDS
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="outbox-dispatcher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Drain full batches back to back; poll again once caught up.
+                while await self.dispatch_batch() == self.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error dispatching outbox events: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def dispatch_batch(self) -> int:
+        """Publishes and deletes one batch of events; returns how many."""
+        async with self.session_factory() as db:
+            async with db.begin():
+                result = await db.execute(
+                    select(OutboxEvent)
+                    .order_by(OutboxEvent.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                messages = [
+                    OutboxMessage(
+                        id=event.id,
+                        event_type=event.event_type,
+                        key=event.key,
+                        payload=event.payload,
+                        created_at=event.created_at,
+                    )
+                    for event in result.scalars()
+                ]
+                if not messages:
+                    return 0
+
+                await self.sink.publish(messages)
+                await db.execute(
+                    delete(OutboxEvent).where(
+                        OutboxEvent.id.in_([message.id for message in messages])
+                    )
+                )
+        logger.info("Published %s outbox events", len(messages))
+        return len(messages)
@@ -0,0 +1,327 @@
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import get_settings
+from app.core.http_clients import MICROSOFT
+from app.models.database import Credential
+from app.services.credentials import save_delta_link
+from app.services.response_cache import ProviderResponseCache
+from app.utils.retry import IDEMPOTENT_METHODS, RetryPolicy, retry_after, send_with_retries
+
+logger = logging.getLogger(__name__)
+
+# Graph accepts at most 20 requests per JSON $batch.
+MAX_BATCH_SIZE = 20
+
+# Throttled, unavailable and gateway-timeout responses are worth retrying;
+# other 5xx errors from Graph are not transient.
+RETRY_STATUS_CODES = frozenset({429, 503, 504})
+
+# Message fields fetched by default. Bodies are left out: we only keep what is
+# needed to decide what to do with a message, never its content.
+DEFAULT_MESSAGE_FIELDS = (
+    "id",
+    "conversationId",
+    "subject",
+    "from",
+    "toRecipients",
+    "ccRecipients",
+    "receivedDateTime",
+    "isRead",
+)
+
+
+class OutlookAPIError(Exception):
+    """Raised when Microsoft Graph returns an error response."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Graph API error: {status_code} - {message}")
+        self.status_code = status_code
+
+
+@dataclass
+class BatchResponse:
+    """The response to one request of a $batch."""
+
+    status: int
+    body: Any = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+
+@dataclass
+class DeltaPage:
+    """One page of a delta query; `delta_link` is only set on the last page."""
+
+    messages: List[Dict[str, Any]]
+    delta_link: Optional[str] = None
+
+
+class OutlookService:
+    """
+    Microsoft Graph mail client for one mailbox.
+
+    Requests go through the app's pooled Microsoft client. Throttled (429) and
+    unavailable (503/504) responses are retried with jittered exponential
+    backoff, honouring Retry-After. `batch` packs many calls into JSON $batch
+    requests of up to 20, and `iter_delta_pages` syncs a mail folder
+    incrementally from a stored delta link.
+
+    With a `cache`, stable reads (`cached_get`, e.g. the mailbox profile) are
+    served from it under the `tenant` key (by default, the access token).
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        access_token: str,
+        base_url: Optional[str] = None,
+        max_retries: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+        tenant: Optional[str] = None,
+        cache: Optional[ProviderResponseCache] = None,
+    ):
+        settings = get_settings()
+        self.client = client
+        self.base_url = (base_url or settings.GRAPH_API_URL).rstrip("/")
+        self.retry_policy = RetryPolicy(
+            max_retries=settings.GRAPH_MAX_RETRIES if max_retries is None else max_retries,
+            backoff_seconds=(
+                settings.GRAPH_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+            ),
+            retry_status_codes=RETRY_STATUS_CODES,
+        )
+        self._headers = {"Authorization": f"Bearer {access_token}"}
+        self.tenant = tenant or "token:" + hashlib.sha256(access_token.encode()).hexdigest()[:16]
+        self.cache = cache
+
+    def _url(self, path: str) -> str:
+        # nextLink and deltaLink URLs returned by Graph are already absolute.
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        idempotent: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """Sends a request and returns the decoded JSON body."""
+        response = await self._send(method, path, headers, idempotent, **kwargs)
+        return response.json()
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        idempotent: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """Sends a request, with retries, raising on error responses."""
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        url = self._url(path)
+        headers = {**self._headers, **(headers or {})}
+        response = await send_with_retries(
+            lambda: self.client.request(method, url, headers=headers, **kwargs),
+            self.retry_policy,
+            idempotent,
+            f"Graph {method} {path}",
+        )
+        if response.status_code >= 400:
+            raise OutlookAPIError(response.status_code, response.text)
+        return response
+
+    async def cached_get(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """GETs a rarely changing resource through the response cache, if any."""
+        if self.cache is None:
+            return await self.request("GET", path, params=params)
+        url = str(httpx.URL(self._url(path), params=params))
+        return await self.cache.get(
+            MICROSOFT,
+            self.tenant,
+            url,
+            lambda headers: self._send("GET", path, headers=headers, params=params),
+            ttl_seconds,
+        )
+
+    async def get_profile(self) -> Dict[str, Any]:
+        """Returns the signed-in user's profile (name, mail address, ...)."""
+        return await self.cached_get("me")
+
+    async def batch(self, requests: Sequence[Dict[str, Any]]) -> List[BatchResponse]:
+        """
+        Sends Graph requests via JSON $batch, 20 per round-trip.
+
+        Each request is a dict with "method", "url" (relative to the API
+        version, e.g. "/me/messages/{id}") and optionally "body" and "headers".
+        Responses are returned in request order. Individual requests that are
+        throttled (or, if idempotent, unavailable) are resent in a follow-up
+        batch after their Retry-After; other failures are returned as-is for
+        the caller to inspect.
+        """
+        responses: List[Optional[BatchResponse]] = [None] * len(requests)
+        for offset in range(0, len(requests), MAX_BATCH_SIZE):
+            pending = list(range(offset, min(offset + MAX_BATCH_SIZE, len(requests))))
+            attempt = 0
+            while pending:
+                results = await self._send_batch(requests, pending)
+                throttled = []
+                wait = 0.0
+                for index in pending:
+                    result = results.get(index) or BatchResponse(status=500)
+                    responses[index] = result
+                    idempotent = requests[index]["method"].upper() in IDEMPOTENT_METHODS
+                    if self.retry_policy.is_retryable(result.status, idempotent):
+                        throttled.append(index)
+                        wait = max(wait, retry_after(result.headers) or 0)
+                if not throttled or attempt >= self.retry_policy.max_retries:
+                    break
+                delay = self.retry_policy.backoff(attempt, wait)
+                logger.warning(
+                    "Graph throttled %s batched requests, retrying in %.2fs", len(throttled), delay
+                )
+                attempt += 1
+                await asyncio.sleep(delay)
+                pending = throttled
+        return responses
+
+    async def _send_batch(
+        self, requests: Sequence[Dict[str, Any]], indexes: List[int]
+    ) -> Dict[int, BatchResponse]:
+        payload = []
+        for index in indexes:
+            item = {"id": str(index), **requests[index]}
+            item["method"] = item["method"].upper()
+            if "body" in item:
+                item.setdefault("headers", {}).setdefault("Content-Type", "application/json")
+            payload.append(item)
+        body = await self.request(
+            "POST",
+            "$batch",
+            json={"requests": payload},
+            idempotent=all(item["method"] in IDEMPOTENT_METHODS for item in payload),
+        )
+        return {
+            int(item["id"]): BatchResponse(
+                status=item.get("status", 500),
+                body=item.get("body"),
+                headers=item.get("headers") or {},
+            )
+            for item in body.get("responses", [])
+        }
+
+    async def get_messages(
+        self, message_ids: Sequence[str], fields: Sequence[str] = DEFAULT_MESSAGE_FIELDS
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Fetches messages by id in batches; missing messages come back as None."""
+        select = ",".join(fields)
+        responses = await self.batch(
+            [
+                {"method": "GET", "url": f"/me/messages/{message_id}?$select={select}"}
+                for message_id in message_ids
+            ]
+        )
+        return [response.body if response.ok else None for response in responses]
+
+    async def iter_delta_pages(
+        self,
+        delta_link: Optional[str] = None,
+        folder: str = "inbox",
+        fields: Sequence[str] = DEFAULT_MESSAGE_FIELDS,
+        page_size: int = 50,
+    ) -> AsyncIterator[DeltaPage]:
+        """
+        Yields pages of new, changed and removed messages in a mail folder.
+
+        Without a `delta_link` this is a full sync of the folder; with one it
+        returns only what changed since that link was issued. The last page
+        carries the delta link to resume from next time. Removed messages are
+        reported with an "@removed" key. If Graph has expired the delta link
+        (410 Gone), the sync starts over from scratch.
+        """
+        initial_url = f"/me/mailFolders/{folder}/messages/delta"
+        initial_params = {"$select": ",".join(fields)}
+        headers = {"Prefer": f"odata.maxpagesize={page_size}"}
+
+        url = delta_link or initial_url
+        params = None if delta_link else initial_params
+        restarted = False
+        while True:
+            try:
+                body = await self.request("GET", url, params=params, headers=headers)
+            except OutlookAPIError as e:
+                if e.status_code != 410 or restarted:
+                    raise
+                logger.warning("Graph delta link expired, restarting a full mail sync")
+                url, params, restarted = initial_url, initial_params, True
+                continue
+
+            yield DeltaPage(body.get("value", []), body.get("@odata.deltaLink"))
+            next_link = body.get("@odata.nextLink")
+            if not next_link:
+                return
+            url, params = next_link, None
+
+
+class MailboxSync:
+    """
+    One incremental sync of a mailbox.
+
+    `messages()` yields the messages that changed since the credential's last
+    sync and remembers the new delta link; `commit()` stores it. Call it only
+    once every message has been fully processed: a sync that is interrupted
+    before then resumes from the previous link instead of losing messages.
+    """
+
+    def __init__(self, service: OutlookService, credential: Credential, **kwargs: Any):
+        self.service = service
+        self.credential = credential
+        self.kwargs = kwargs
+        self.delta_link: Optional[str] = None
+
+    async def messages(self) -> AsyncIterator[Dict[str, Any]]:
+        async for page in self.service.iter_delta_pages(self.credential.delta_link, **self.kwargs):
+            for message in page.messages:
+                yield message
+            if page.delta_link:
+                self.delta_link = page.delta_link
+
+    async def commit(self, db: AsyncSession) -> None:
+        if self.delta_link is None:
+            return
+        # Guarded on the refresh token the sync started with, so a reconnect
+        # meanwhile is not overwritten with the old mailbox's link. A token
+        # refresh meanwhile also skips the save; the next sync then repeats
+        # this one's messages rather than losing any.
+        saved = await save_delta_link(
+            db, self.credential.id, self.delta_link, self.credential.refresh_token
+        )
+        if not saved:
+            logger.info(
+                "Credential %s changed during mail sync, not storing its delta link",
+                self.credential.id,
+            )
+            return
+        set_committed_value(self.credential, "delta_link", self.delta_link)
+
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from app.core.config import get_settings
+from app.core.http_clients import PIPEDRIVE
+from app.services.response_cache import ProviderResponseCache
+from app.utils.rate_limit import TokenBucket
+from app.utils.retry import (
+    IDEMPOTENT_METHODS,
+    RetryPolicy,
+    header_float,
+    retry_after,
+    send_with_retries,
+)
+
+logger = logging.getLogger(__name__)
+
+PIPEDRIVE_API_URL = "https://api.pipedrive.com/v1"
+
+# Largest page size the Pipedrive v1 list endpoints accept.
+MAX_PAGE_SIZE = 500
+
+# Pipedrive's 5xx errors are usually transient, so all of them are retried.
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Rate-limit buckets shared by every PipedriveService for the same company,
+# since Pipedrive enforces its limits per company. Least recently used
+# buckets are dropped beyond MAX_BUCKETS.
+MAX_BUCKETS = 10000
+_company_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+
+class PipedriveAPIError(Exception):
+    """Raised when Pipedrive returns an error response."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Pipedrive API error: {status_code} - {message}")
+        self.status_code = status_code
+
+
+def get_company_bucket(company_key: str) -> TokenBucket:
+    """Returns the shared rate-limit bucket for a Pipedrive company."""
+    bucket = _company_buckets.get(company_key)
+    if bucket is None:
+        settings = get_settings()
+        bucket = TokenBucket(
+            capacity=settings.PIPEDRIVE_BURST_LIMIT,
+            refill_rate=settings.PIPEDRIVE_BURST_LIMIT
+            / settings.PIPEDRIVE_BURST_WINDOW_SECONDS,
+        )
+        _company_buckets[company_key] = bucket
+        if len(_company_buckets) > MAX_BUCKETS:
+            _company_buckets.popitem(last=False)
+    else:
+        _company_buckets.move_to_end(company_key)
+    return bucket
+
+
+class PipedriveService:
+    """
+    Pipedrive API client for one tenant.
+
+    Requests go through the app's pooled Pipedrive client and are paced by a
+    token bucket per Pipedrive company, kept in step with the
+    X-RateLimit-Remaining/-Reset headers Pipedrive returns. 429 responses
+    (and, for idempotent requests, 5xx responses and connection errors) are
+    retried with jittered exponential backoff, honouring Retry-After.
+
+    With a `cache`, stable reads (`cached_get`, e.g. the current user) are
+    served from it under the `tenant` key (by default, the access token), which
+    saves both latency and rate-limit budget.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        access_token: str,
+        company_id: Optional[str] = None,
+        base_url: str = PIPEDRIVE_API_URL,
+        max_retries: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+        tenant: Optional[str] = None,
+        cache: Optional[ProviderResponseCache] = None,
+    ):
+        settings = get_settings()
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+        self.retry_policy = RetryPolicy(
+            max_retries=settings.PIPEDRIVE_MAX_RETRIES if max_retries is None else max_retries,
+            backoff_seconds=(
+                settings.PIPEDRIVE_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+            ),
+            retry_status_codes=RETRY_STATUS_CODES,
+        )
+        self._headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        }
+        # Until the company is known, pace by token so one tenant's calls
+        # still share a bucket.
+        self._token_key = "token:" + hashlib.sha256(access_token.encode()).hexdigest()[:16]
+        self.company_id = company_id
+        self.tenant = tenant or self._token_key
+        self.cache = cache
+
+    @property
+    def bucket(self) -> TokenBucket:
+        key = f"company:{self.company_id}" if self.company_id else self._token_key
+        return get_company_bucket(key)
+
+    async def request(self, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        """Sends a request and returns the decoded JSON body."""
+        return (await self._send(method, path, **kwargs)).json()
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """Sends a request, with pacing and retries, raising on error responses."""
+        method = method.upper()
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        headers = {**self._headers, **(headers or {})}
+
+        async def send() -> httpx.Response:
+            await self.bucket.acquire()
+            return await self.client.request(method, url, headers=headers, **kwargs)
+
+        def update_bucket(response: httpx.Response) -> None:
+            bucket = self.bucket
+            bucket.sync(
+                header_float(response.headers, "x-ratelimit-remaining"),
+                header_float(response.headers, "x-ratelimit-reset"),
+            )
+            wait = retry_after(response.headers)
+            if response.status_code == 429 and wait:
+                bucket.block_for(wait)
+
+        response = await send_with_retries(
+            send,
+            self.retry_policy,
+            method in IDEMPOTENT_METHODS,
+            f"Pipedrive {method} {path}",
+            on_response=update_bucket,
+        )
+        if response.status_code >= 400:
+            raise PipedriveAPIError(response.status_code, response.text)
+        return response
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self.request("GET", path, params=params)
+
+    async def cached_get(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """GETs a rarely changing resource through the response cache, if any."""
+        if self.cache is None:
+            return await self.get(path, params)
+        url = str(httpx.URL(f"{self.base_url}/{path.lstrip('/')}", params=params))
+        return await self.cache.get(
+            PIPEDRIVE,
+            self.tenant,
+            url,
+            lambda headers: self._send("GET", path, headers=headers, params=params),
+            ttl_seconds,
+        )
+
+    async def get_current_user(self) -> Dict[str, Any]:
+        """Returns the authorized Pipedrive user, and learns its company for pacing."""
+        user = (await self.cached_get("users/me")).get("data") or {}
+        if user.get("company_id"):
+            self.company_id = str(user["company_id"])
+        return user
+
+    async def get_pipelines(self) -> List[Dict[str, Any]]:
+        return (await self.cached_get("pipelines")).get("data") or []
+
+    async def get_stages(self, pipeline_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        params = {"pipeline_id": pipeline_id} if pipeline_id is not None else None
+        return (await self.cached_get("stages", params)).get("data") or []
+
+    async def iter_collection(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        page_size: int = MAX_PAGE_SIZE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields every item of a paginated v1 list endpoint.
+
+        Pages are fetched one at a time as the consumer iterates, so only a
+        single page is ever held in memory.
+        """
+        params = dict(params or {})
+        params["limit"] = min(page_size, MAX_PAGE_SIZE)
+        start = 0
+        while True:
+            params["start"] = start
+            body = await self.get(path, params=params)
+            for item in body.get("data") or []:
+                yield item
+
+            pagination = (body.get("additional_data") or {}).get("pagination") or {}
+            if not pagination.get("more_items_in_collection"):
+                return
+            start = pagination.get("next_start", start + params["limit"])
+
+    def iter_deals(self, **filters: Any) -> AsyncIterator[Dict[str, Any]]:
+        """Streams deals, e.g. `iter_deals(status="open")`."""
+        return self.iter_collection("deals", filters)
+
+    def iter_persons(self, **filters: Any) -> AsyncIterator[Dict[str, Any]]:
+        """Streams persons, e.g. `iter_persons(filter_id=1)`."""
+        return self.iter_collection("persons", filters)
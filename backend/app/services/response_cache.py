@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import get_settings
+from app.core.metrics import PROVIDER_CACHE_LOOKUPS
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Sends the GET with the given conditional headers; raises on error responses.
+Fetch = Callable[[Dict[str, str]], Awaitable[httpx.Response]]
+CacheKey = Tuple[str, str]
+# A CacheKey plus the tenant's generation when the fetch started.
+FlightKey = Tuple[str, str, int]
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: Optional[str]
+    fresh_until: float
+    stale_until: float
+
+
+class ProviderResponseCache:
+    """
+    Read-through cache of provider GET responses, partitioned by tenant.
+
+    Entries are keyed by (tenant, URL), so one tenant never sees another's
+    data. A fresh entry is served without contacting the provider. Once its
+    TTL has passed it is still served for up to `stale_seconds` while a
+    background request revalidates it; after that the caller waits for the
+    revalidation. Revalidation sends If-None-Match when the provider gave an
+    ETag, so an unchanged resource costs a 304 without a body. Concurrent
+    fetches of one key are coalesced. Least recently used entries are dropped
+    beyond `max_entries` or `max_bytes` of cached bodies.
+
+    Invalidating a tenant bumps its generation. Fetches started before that,
+    with the old account's token, still answer their callers but are not
+    stored, and later callers do not join them.
+
+    Bodies are stored as the raw JSON bytes and decoded per lookup, so callers
+    can modify what they get back. Only for use from the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        stale_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._flight = SingleFlight()
+        self._revalidating: Dict[FlightKey, asyncio.Task] = {}
+        # Only tenants invalidated at least once are in here.
+        self._generations: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    async def get(
+        self,
+        provider: str,
+        tenant: str,
+        url: str,
+        fetch: Fetch,
+        ttl_seconds: Optional[float] = None,
+    ) -> Any:
+        """Returns the decoded JSON body for `url`, fetching it only when needed."""
+        key = (tenant, url)
+        entry = self._entries.get(key)
+        now = self._clock()
+        if entry is not None:
+            self._entries.move_to_end(key)
+        if entry is not None and now < entry.fresh_until:
+            PROVIDER_CACHE_LOOKUPS.labels(provider, "hit").inc()
+            return json.loads(entry.body)
+        if entry is not None and now < entry.stale_until:
+            PROVIDER_CACHE_LOOKUPS.labels(provider, "stale").inc()
+            self._revalidate_in_background(key, fetch, ttl_seconds)
+            return json.loads(entry.body)
+
+        PROVIDER_CACHE_LOOKUPS.labels(provider, "miss").inc()
+        generation = self._generation(tenant)
+        body = await self._flight.do(
+            key + (generation,), lambda: self._fetch(key, fetch, ttl_seconds, generation)
+        )
+        return json.loads(body)
+
+    def invalidate_tenant(self, tenant: str) -> None:
+        """
+        Drops every entry of a tenant, e.g. after it reconnected an account.
+
+        Fetches in flight for the tenant are left to finish, but not stored.
+        """
+        self._generations[tenant] = self._generation(tenant) + 1
+        for key in [key for key in self._entries if key[0] == tenant]:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def _generation(self, tenant: str) -> int:
+        return self._generations.get(tenant, 0)
+
+    async def _fetch(
+        self, key: CacheKey, fetch: Fetch, ttl_seconds: Optional[float], generation: int
+    ) -> bytes:
+        # Entries past their stale window are kept until replaced or evicted,
+        # so their ETag can still make this a conditional request.
+        previous = self._entries.get(key)
+        headers = {"If-None-Match": previous.etag} if previous and previous.etag else {}
+        response = await fetch(headers)
+        body = previous.body if response.status_code == 304 and previous else response.content
+        if self._generation(key[0]) != generation:
+            # Invalidated while in flight: the response may be the old account's.
+            return body
+        if "no-store" in response.headers.get("cache-control", ""):
+            self._remove(key)
+            return body
+
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = self._clock()
+        self._store(
+            key,
+            CachedResponse(
+                body=body,
+                etag=response.headers.get("etag") or (previous.etag if previous else None),
+                fresh_until=now + ttl,
+                stale_until=now + ttl + self.stale_seconds,
+            ),
+        )
+        return body
+
+    def _revalidate_in_background(
+        self, key: CacheKey, fetch: Fetch, ttl_seconds: Optional[float]
+    ) -> None:
+        generation = self._generation(key[0])
+        flight_key = key + (generation,)
+        if flight_key in self._revalidating:
+            return
+
+        async def revalidate():
+            try:
+                await self._flight.do(
+                    flight_key, lambda: self._fetch(key, fetch, ttl_seconds, generation)
+                )
+            except Exception as e:
+                # The stale entry keeps being served until its window ends.
+                logger.warning("Revalidating cached provider response failed: %s", e)
+            finally:
+                self._revalidating.pop(flight_key, None)
+
+        self._revalidating[flight_key] = asyncio.get_running_loop().create_task(revalidate())
+
+    def _store(self, key: CacheKey, entry: CachedResponse) -> None:
+        self._remove(key)
+        if len(entry.body) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._size += len(entry.body)
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted.body)
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.body)
+
+
+@lru_cache()
+def get_response_cache() -> Optional[ProviderResponseCache]:
+    """
+    Returns the process-wide provider response cache, or None when disabled.
+
+    Set PROVIDER_CACHE_MAX_ENTRIES to 0 to always read from the providers.
+    """
+    settings = get_settings()
+    if settings.PROVIDER_CACHE_MAX_ENTRIES <= 0:
+        return None
+    return ProviderResponseCache(
+        max_entries=settings.PROVIDER_CACHE_MAX_ENTRIES,
+        max_bytes=settings.PROVIDER_CACHE_MAX_BYTES,
+        ttl_seconds=settings.PROVIDER_CACHE_TTL_SECONDS,
+        stale_seconds=settings.PROVIDER_CACHE_STALE_SECONDS,
+    )
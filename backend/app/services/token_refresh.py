@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import Settings
+from app.core.http_clients import SERVICE_PROVIDERS, HTTPClients
+from app.models.database import User, Credential
+from app.services.access_tokens import try_credential_refresh_lock
+from app.services.credential_cache import get_credential_cache
+from app.services.encryption import get_keyring
+from app.services.oauth_tokens import refresh_access_token
+
+logger = logging.getLogger(__name__)
+
+credentials_table = Credential.__table__
+
+# Only overwrite a row that still holds the refresh token we used, so a
+# reconnect saved meanwhile (which takes no lock) is never clobbered.
+_update_statement = (
+    update(credentials_table)
+    .where(
+        and_(
+            credentials_table.c.id == bindparam("b_id"),
+            credentials_table.c.refresh_token == bindparam("b_old_refresh_token"),
+        )
+    )
+    .values(
+        access_token=bindparam("b_access_token"),
+        refresh_token=bindparam("b_refresh_token"),
+        expires_at=bindparam("b_expires_at"),
+    )
+)
+
+RefreshFunc = Callable[..., Awaitable[dict]]
+
+# Credentials whose refresh failed (e.g. a revoked grant) are skipped for this
+# long, so they don't keep occupying the front of every batch.
+FAILURE_BACKOFF_SECONDS = 900
+
+
+@dataclass
+class DueCredential:
+    id: int
+    firebase_uid: str
+    service_name: str
+    refresh_token: str
+
+
+class TokenRefreshScheduler:
+    """
+    Proactively refreshes provider tokens before they expire.
+
+    Every `interval` seconds, credentials whose `expires_at` falls within
+    `window` seconds are loaded (oldest first, via ix_credentials_expires_at)
+    in batches. Each batch is refreshed with at most `concurrency` requests in
+    flight per provider, each start delayed by a random jitter so refreshes
+    don't arrive at the provider in bursts.
+
+    Every credential is locked, refreshed and saved in its own short
+    transaction under a per-credential advisory lock (the same lock
+    `app.services.access_tokens.refresh_credential` takes), so a credential
+    is never refreshed by two instances, or by the scheduler and a request,
+    at the same time, and a request waits for at most one refresh. The lock
+    is tried without waiting; credentials locked elsewhere are left for that
+    holder. A connection is only held while a refresh is in flight, not
+    during the jitter, and each new token is committed as soon as it is
+    received.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        http_clients: HTTPClients,
+        settings: Settings,
+        refresh_func: RefreshFunc = refresh_access_token,
+    ):
+        self.session_factory = session_factory
+        self.http_clients = http_clients
+        self.refresh_func = refresh_func
+        self.interval = settings.TOKEN_REFRESH_INTERVAL_SECONDS
+        self.window = timedelta(seconds=settings.TOKEN_REFRESH_WINDOW_SECONDS)
+        self.batch_size = settings.TOKEN_REFRESH_BATCH_SIZE
+        self.concurrency = settings.TOKEN_REFRESH_CONCURRENCY
+        self.jitter = settings.TOKEN_REFRESH_JITTER_SECONDS
+        self.timeout = settings.TOKEN_REFRESH_TIMEOUT_SECONDS
+        self._task: Optional[asyncio.Task] = None
+        self._failed_until: Dict[int, float] = {}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="token-refresh")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                refreshed = await self.refresh_due()
+                if refreshed:
+                    logger.info("Proactively refreshed %s provider tokens", refreshed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error in token refresh scheduler: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def refresh_due(self) -> int:
+        """Refreshes one batch of credentials expiring within the window."""
+        due = await self._load_due()
+        if not due:
+            return 0
+
+        semaphores: Dict[str, asyncio.Semaphore] = {
+            provider: asyncio.Semaphore(self.concurrency)
+            for provider in set(SERVICE_PROVIDERS.values())
+        }
+        results = await asyncio.gather(
+            *(self._refresh_one(credential, semaphores) for credential in due)
+        )
+        return sum(results)
+
+    async def _load_due(self) -> List[DueCredential]:
+        now = time.monotonic()
+        self._failed_until = {
+            credential_id: until
+            for credential_id, until in self._failed_until.items()
+            if until > now
+        }
+        query = (
+            select(
+                Credential.id,
+                User.firebase_id,
+                Credential.service_name,
+                Credential.refresh_token,
+            )
+            .join(User, User.id == Credential.user_id)
+            .where(
+                Credential.expires_at < datetime.utcnow() + self.window,
+                Credential.refresh_token.is_not(None),
+                Credential.service_name.in_(list(SERVICE_PROVIDERS)),
+            )
+            .order_by(Credential.expires_at)
+            .limit(self.batch_size)
+        )
+        if self._failed_until:
+            query = query.where(Credential.id.not_in(list(self._failed_until)))
+        async with self.session_factory() as db:
+            result = await db.execute(query)
+            return [DueCredential(*row) for row in result.all()]
+
+    async def _refresh_one(
+        self, credential: DueCredential, semaphores: Dict[str, asyncio.Semaphore]
+    ) -> bool:
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        async with semaphores[SERVICE_PROVIDERS[credential.service_name]]:
+            try:
+                refreshed = await self._refresh_locked(credential)
+            except Exception as e:
+                logger.error(
+                    "Error refreshing %s token for credential %s: %s",
+                    credential.service_name, credential.id, e
+                )
+                self._failed_until[credential.id] = (
+                    time.monotonic() + FAILURE_BACKOFF_SECONDS
+                )
+                return False
+
+        if refreshed:
+            # Committed: the new token is visible to whoever reloads it.
+            get_credential_cache().invalidate(credential.firebase_uid, credential.service_name)
+        return refreshed
+
+    async def _refresh_locked(self, credential: DueCredential) -> bool:
+        """Refreshes and saves one credential in its own transaction, if still due."""
+        keyring = get_keyring()
+        async with self.session_factory() as db:
+            async with db.begin():
+                # A separate statement, so the lock is only tried on a row the
+                # due predicates selected, never on rows the planner scans.
+                locked = await db.execute(select(try_credential_refresh_lock(credential.id)))
+                if not locked.scalar():
+                    return False
+                # Re-check under the lock: whoever held it may just have
+                # refreshed the credential, or a reconnect replaced it.
+                still_due = await db.execute(
+                    select(Credential.id).where(
+                        Credential.id == credential.id,
+                        Credential.refresh_token == credential.refresh_token,
+                        Credential.expires_at < datetime.utcnow() + self.window,
+                    )
+                )
+                if still_due.scalar_one_or_none() is None:
+                    return False
+
+                # Made under the lock, like a request-time refresh (see
+                # app.services.access_tokens), and bounded the same way.
+                tokens = await asyncio.wait_for(
+                    self.refresh_func(
+                        self.http_clients.for_service(credential.service_name),
+                        credential.service_name,
+                        keyring.decrypt(credential.refresh_token),
+                    ),
+                    self.timeout,
+                )
+                # Providers that don't rotate refresh tokens omit them.
+                refresh_token = credential.refresh_token
+                if tokens.get("refresh_token"):
+                    refresh_token = keyring.encrypt(tokens["refresh_token"])
+                result = await db.execute(
+                    _update_statement,
+                    {
+                        "b_id": credential.id,
+                        "b_old_refresh_token": credential.refresh_token,
+                        "b_access_token": keyring.encrypt(tokens["access_token"]),
+                        "b_refresh_token": refresh_token,
+                        "b_expires_at": datetime.utcnow()
+                        + timedelta(seconds=tokens["expires_in"]),
+                    },
+                )
+                return result.rowcount == 1
@@ -0,0 +1,83 @@
+import logging
+import time
+from functools import lru_cache
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.database import get_async_session_factory
+from app.services.credentials import upsert_user
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class ProvisionedUsers:
+    """
+    Process-local record of the users this instance has already provisioned.
+
+    Maps a Firebase UID to the email last written for it ("" when the token
+    carried none). Entries expire after `ttl_seconds`, so each instance
+    re-asserts a user's row now and then, and the least recently seen users
+    are dropped beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._cache: TTLCache[str] = TTLCache(maxsize=max_entries, clock=clock)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def is_current(self, firebase_uid: str, email: Optional[str]) -> bool:
+        """Whether the user exists with this email (any email, if None)."""
+        known_email = self._cache.get(firebase_uid)
+        if known_email is None:
+            return False
+        return not email or known_email == email
+
+    def add(self, firebase_uid: str, email: Optional[str]) -> None:
+        self._cache.set(firebase_uid, email or "", self._clock() + self.ttl_seconds)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+@lru_cache()
+def get_provisioned_users() -> ProvisionedUsers:
+    settings = get_settings()
+    return ProvisionedUsers(
+        settings.USER_PROVISION_CACHE_MAX_ENTRIES,
+        settings.USER_PROVISION_CACHE_TTL_SECONDS,
+    )
+
+
+async def ensure_user(
+    firebase_uid: str,
+    email: Optional[str],
+    session_factory: Optional[Callable[[], AsyncSession]] = None,
+) -> bool:
+    """
+    Makes sure a user row exists for the Firebase UID with the token's email.
+
+    Users already provisioned by this instance with the same email cost no
+    database round-trip; otherwise a single conditional upsert runs. Returns
+    whether the database was written to.
+    """
+    provisioned = get_provisioned_users()
+    if provisioned.is_current(firebase_uid, email):
+        return False
+
+    session_factory = session_factory or get_async_session_factory()
+    async with session_factory() as db:
+        await upsert_user(db, firebase_uid, email)
+    provisioned.add(firebase_uid, email)
+    logger.info("Provisioned user for Firebase UID: %s", firebase_uid)
+    return True
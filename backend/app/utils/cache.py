@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    A thread-safe, size-bounded LRU cache whose entries carry their own expiry.
+
+    Each entry is stored with an absolute expiry timestamp (seconds since the
+    epoch, as returned by ``clock``). Expired entries are dropped lazily on
+    lookup, and the least recently used entry is evicted once ``maxsize`` is
+    reached. ``on_evict`` is called with the key and value of every entry that
+    leaves the cache, whether through expiry, eviction, invalidation or
+    ``clear()``.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        clock: Callable[[], float] = time.time,
+        on_evict: Optional[Callable[[Hashable, V], Any]] = None,
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self._clock = clock
+        self._on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Tuple[V, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Returns the cached value for ``key``, or ``None`` if absent or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self._evicted(key, value)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: V, expires_at: float) -> None:
+        """Stores ``value`` under ``key`` until the absolute time ``expires_at``."""
+        if expires_at <= self._clock():
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None and previous[0] is not value:
+                self._evicted(key, previous[0])
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.maxsize:
+                old_key, (old_value, _) = self._data.popitem(last=False)
+                self._evicted(old_key, old_value)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Removes ``key`` from the cache if present."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._evicted(key, entry[0])
+
+    def clear(self) -> None:
+        """Removes every entry from the cache."""
+        with self._lock:
+            while self._data:
+                key, (value, _) = self._data.popitem(last=False)
+                self._evicted(key, value)
+
+    def _evicted(self, key: Hashable, value: V) -> None:
+        if self._on_evict is not None:
+            self._on_evict(key, value)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    Async token bucket: `capacity` tokens, refilled at `refill_rate` per second.
+
+    `acquire()` waits until a token is available. `sync()` lets callers apply
+    rate-limit state reported by the server (e.g. X-RateLimit-* headers) so
+    the local estimate never runs ahead of the real budget.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_rate: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self._clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_rate)
+            self._updated_at = now
+
+    def try_acquire(self) -> float:
+        """Takes a token if available; otherwise returns the seconds to wait."""
+        now = self._clock()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.refill_rate
+
+    async def acquire(self) -> None:
+        # Serialize waiters so tokens are handed out in arrival order.
+        async with self._lock:
+            while True:
+                wait = self.try_acquire()
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def sync(self, remaining: Optional[float], reset_after: Optional[float] = None) -> None:
+        """
+        Caps the local budget at the server-reported `remaining` requests.
+
+        When nothing remains, acquisition is blocked for `reset_after` seconds.
+        """
+        if remaining is None:
+            return
+        self._refill()
+        self._tokens = min(self._tokens, max(remaining, 0))
+        if remaining <= 0 and reset_after:
+            self.block_for(reset_after)
+
+    def block_for(self, seconds: float) -> None:
+        """Blocks acquisition for `seconds`, e.g. after a 429 with Retry-After."""
+        self._blocked_until = max(self._blocked_until, self._clock() + seconds)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable, FrozenSet, Mapping, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Methods safe to retry after a server error or dropped connection.
+IDEMPOTENT_METHODS: FrozenSet[str] = frozenset({"GET", "HEAD", "PUT", "DELETE"})
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How a provider's requests are retried.
+
+    429 responses are always retried: a throttled request was not processed,
+    so it is safe to resend. The other `retry_status_codes`, and dropped
+    connections, are only retried for idempotent requests. Delays grow
+    exponentially from `backoff_seconds` with full jitter, capped at
+    `max_backoff_seconds`, but never undercut the server's Retry-After.
+    """
+
+    max_retries: int
+    backoff_seconds: float
+    retry_status_codes: FrozenSet[int] = frozenset({429, 503, 504})
+    max_backoff_seconds: float = 30.0
+
+    def is_retryable(self, status_code: int, idempotent: bool) -> bool:
+        return status_code == 429 or (status_code in self.retry_status_codes and idempotent)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2**attempt))
+        return max(delay, retry_after or 0)
+
+
+def header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    """Parses a numeric header, or returns None if it is missing or not a number."""
+    value = headers.get(name)
+    if value is None and not isinstance(headers, httpx.Headers):
+        # Plain dicts (e.g. Graph $batch responses) are case-sensitive.
+        value = next((v for k, v in headers.items() if k.lower() == name.lower()), None)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """The Retry-After delay in seconds; the HTTP-date form is ignored."""
+    return header_float(headers, "retry-after")
+
+
+async def send_with_retries(
+    send: Callable[[], Awaitable[httpx.Response]],
+    policy: RetryPolicy,
+    idempotent: bool,
+    description: str,
+    on_response: Optional[Callable[[httpx.Response], None]] = None,
+) -> httpx.Response:
+    """
+    Calls `send` until a response is not retryable or retries run out.
+
+    Returns the last response, whatever its status; raising on error
+    responses is left to the caller. `on_response` sees every response,
+    e.g. to apply rate-limit headers. `description` names the request in
+    log messages.
+    """
+    attempt = 0
+    while True:
+        try:
+            response = await send()
+        except httpx.TransportError as e:
+            if not idempotent or attempt >= policy.max_retries:
+                raise
+            delay = policy.backoff(attempt)
+            logger.warning("%s failed (%s), retrying in %.2fs", description, e, delay)
+        else:
+            if on_response is not None:
+                on_response(response)
+            if attempt >= policy.max_retries or not policy.is_retryable(
+                response.status_code, idempotent
+            ):
+                return response
+            delay = policy.backoff(attempt, retry_after(response.headers))
+            logger.warning(
+                "%s returned %s, retrying in %.2fs", description, response.status_code, delay
+            )
+        attempt += 1
+        await asyncio.sleep(delay)
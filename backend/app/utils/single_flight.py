@@ -0,0 +1,38 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one execution.
+
+    The first caller for a key starts `func` in its own task; every caller,
+    the first included, awaits that task and receives its result or
+    exception. A cancelled caller only stops waiting: the call carries on for
+    the others. Once the call completes the key is forgotten, so later calls
+    run again.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._run(key, func))
+            # Mark the exception as retrieved in case every caller was cancelled.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        # Shield so a cancelled caller doesn't cancel the shared call.
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await func()
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,389 @@
+"""
+Load and latency benchmark for the API.
+
+Usage: python -m benchmarks.run [--database-url URL] [--concurrency N]
+                                [--requests N] [--output FILE]
+
+Boots `app.main:app` in-process (lifespan included) and drives it through
+httpx's ASGI transport, so no server or network is involved:
+
+- Firebase ID tokens are signed with a throwaway key whose certificate is
+  served to the app through FIREBASE_CERTS_FILE, so verification runs the
+  real (local) code path.
+- Microsoft and Pipedrive are replaced by an httpx.MockTransport answering
+  after a fixed simulated latency (--provider-latency-ms).
+- The database is --database-url (a PostgreSQL database, migrated by the
+  app's startup if behind), or by default a throwaway SQLite file (requires aiosqlite, see
+  benchmarks/requirements.txt). The OAuth callbacks upsert with
+  PostgreSQL-only SQL and are skipped on SQLite.
+
+Each scenario runs --requests requests with --concurrency in flight after a
+short warm-up, and reports throughput plus p50/p95/p99 latency per route.
+Results are written as JSON to --output so runs can be compared across
+commits.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+PROJECT_ID = "bench-project"
+KEY_ID = "bench-key"
+USERS = 50
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies) + errors
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def _write_signing_cert(directory: str):
+    """Creates a signing key and writes its certificate where the app's key store reads it."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    certs_file = os.path.join(directory, "certs.json")
+    with open(certs_file, "w") as f:
+        json.dump({KEY_ID: cert.public_bytes(serialization.Encoding.PEM).decode()}, f)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    return certs_file, pem
+
+
+def _make_id_token(pem: bytes, uid: str) -> str:
+    from google.auth import crypt, jwt
+
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "email": f"{uid}@bench.test",
+        "name": uid,
+        "iat": now,
+        "exp": now + 3600,
+    }
+    signer = crypt.RSASigner.from_string(pem, key_id=KEY_ID)
+    return jwt.encode(signer, payload).decode()
+
+
+def _configure_environment(args, workdir: str) -> bytes:
+    """Points the app's settings at the benchmark stand-ins; must run before importing app."""
+    from cryptography.fernet import Fernet
+
+    certs_file, pem = _write_signing_cert(workdir)
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.update(
+        {
+            "DATABASE_URL": database_url,
+            "FIREBASE_CERTS_FILE": certs_file,
+            "GOOGLE_CLOUD_PROJECT": PROJECT_ID,
+            "TOKEN_REFRESH_ENABLED": "false",
+            # A handful of synthetic users far exceed any per-tenant limit.
+            "ADMISSION_CONTROL_ENABLED": "false",
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    os.environ.setdefault("CREDENTIAL_ENCRYPTION_KEY", Fernet.generate_key().decode())
+    for name in (
+        "OUTLOOK_CLIENT_ID",
+        "OUTLOOK_CLIENT_SECRET",
+        "PIPEDRIVE_CLIENT_ID",
+        "PIPEDRIVE_CLIENT_SECRET",
+    ):
+        os.environ.setdefault(name, f"bench-{name.lower()}")
+    return pem
+
+
+def _provider_transport(latency: float):
+    import httpx
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if request.url.path.endswith("/token"):
+            return httpx.Response(
+                200,
+                json={
+                    "access_token": "bench-access-token",
+                    "refresh_token": "bench-refresh-token",
+                    "expires_in": 3600,
+                },
+            )
+        if request.url.path.endswith("/users/me"):
+            return httpx.Response(
+                200,
+                json={"data": {"name": "Bench", "email": "bench@bench.test", "company_id": 1}},
+            )
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+def _seed(uids: List[str]) -> None:
+    from sqlalchemy import Column, MetaData, String, Table, insert, select
+
+    from app.core.database import Base, get_engine, get_session_factory
+    from app.core.migrate import read_heads
+    from app.models.database import User, Credential
+    from app.services.encryption import get_keyring
+
+    engine = get_engine()
+    if engine.dialect.name == "sqlite":
+        # Create the schema directly and stamp it as current, so the app's
+        # startup migration check finds nothing to do (the migrations
+        # themselves are PostgreSQL-only).
+        Base.metadata.create_all(engine)
+        version = Table("alembic_version", MetaData(), Column("version_num", String(32)))
+        version.create(engine, checkfirst=True)
+        with engine.begin() as conn:
+            conn.execute(version.delete())
+            conn.execute(insert(version), [{"version_num": head} for head in read_heads()])
+    keyring = get_keyring()
+    expires_at = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    with get_session_factory()() as db:
+        existing = set(
+            db.execute(select(User.firebase_id).where(User.firebase_id.in_(uids))).scalars()
+        )
+        for uid in uids:
+            if uid in existing:
+                continue
+            user = User(firebase_id=uid, email=f"{uid}@bench.test")
+            user.credentials.append(
+                Credential(
+                    service_name="pipedrive",
+                    # Distinct per user: Pipedrive calls are paced per token, and
+                    # users sharing one would share a single rate-limit bucket.
+                    access_token=keyring.encrypt(f"bench-access-token-{uid}"),
+                    refresh_token=keyring.encrypt("bench-refresh-token"),
+                    expires_at=expires_at,
+                )
+            )
+            db.add(user)
+        db.commit()
+
+
+# Called with (client, headers, uid, timings); records each request's
+# latency in `timings` under its route.
+Scenario = Callable[..., Awaitable[None]]
+
+
+class RouteFailed(Exception):
+    """A scenario's request to `route` failed or returned an error status."""
+
+    def __init__(self, route: str, error: Exception):
+        super().__init__(f"{route}: {error}")
+        self.route = route
+
+
+async def _timed(client, timings: Dict[str, float], method: str, url: str, **kwargs):
+    """Sends one request and records its latency; raises RouteFailed if it fails."""
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        response.raise_for_status()
+    except Exception as e:
+        raise RouteFailed(url, e) from e
+    timings[url] = time.perf_counter() - started
+    return response
+
+
+async def profile(client, headers, uid, timings) -> None:
+    await _timed(client, timings, "GET", "/api/profile", headers=headers)
+
+
+async def test_pipedrive(client, headers, uid, timings) -> None:
+    await _timed(client, timings, "GET", "/api/test-pipedrive", headers=headers)
+
+
+async def pipedrive_oauth(client, headers, uid, timings) -> None:
+    from urllib.parse import parse_qs, urlparse
+
+    response = await _timed(
+        client, timings, "POST", "/api/auth/initiate/pipedrive", headers=headers
+    )
+    state = parse_qs(urlparse(response.json()["auth_url"]).query)["state"][0]
+    await _timed(
+        client,
+        timings,
+        "GET",
+        "/api/auth/callback/pipedrive",
+        params={"code": "bench-code", "state": state},
+    )
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "profile": profile,
+    "test_pipedrive": test_pipedrive,
+    "pipedrive_oauth": pipedrive_oauth,
+}
+POSTGRES_ONLY = {"pipedrive_oauth"}
+
+
+async def run_scenario(
+    client, scenario: Scenario, tokens: List[str], total: int, concurrency: int
+) -> Dict[str, dict]:
+    latencies: Dict[str, List[float]] = {}
+    # Counted against the route that failed; later routes were not requested.
+    errors: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            uid_index = i % len(tokens)
+            headers = {"Authorization": f"Bearer {tokens[uid_index]}"}
+            timings: Dict[str, float] = {}
+            try:
+                await scenario(client, headers, f"bench-user-{uid_index}", timings)
+            except RouteFailed as e:
+                errors[e.route] = errors.get(e.route, 0) + 1
+            # Routes that succeeded before a failure still count.
+            for route, elapsed in timings.items():
+                latencies.setdefault(route, []).append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        route: summarize(latencies.get(route, []), errors.get(route, 0), elapsed)
+        for route in {**latencies, **errors}
+    }
+
+
+async def run(args, pem: bytes) -> dict:
+    import httpx
+
+    from app.core.config import get_settings
+    from app.core.http_clients import HTTPClients
+    from app.main import app
+
+    uids = [f"bench-user-{i}" for i in range(USERS)]
+    tokens = [_make_id_token(pem, uid) for uid in uids]
+    _seed(uids)
+    sqlite = get_settings().DATABASE_URL.startswith("sqlite")
+
+    results: Dict[str, dict] = {}
+    async with app.router.lifespan_context(app):
+        await app.state.http_clients.aclose()
+        app.state.http_clients = HTTPClients(
+            get_settings(), transport=_provider_transport(args.provider_latency_ms / 1000)
+        )
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in args.scenarios:
+                if sqlite and name in POSTGRES_ONLY:
+                    results[name] = {"skipped": "requires PostgreSQL (--database-url)"}
+                    continue
+                scenario = SCENARIOS[name]
+                await run_scenario(client, scenario, tokens, args.warmup, args.concurrency)
+                results[name] = await run_scenario(
+                    client, scenario, tokens, args.requests, args.concurrency
+                )
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="PostgreSQL database (default: SQLite)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="warm-up requests per scenario")
+    parser.add_argument("--provider-latency-ms", type=float, default=20.0)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--output", default="benchmark-results.json")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    with tempfile.TemporaryDirectory() as workdir:
+        pem = _configure_environment(args, workdir)
+        routes = asyncio.run(run(args, pem))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "database": "postgresql" if args.database_url else "sqlite",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "provider_latency_ms": args.provider_latency_ms,
+        },
+        "scenarios": routes,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'route':<34}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+    for scenario, result in routes.items():
+        for route, stats in result.items():
+            if "p50_ms" not in stats:
+                print(f"{scenario + ': ' + route:<34} {stats}")
+                continue
+            print(
+                f"{route:<34}{stats['throughput_rps']:>9}{stats['p50_ms']:>9}"
+                f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['errors']:>8}"
+            )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,9 @@ from alembic import context
 config = context.config
 
 # Interpret the config file for Python logging.
-# This line sets up loggers basically.
-if config.config_file_name is not None:
+# This line sets up loggers basically. Not when app.core.migrate runs us
+# inside the app, whose logging is already set up.
+if config.config_file_name is not None and "connection" not in config.attributes:
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
@@ -59,6 +60,15 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # app.core.migrate runs migrations on its own (advisory-locked) connection.
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     # Use environment variable for database URL
     database_url = os.environ.get(
         "DATABASE_URL", config.get_main_option("sqlalchemy.url")
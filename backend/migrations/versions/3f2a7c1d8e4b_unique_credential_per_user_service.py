@@ -0,0 +1,45 @@
+"""Unique credential per user and service
+
+Revision ID: 3f2a7c1d8e4b
+Revises: 9d49f437185b
+Create Date: 2026-10-17 09:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a7c1d8e4b'
+down_revision: Union[str, Sequence[str], None] = '9d49f437185b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Concurrent callbacks could previously insert duplicate credentials;
+    # keep only the most recent row for each user and service.
+    op.execute(
+        """
+        DELETE FROM credentials older
+        USING credentials newer
+        WHERE older.user_id = newer.user_id
+          AND older.service_name = newer.service_name
+          AND older.id < newer.id
+        """
+    )
+    op.create_unique_constraint(
+        'uq_credentials_user_id_service_name',
+        'credentials',
+        ['user_id', 'service_name'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(
+        'uq_credentials_user_id_service_name', 'credentials', type_='unique'
+    )
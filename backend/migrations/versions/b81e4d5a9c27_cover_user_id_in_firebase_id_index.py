@@ -0,0 +1,39 @@
+"""Cover user id in the firebase_id index
+
+Revision ID: b81e4d5a9c27
+Revises: 3f2a7c1d8e4b
+Create Date: 2026-10-17 10:03:54.881246
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81e4d5a9c27'
+down_revision: Union[str, Sequence[str], None] = '3f2a7c1d8e4b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The composite (user_id, service_name) index on credentials already
+    # exists as uq_credentials_user_id_service_name. Including users.id here
+    # makes the user side of the credential lookup join index-only.
+    op.drop_index(op.f('ix_users_firebase_id'), table_name='users')
+    op.create_index(
+        op.f('ix_users_firebase_id'),
+        'users',
+        ['firebase_id'],
+        unique=True,
+        postgresql_include=['id'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_firebase_id'), table_name='users')
+    op.create_index(op.f('ix_users_firebase_id'), 'users', ['firebase_id'], unique=True)
@@ -0,0 +1,106 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import get_settings
+from app.services import access_tokens
+from app.services.access_tokens import get_access_token, refresh_credential
+from app.services.credential_cache import get_credential_cache
+from app.services.encryption import get_keyring
+
+
+@pytest.fixture(autouse=True)
+def empty_credential_cache():
+    get_credential_cache().clear()
+    yield
+    get_credential_cache().clear()
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    calls = []
+
+    async def refresh_access_token(client, service_name, refresh_token):
+        calls.append(refresh_token)
+        await asyncio.sleep(0)
+        return {
+            "access_token": f"new-access-{len(calls)}",
+            "refresh_token": f"new-refresh-{len(calls)}",
+            "expires_in": 3600,
+        }
+
+    monkeypatch.setattr(access_tokens, "refresh_access_token", refresh_access_token)
+    return calls
+
+
+def get_token(credentials_db, client=None):
+    async def scenario():
+        async with credentials_db.session_factory() as db:
+            return await get_access_token(db, "uid-1", "pipedrive", client)
+
+    return asyncio.run(scenario())
+
+
+def test_access_token_is_loaded_once_then_served_from_cache(credentials_db, provider):
+    credential_id = credentials_db.add_credential("uid-1", expires_in=3600)
+
+    assert get_token(credentials_db) == "access"
+    credentials_db.update_credential(
+        credential_id, access_token=get_keyring().encrypt("not-read-again")
+    )
+    assert get_token(credentials_db) == "access"
+    assert provider == []
+
+def test_expiring_token_is_refreshed_and_stored(credentials_db, provider, monkeypatch):
+    monkeypatch.setattr(
+        access_tokens, "get_async_session_factory", lambda: credentials_db.session_factory
+    )
+    credential_id = credentials_db.add_credential("uid-1", expires_in=10, refresh_token="old")
+
+    assert get_token(credentials_db, client=object()) == "new-access-1"
+    assert provider == ["old"]
+    assert credentials_db.tokens(credential_id) == ("new-access-1", "new-refresh-1")
+
+def test_concurrent_refreshes_share_one_provider_request(credentials_db, provider):
+    credentials_db.add_credential("uid-1", expires_in=10, refresh_token="old")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(
+                refresh_credential(None, "uid-1", "pipedrive", credentials_db.session_factory)
+                for _ in range(3)
+            )
+        )
+
+    assert asyncio.run(scenario()) == ["new-access-1"] * 3
+    assert provider == ["old"]
+
+def test_token_refreshed_while_waiting_for_the_lock_is_reused(credentials_db, provider):
+    credential_id = credentials_db.add_credential("uid-1", expires_in=10, refresh_token="old")
+    # What the row looks like once the lock holder has committed its refresh.
+    credentials_db.update_credential(
+        credential_id, expires_at=datetime.utcnow() + timedelta(hours=1)
+    )
+
+    token = asyncio.run(
+        refresh_credential(None, "uid-1", "pipedrive", credentials_db.session_factory)
+    )
+
+    assert token == "access"
+    assert provider == []
+
+def test_slow_provider_refresh_is_abandoned_after_the_timeout(credentials_db, monkeypatch):
+    credential_id = credentials_db.add_credential("uid-1", expires_in=10, refresh_token="old")
+    monkeypatch.setattr(get_settings(), "TOKEN_REFRESH_TIMEOUT_SECONDS", 0.01)
+
+    async def refresh_access_token(client, service_name, refresh_token):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(access_tokens, "refresh_access_token", refresh_access_token)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(
+            refresh_credential(None, "uid-1", "pipedrive", credentials_db.session_factory)
+        )
+    assert credentials_db.tokens(credential_id) == ("access", "old")
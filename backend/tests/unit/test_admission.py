@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.admission import (
+    AdmissionControlMiddleware,
+    AdmissionController,
+    Rejected,
+    tenant_key,
+)
+
+
+def make_controller(clock, **kwargs):
+    kwargs.setdefault("tenant_rate", 1.0)
+    kwargs.setdefault("tenant_burst", 2)
+    kwargs.setdefault("tenant_max_in_flight", 5)
+    kwargs.setdefault("max_in_flight", 10)
+    return AdmissionController(clock=clock, **kwargs)
+
+
+def test_tenant_rate_is_limited_by_token_bucket(clock):
+    controller = make_controller(clock)
+    for _ in range(2):
+        controller.release(controller.acquire("uid:a"))
+
+    with pytest.raises(Rejected) as rejected:
+        controller.acquire("uid:a")
+    assert (rejected.value.status_code, rejected.value.reason) == (429, "tenant_rate")
+    assert rejected.value.retry_after == pytest.approx(1.0)
+
+    # Other tenants have their own budget.
+    controller.release(controller.acquire("uid:b"))
+    clock.now += 1
+    controller.release(controller.acquire("uid:a"))
+    assert controller.in_flight == 0
+
+
+def test_tenant_in_flight_cap_does_not_consume_tokens(clock):
+    controller = make_controller(clock, tenant_burst=10, tenant_max_in_flight=2)
+    held = [controller.acquire("uid:a"), controller.acquire("uid:a")]
+
+    with pytest.raises(Rejected) as rejected:
+        controller.acquire("uid:a")
+    assert rejected.value.reason == "tenant_concurrency"
+
+    controller.release(held.pop())
+    controller.acquire("uid:a")
+    assert held[0].bucket.tokens == 7
+
+
+def test_global_in_flight_limit_sheds_with_503(clock):
+    controller = make_controller(clock, max_in_flight=2)
+    controller.acquire("uid:a")
+    state = controller.acquire("uid:b")
+
+    with pytest.raises(Rejected) as rejected:
+        controller.acquire("uid:c")
+    assert (rejected.value.status_code, rejected.value.reason) == (503, "global_concurrency")
+
+    controller.release(state)
+    controller.acquire("uid:c")
+
+
+def test_idle_tenants_are_forgotten_beyond_capacity(clock):
+    controller = make_controller(clock, shards=1, max_tenants=2)
+    for tenant in ("uid:a", "uid:b", "uid:c"):
+        controller.release(controller.acquire(tenant))
+
+    assert list(controller._shards[0].tenants) == ["uid:b", "uid:c"]
+
+
+def test_tenants_with_requests_in_flight_are_not_forgotten(clock):
+    controller = make_controller(clock, shards=1, max_tenants=2, tenant_max_in_flight=1)
+    busy = controller.acquire("uid:a")
+    for tenant in ("uid:b", "uid:c", "uid:d"):
+        controller.release(controller.acquire(tenant))
+
+    assert list(controller._shards[0].tenants) == ["uid:a", "uid:d"]
+    with pytest.raises(Rejected):
+        controller.acquire("uid:a")
+    controller.release(busy)
+    controller.release(controller.acquire("uid:a"))
+
+
+def test_tenant_key_uses_uid_only_for_verified_tokens(monkeypatch):
+    monkeypatch.setattr(
+        "app.core.admission.cached_uid", lambda token: "alice" if token == "good" else None
+    )
+
+    def scope(*headers, client=("10.0.0.1", 1234)):
+        return {"headers": list(headers), "client": client}
+
+    assert tenant_key(scope((b"authorization", b"Bearer good"))) == "uid:alice"
+    forged = (b"authorization", b"Bearer forged")
+    forwarded = (b"x-forwarded-for", b"1.2.3.4, 10.0.0.2")
+    assert tenant_key(scope(forged, forwarded)) == "ip:10.0.0.2"
+    assert tenant_key(scope(forwarded)) == "ip:10.0.0.2"
+    assert tenant_key(scope()) == "ip:10.0.0.1"
+
+
+def test_middleware_rejects_with_retry_after_and_exempts_metrics(clock):
+    controller = make_controller(clock, tenant_burst=1)
+    app = FastAPI()
+    app.add_middleware(AdmissionControlMiddleware, get_controller=lambda: controller)
+
+    @app.get("/api/items")
+    def items():
+        return {"ok": True}
+
+    @app.get("/metrics")
+    def metrics():
+        return {}
+
+    with TestClient(app) as client:
+        assert client.get("/api/items").status_code == 200
+        response = client.get("/api/items")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        assert all(client.get("/metrics").status_code == 200 for _ in range(3))
+
+
+def test_middleware_releases_slots_after_each_request(clock):
+    controller = make_controller(clock, tenant_burst=100, tenant_max_in_flight=1, max_in_flight=1)
+    app = FastAPI()
+    app.add_middleware(AdmissionControlMiddleware, get_controller=lambda: controller)
+
+    @app.get("/api/slow")
+    async def slow():
+        await asyncio.sleep(0)
+        return {}
+
+    with TestClient(app) as client:
+        assert [client.get("/api/slow").status_code for _ in range(3)] == [200] * 3
+    assert controller.in_flight == 0
@@ -0,0 +1,19 @@
+from benchmarks.run import percentile, summarize
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
+    assert percentile([3.0], 0.99) == 3.0
+
+
+def test_summarize_counts_errors_in_throughput():
+    stats = summarize([0.002, 0.001, 0.003], errors=1, elapsed=2.0)
+    assert stats["requests"] == 4
+    assert stats["errors"] == 1
+    assert stats["throughput_rps"] == 2.0
+    assert stats["p50_ms"] == 2.0
+    assert stats["max_ms"] == 3.0
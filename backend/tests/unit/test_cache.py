@@ -0,0 +1,47 @@
+import pytest
+from app.utils.cache import TTLCache
+
+
+def test_get_returns_value_until_expiry(clock):
+    cache = TTLCache(maxsize=10, clock=clock)
+    cache.set("a", 1, expires_at=clock.now + 60)
+
+    assert cache.get("a") == 1
+    clock.now += 61
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_set_ignores_already_expired_entries(clock):
+    cache = TTLCache(maxsize=10, clock=clock)
+    cache.set("a", 1, expires_at=clock.now - 1)
+
+    assert cache.get("a") is None
+
+def test_least_recently_used_entry_is_evicted(clock):
+    evicted = []
+    cache = TTLCache(maxsize=2, clock=clock, on_evict=lambda k, v: evicted.append(k))
+    cache.set("a", 1, expires_at=clock.now + 60)
+    cache.set("b", 2, expires_at=clock.now + 60)
+    cache.get("a")
+    cache.set("c", 3, expires_at=clock.now + 60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert evicted == ["b"]
+
+def test_invalidate_and_clear_call_on_evict(clock):
+    evicted = []
+    cache = TTLCache(maxsize=10, clock=clock, on_evict=lambda k, v: evicted.append(k))
+    cache.set("a", 1, expires_at=clock.now + 60)
+    cache.set("b", 2, expires_at=clock.now + 60)
+
+    cache.invalidate("a")
+    cache.clear()
+
+    assert evicted == ["a", "b"]
+    assert len(cache) == 0
+
+def test_invalid_maxsize_raises_error():
+    with pytest.raises(ValueError):
+        TTLCache(maxsize=0)
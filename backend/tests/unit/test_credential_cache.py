@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+from app.services.credential_cache import CachedSecret, CredentialCache
+
+
+def utc_naive(clock, seconds):
+    return datetime.fromtimestamp(clock.now + seconds, timezone.utc).replace(tzinfo=None)
+
+
+def test_token_expires_before_credential_by_safety_margin(clock):
+    cache = CredentialCache(max_entries=10, safety_margin_seconds=60, clock=clock)
+    cache.set("uid-1", "pipedrive", "token", utc_naive(clock, 3600))
+
+    clock.now += 3539
+    assert cache.get("uid-1", "pipedrive") == "token"
+    clock.now += 1
+    assert cache.get("uid-1", "pipedrive") is None
+
+def test_token_without_expiry_is_not_cached():
+    cache = CredentialCache(max_entries=10, safety_margin_seconds=60)
+    cache.set("uid-1", "pipedrive", "token", None)
+
+    assert cache.get("uid-1", "pipedrive") is None
+
+def test_invalidate_removes_token(clock):
+    cache = CredentialCache(max_entries=10, safety_margin_seconds=60, clock=clock)
+    cache.set("uid-1", "pipedrive", "token", utc_naive(clock, 3600))
+    cache.set("uid-1", "outlook", "other", utc_naive(clock, 3600))
+
+    cache.invalidate("uid-1", "pipedrive")
+
+    assert cache.get("uid-1", "pipedrive") is None
+    assert cache.get("uid-1", "outlook") == "other"
+
+def test_cache_is_bounded(clock):
+    cache = CredentialCache(max_entries=2, safety_margin_seconds=60, clock=clock)
+    for uid in ("a", "b", "c"):
+        cache.set(uid, "pipedrive", f"token-{uid}", utc_naive(clock, 3600))
+
+    assert len(cache) == 2
+    assert cache.get("a", "pipedrive") is None
+
+def test_token_read_before_invalidate_is_not_cached(clock):
+    cache = CredentialCache(max_entries=10, safety_margin_seconds=60, clock=clock)
+    # A reader takes the generation, then loads the token from the database...
+    generation = cache.generation()
+    # ...while a reconnect saves a new token and invalidates the entry.
+    cache.invalidate("uid-1", "pipedrive")
+    cache.set("uid-1", "pipedrive", "old-token", utc_naive(clock, 3600), generation)
+
+    assert cache.get("uid-1", "pipedrive") is None
+
+    generation = cache.generation()
+    cache.set("uid-1", "pipedrive", "new-token", utc_naive(clock, 3600), generation)
+    assert cache.get("uid-1", "pipedrive") == "new-token"
+
+def test_invalidations_are_remembered_for_at_most_max_entries_credentials(clock):
+    cache = CredentialCache(max_entries=2, safety_margin_seconds=60, clock=clock)
+    generation = cache.generation()
+    for uid in ("uid-1", "uid-2", "uid-3"):
+        cache.invalidate(uid, "pipedrive")
+
+    assert list(cache._invalidated_at) == [("uid-2", "pipedrive"), ("uid-3", "pipedrive")]
+    # uid-1's invalidation is forgotten, but still stops a read started before it.
+    cache.set("uid-1", "pipedrive", "old-token", utc_naive(clock, 3600), generation)
+    assert cache.get("uid-1", "pipedrive") is None
+
+def test_wipe_zeroes_secret():
+    secret = CachedSecret("token")
+    secret.wipe()
+
+    assert secret._buffer == bytearray(len("token"))
+    assert secret.reveal() is None
@@ -1,6 +1,12 @@
 import os
 import pytest
-from app.services.encryption import generate_key, encrypt_data, decrypt_data
+from app.services.encryption import (
+    CredentialKeyring,
+    generate_key,
+    encrypt_data,
+    decrypt_data,
+    parse_keys,
+)
 
 def test_generate_key():
     key = generate_key()
@@ -21,3 +27,39 @@ def test_decrypt_invalid_data_raises_error():
     invalid_encrypted_data = "not-a-valid-encrypted-string"
     with pytest.raises(Exception):
         decrypt_data(invalid_encrypted_data, key)
+
+def test_keyring_encrypt_decrypt():
+    keyring = CredentialKeyring([generate_key()])
+    encrypted_data = keyring.encrypt("secret")
+
+    assert encrypted_data != "secret"
+    assert keyring.decrypt(encrypted_data) == "secret"
+
+def test_keyring_encrypt_decrypt_many():
+    keyring = CredentialKeyring([generate_key()])
+    items = [b"first", b"second", b"third"]
+
+    encrypted_items = keyring.encrypt_many(items)
+
+    assert len(encrypted_items) == len(items)
+    assert keyring.decrypt_many(encrypted_items) == items
+
+def test_keyring_decrypts_and_rotates_old_key_data():
+    old_key, new_key = generate_key(), generate_key()
+    old_data = encrypt_data("secret", old_key)
+    keyring = CredentialKeyring([new_key, old_key])
+
+    assert keyring.decrypt(old_data) == "secret"
+
+    rotated = keyring.rotate(old_data.encode())
+    assert decrypt_data(rotated.decode(), new_key) == "secret"
+    with pytest.raises(Exception):
+        decrypt_data(rotated.decode(), old_key)
+
+def test_keyring_requires_a_key():
+    with pytest.raises(ValueError):
+        CredentialKeyring([])
+
+def test_parse_keys():
+    assert parse_keys(" a, b ,,c ") == ["a", "b", "c"]
+    assert parse_keys("") == []
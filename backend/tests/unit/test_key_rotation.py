@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.core.database import Base
+from app.models.database import User, Credential
+from app.services.encryption import CredentialKeyring, generate_key, encrypt_data, decrypt_data
+from app.services.key_rotation import reencrypt_credentials
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    # WAL lets the job write batches while its streaming read is still open,
+    # as it can on PostgreSQL.
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def seed_credentials(engine, key, count):
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": 1, "firebase_id": "uid-1"}])
+        conn.execute(
+            Credential.__table__.insert(),
+            [
+                {
+                    "user_id": 1,
+                    "service_name": f"service-{i}",
+                    "access_token": encrypt_data(f"access-{i}", key),
+                    "refresh_token": encrypt_data(f"refresh-{i}", key) if i % 2 else None,
+                }
+                for i in range(count)
+            ],
+        )
+
+
+def test_reencrypt_credentials_with_new_key(engine, tmp_path):
+    old_key, new_key = generate_key(), generate_key()
+    seed_credentials(engine, old_key, 25)
+    checkpoint = tmp_path / "checkpoint.json"
+
+    result = reencrypt_credentials(
+        engine,
+        CredentialKeyring([new_key, old_key]),
+        batch_size=4,
+        page_size=10,
+        checkpoint_path=str(checkpoint),
+    )
+
+    assert result.rotated == 25
+    assert result.failed == 0
+    assert not checkpoint.exists()
+    with engine.connect() as conn:
+        rows = conn.execute(select(Credential.__table__).order_by("id")).fetchall()
+    for i, row in enumerate(rows):
+        assert decrypt_data(row.access_token, new_key) == f"access-{i}"
+        if row.refresh_token is not None:
+            assert decrypt_data(row.refresh_token, new_key) == f"refresh-{i}"
+
+def test_reencrypt_credentials_resumes_from_checkpoint(engine, tmp_path):
+    old_key, new_key = generate_key(), generate_key()
+    seed_credentials(engine, old_key, 10)
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text('{"last_id": 6}')
+
+    result = reencrypt_credentials(
+        engine,
+        CredentialKeyring([new_key, old_key]),
+        batch_size=3,
+        checkpoint_path=str(checkpoint),
+    )
+
+    assert result.rotated == 4
+    with engine.connect() as conn:
+        rows = conn.execute(select(Credential.__table__).order_by("id")).fetchall()
+    assert decrypt_data(rows[0].access_token, old_key) == "access-0"
+    assert decrypt_data(rows[-1].access_token, new_key) == "access-9"
@@ -0,0 +1,127 @@
+import datetime
+import json
+import time
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from firebase_admin import auth
+from google.auth import crypt, jwt
+
+from app.auth.key_store import FileKeyStore
+
+PROJECT_ID = "test-project"
+KEY_ID = "test-key"
+
+
+@pytest.fixture(scope="module")
+def private_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key
+
+
+def write_certs(path, private_key, key_id=KEY_ID):
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(private_key, hashes.SHA256())
+    )
+    path.write_text(
+        json.dumps({key_id: cert.public_bytes(serialization.Encoding.PEM).decode()})
+    )
+
+
+@pytest.fixture
+def key_store(tmp_path, private_key):
+    certs_file = tmp_path / "certs.json"
+    write_certs(certs_file, private_key)
+    store = FileKeyStore(str(certs_file))
+    store.start()
+    return store
+
+
+def make_token(private_key, key_id=KEY_ID, **overrides):
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "user-123",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    payload.update(overrides)
+    signer = crypt.RSASigner.from_string(pem, key_id=key_id)
+    return jwt.encode(signer, payload).decode()
+
+
+def test_verify_valid_token(key_store, private_key):
+    claims = key_store.verify_id_token(make_token(private_key), PROJECT_ID)
+
+    assert claims["uid"] == "user-123"
+    assert claims["aud"] == PROJECT_ID
+
+def test_verify_wrong_audience_raises_error(key_store, private_key):
+    token = make_token(private_key, aud="other-project")
+    with pytest.raises(auth.InvalidIdTokenError):
+        key_store.verify_id_token(token, PROJECT_ID)
+
+def test_verify_wrong_issuer_raises_error(key_store, private_key):
+    token = make_token(private_key, iss="https://example.com")
+    with pytest.raises(auth.InvalidIdTokenError):
+        key_store.verify_id_token(token, PROJECT_ID)
+
+def test_verify_expired_token_raises_error(key_store, private_key):
+    now = int(time.time())
+    token = make_token(private_key, iat=now - 7200, exp=now - 3600)
+    with pytest.raises(auth.ExpiredIdTokenError):
+        key_store.verify_id_token(token, PROJECT_ID)
+
+def test_verify_token_signed_by_unknown_key_raises_error(key_store):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(auth.InvalidIdTokenError):
+        key_store.verify_id_token(make_token(other_key), PROJECT_ID)
+
+def test_unknown_key_id_reloads_certificates_at_most_once_per_interval(
+    tmp_path, private_key, clock
+):
+    certs_file = tmp_path / "certs.json"
+    certs_file.write_text("{}")
+    store = FileKeyStore(str(certs_file), refetch_interval=30, clock=clock)
+    store.start()
+    loads = []
+    original_load = store.load
+
+    def counting_load():
+        loads.append(clock.now)
+        original_load()
+
+    store.load = counting_load
+    token = make_token(private_key)
+
+    # Google rotated its keys: the new key ID is picked up on first sight.
+    write_certs(certs_file, private_key)
+    assert store.verify_id_token(token, PROJECT_ID)["uid"] == "user-123"
+
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(auth.InvalidIdTokenError):
+        store.verify_id_token(make_token(other_key, key_id="other"), PROJECT_ID)
+    assert len(loads) == 1
+
+    clock.now += 30
+    with pytest.raises(auth.InvalidIdTokenError):
+        store.verify_id_token(make_token(other_key, key_id="other"), PROJECT_ID)
+    assert len(loads) == 2
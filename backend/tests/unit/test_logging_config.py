@@ -0,0 +1,77 @@
+import json
+import logging
+import queue
+from types import SimpleNamespace
+
+from app.core.logging_config import (
+    CloudLoggingFormatter,
+    NonBlockingQueueHandler,
+    SamplingFilter,
+    parse_sample_rates,
+    setup_logging,
+    stop_logging,
+)
+
+
+def make_record(name="app.main", level=logging.INFO, msg="hello %s", args=("world",), **kwargs):
+    return logging.LogRecord(name, level, __file__, 10, msg, args, None, **kwargs)
+
+
+def test_json_formatter_emits_cloud_logging_fields():
+    record = make_record()
+    record.tenant = "uid-1"
+
+    entry = json.loads(CloudLoggingFormatter().format(record))
+
+    assert entry["severity"] == "INFO"
+    assert entry["message"] == "hello world"
+    assert entry["logger"] == "app.main"
+    assert entry["tenant"] == "uid-1"
+    assert entry["logging.googleapis.com/sourceLocation"]["line"] == 10
+
+
+def test_sampling_applies_to_info_of_configured_loggers_only():
+    rates = parse_sample_rates("app.main=0.25, app.auth=0")
+    sampler = SamplingFilter(rates, random_func=lambda: 0.5)
+
+    assert rates == {"app.main": 0.25, "app.auth": 0.0}
+    assert not sampler.filter(make_record("app.main"))
+    assert not sampler.filter(make_record("app.auth.firebase_auth"))
+    assert sampler.filter(make_record("app.main", level=logging.WARNING))
+    assert sampler.filter(make_record("app.services.outlook"))
+
+
+def test_queue_handler_defers_formatting_and_drops_when_full():
+    log_queue = queue.Queue(1)
+    handler = NonBlockingQueueHandler(log_queue)
+    dropped = NonBlockingQueueHandler.dropped
+
+    handler.handle(make_record())
+    handler.handle(make_record())
+
+    record = log_queue.get_nowait()
+    assert record.msg == "hello %s" and record.args == ("world",)
+    assert NonBlockingQueueHandler.dropped == dropped + 1
+
+
+def test_records_logged_between_lifespans_are_not_lost(capsys):
+    settings = SimpleNamespace(
+        LOG_FORMAT="text", LOG_QUEUE_SIZE=100, LOG_SAMPLE_RATES="", LOG_LEVEL="INFO"
+    )
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    logger = logging.getLogger("app.test")
+    try:
+        setup_logging(settings)
+        logger.info("first")
+        stop_logging()
+        logger.info("between")
+        setup_logging(settings)
+        logger.info("second")
+        stop_logging()
+    finally:
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    lines = [line for line in capsys.readouterr().out.splitlines() if "app.test" in line]
+    assert lines == ["INFO:app.test:first", "INFO:app.test:between", "INFO:app.test:second"]
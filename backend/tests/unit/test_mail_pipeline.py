@@ -0,0 +1,149 @@
+import asyncio
+
+from app.services.mail_pipeline import MailPipeline
+
+
+def messages(count, prefix):
+    async def source():
+        for i in range(count):
+            yield {"id": f"{prefix}{i}"}
+
+    return source
+
+
+def test_pipeline_writes_classified_messages_and_counts_stages():
+    written = []
+
+    async def classify(tenant, message):
+        if message["id"].endswith("0"):
+            return None
+        return (tenant, message["id"])
+
+    async def write(tenant, action):
+        written.append(action)
+
+    pipeline = MailPipeline(classify, write, queue_size=2, classify_concurrency=3, write_concurrency=2)
+    asyncio.run(pipeline.run({"a": messages(11, "a"), "b": messages(3, "b")}))
+
+    assert sorted(written) == sorted(
+        [("a", f"a{i}") for i in range(1, 11) if i != 10] + [("b", "b1"), ("b", "b2")]
+    )
+    snapshot = pipeline.snapshot()
+    assert snapshot["stages"]["fetch"]["processed"] == 14
+    assert snapshot["stages"]["classify"]["processed"] == 14
+    assert snapshot["stages"]["write"]["processed"] == 11
+
+
+def test_pipeline_bounds_messages_in_flight_per_tenant():
+    in_flight = {"big": 0, "small": 0}
+    peak = {"big": 0, "small": 0}
+    order = []
+
+    async def classify(tenant, message):
+        in_flight[tenant] += 1
+        peak[tenant] = max(peak[tenant], in_flight[tenant])
+        return message["id"]
+
+    async def write(tenant, message_id):
+        order.append(tenant)
+        await asyncio.sleep(0.001)
+        in_flight[tenant] -= 1
+
+    pipeline = MailPipeline(classify, write, queue_size=10, tenant_in_flight=2)
+    asyncio.run(pipeline.run({"big": messages(50, "b"), "small": messages(3, "s")}))
+
+    assert peak["big"] <= 2
+    assert len(order) == 53
+    # The small tenant is not stuck behind the whole of the big mailbox.
+    assert max(i for i, tenant in enumerate(order) if tenant == "small") < 20
+
+
+def test_pipeline_survives_failing_stages():
+    async def failing_source():
+        yield {"id": "x0"}
+        raise RuntimeError("mailbox unavailable")
+
+    async def classify(tenant, message):
+        if message["id"] == "ok1":
+            raise ValueError("bad message")
+        return message["id"]
+
+    written = []
+
+    async def write(tenant, message_id):
+        if message_id == "ok2":
+            raise RuntimeError("crm down")
+        written.append(message_id)
+
+    pipeline = MailPipeline(classify, write, tenant_in_flight=1)
+    asyncio.run(pipeline.run({"a": failing_source, "b": messages(4, "ok")}))
+
+    assert sorted(written) == ["ok0", "ok3", "x0"]
+    stages = pipeline.snapshot()["stages"]
+    assert stages["fetch"]["failed"] == 1
+    assert stages["classify"]["failed"] == 1
+    assert stages["write"]["failed"] == 1
+
+
+def test_tenant_completes_only_after_all_its_messages_are_written():
+    written = {"a": 0, "b": 0}
+    completed = []
+
+    async def classify(tenant, message):
+        return message["id"]
+
+    async def write(tenant, message_id):
+        await asyncio.sleep(0.001)
+        if message_id == "b1":
+            raise RuntimeError("crm down")
+        written[tenant] += 1
+
+    async def on_complete(tenant):
+        completed.append((tenant, written[tenant]))
+
+    pipeline = MailPipeline(classify, write, queue_size=2, tenant_in_flight=3)
+    asyncio.run(pipeline.run({"a": messages(5, "a"), "b": messages(3, "b")}, on_complete))
+
+    # A tenant with a failed message is not completed, so it is synced again.
+    assert completed == [("a", 5)]
+
+
+def test_tenant_waiting_on_its_limit_does_not_hold_a_fetch_slot():
+    small_written = asyncio.Event()
+
+    async def classify(tenant, message):
+        return tenant
+
+    async def write(tenant, _):
+        if tenant == "small":
+            small_written.set()
+        else:
+            # The big mailbox only drains once the small one got through.
+            await small_written.wait()
+
+    pipeline = MailPipeline(classify, write, fetch_concurrency=1, tenant_in_flight=1)
+    sources = {"big": messages(5, "b"), "small": messages(1, "s")}
+    asyncio.run(asyncio.wait_for(pipeline.run(sources), timeout=5))
+
+    assert pipeline.snapshot()["stages"]["write"]["processed"] == 6
+
+
+def test_fetch_busy_time_excludes_backpressure(clock):
+    def timed_messages(count):
+        async def source():
+            for i in range(count):
+                clock.now += 1
+                yield {"id": str(i)}
+
+        return source
+
+    async def classify(tenant, message):
+        return message
+
+    async def write(tenant, message):
+        clock.now += 10
+
+    pipeline = MailPipeline(classify, write, tenant_in_flight=1, clock=clock)
+    asyncio.run(pipeline.run({"a": timed_messages(3)}))
+
+    assert pipeline.stats["fetch"].busy_seconds == 3
@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from app.core.metrics import (
+    MetricsMiddleware,
+    TimedQueuePool,
+    http_event_hooks,
+    instrument_engine,
+    render,
+)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_middleware_labels_requests_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"id": item_id}
+
+    before = sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="200")
+    unmatched = sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404")
+    with TestClient(app) as client:
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/missing")
+
+    assert sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="200") == before + 2
+    assert sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") == unmatched + 1
+
+
+def test_engine_instrumentation_times_queries_and_checkouts():
+    engine = create_engine("sqlite://", poolclass=TimedQueuePool)
+    instrument_engine(engine, "test")
+    queries = sample("db_query_duration_seconds_count", engine="test")
+    checkouts = sample("db_pool_checkout_wait_seconds_count", engine="sync")
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+
+    assert sample("db_query_duration_seconds_count", engine="test") == queries + 2
+    assert sample("db_pool_checkout_wait_seconds_count", engine="sync") == checkouts + 1
+
+
+def test_http_event_hooks_time_provider_calls():
+    before = sample("provider_request_duration_seconds_count", provider="test", method="GET", status="204")
+
+    async def call():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(204)),
+            event_hooks=http_event_hooks("test"),
+        ) as client:
+            await client.get("https://provider.test/")
+
+    asyncio.run(call())
+
+    assert sample("provider_request_duration_seconds_count", provider="test", method="GET", status="204") == before + 1
+
+
+def test_render_negotiates_openmetrics():
+    body, content_type = render("application/openmetrics-text; version=1.0.0")
+
+    assert content_type.startswith("application/openmetrics-text")
+    assert body.endswith(b"# EOF\n")
+    assert render(None)[1].startswith("text/plain")
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from sqlalchemy import create_engine, event, text
+
+from app.core import migrate
+
+
+def test_read_heads_prefers_baked_file(tmp_path):
+    head_file = tmp_path / "HEAD"
+    head_file.write_text("abc123\n")
+
+    assert migrate.read_heads(head_file) == {"abc123"}
+
+
+def test_read_heads_falls_back_to_scripts(tmp_path):
+    heads = migrate.read_heads(tmp_path / "missing")
+
+    assert heads == migrate.compute_heads()
+    assert len(heads) == 1
+
+
+def test_skips_migration_when_schema_is_current(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32))"))
+        conn.execute(text("INSERT INTO alembic_version VALUES ('abc123')"))
+    engine.dispose()
+
+    def fail_upgrade(conn):
+        raise AssertionError("should not migrate")
+
+    monkeypatch.setattr(migrate, "upgrade", fail_upgrade)
+
+    assert migrate.ensure_schema_current(url, {"abc123"}) is False
+
+
+def test_migrates_on_the_apps_connection(monkeypatch):
+    migrated = []
+
+    class FakeConnection:
+        async def run_sync(self, fn, *args):
+            return fn("sync-connection", *args)
+
+    class FakeEngine:
+        @asynccontextmanager
+        async def connect(self):
+            yield FakeConnection()
+
+    def migrate_connection(conn, heads):
+        migrated.append((conn, heads))
+        return True
+
+    monkeypatch.setattr(migrate, "migrate_connection", migrate_connection)
+
+    assert asyncio.run(migrate.ensure_schema_current_async(FakeEngine(), {"abc123"})) is True
+    assert migrated == [("sync-connection", {"abc123"})]
+
+
+def test_migrating_in_process_keeps_the_apps_logging(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    locks = []
+
+    @event.listens_for(engine, "connect")
+    def register_advisory_lock(dbapi_connection, connection_record):
+        dbapi_connection.create_function("pg_advisory_xact_lock", 1, locks.append)
+
+    # One revision behind: only the (SQLite-compatible) outbox table is created.
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32))"))
+        conn.execute(text("INSERT INTO alembic_version VALUES ('e4a7b2c9d815')"))
+
+    root = logging.getLogger()
+    handler = logging.NullHandler()
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    try:
+        with engine.connect() as conn:
+            assert migrate.migrate_connection(conn, {"a7c5e3f91b02"}) is True
+            assert migrate.current_revisions(conn) == {"a7c5e3f91b02"}
+        assert locks == [migrate.MIGRATION_LOCK_ID]
+        assert handler in root.handlers
+        assert root.level == logging.INFO
+        assert not logging.getLogger(migrate.__name__).disabled
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(level)
+        engine.dispose()
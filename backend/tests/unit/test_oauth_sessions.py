@@ -0,0 +1,76 @@
+import asyncio
+
+from app.services.oauth_sessions import (
+    InMemoryOAuthSessionStore,
+    OAuthSession,
+    RedisOAuthSessionStore,
+)
+
+
+class FakeRedis:
+    """Implements the subset of the redis.asyncio client the store uses."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    async def set(self, name, value, ex=None):
+        self.data[name] = (value, self.clock() + ex if ex else None)
+
+    async def getdel(self, name):
+        value, expires_at = self.data.pop(name, (None, None))
+        if expires_at is not None and expires_at <= self.clock():
+            return None
+        return value
+
+
+def make_session(clock, user_id="uid-1", service="outlook"):
+    return OAuthSession(user_id=user_id, service=service, created_at=clock())
+
+
+def test_in_memory_store_pop_is_single_use(clock):
+    store = InMemoryOAuthSessionStore(ttl_seconds=60, max_entries=10, clock=clock)
+    asyncio.run(store.put("token", make_session(clock)))
+
+    session = asyncio.run(store.pop("token"))
+
+    assert session.user_id == "uid-1"
+    assert session.service == "outlook"
+    assert asyncio.run(store.pop("token")) is None
+
+def test_in_memory_store_expires_sessions(clock):
+    store = InMemoryOAuthSessionStore(ttl_seconds=60, max_entries=10, clock=clock)
+    asyncio.run(store.put("old", make_session(clock)))
+    clock.now += 61
+
+    assert asyncio.run(store.pop("old")) is None
+
+def test_in_memory_store_sweeps_expired_sessions_on_put(clock):
+    store = InMemoryOAuthSessionStore(ttl_seconds=60, max_entries=10, clock=clock)
+    for i in range(5):
+        asyncio.run(store.put(f"old-{i}", make_session(clock)))
+    clock.now += 61
+    asyncio.run(store.put("new", make_session(clock)))
+
+    assert len(store) == 1
+
+def test_in_memory_store_drops_oldest_sessions_over_capacity(clock):
+    store = InMemoryOAuthSessionStore(ttl_seconds=60, max_entries=2, clock=clock)
+    for token in ("a", "b", "c"):
+        asyncio.run(store.put(token, make_session(clock)))
+
+    assert len(store) == 2
+    assert asyncio.run(store.pop("a")) is None
+    assert asyncio.run(store.pop("c")) is not None
+
+def test_redis_store_round_trip_and_expiry(clock):
+    store = RedisOAuthSessionStore(FakeRedis(clock), ttl_seconds=60)
+    asyncio.run(store.put("token", make_session(clock, service="pipedrive")))
+    asyncio.run(store.put("expiring", make_session(clock)))
+
+    session = asyncio.run(store.pop("token"))
+    assert session == OAuthSession(user_id="uid-1", service="pipedrive", created_at=clock.now)
+    assert asyncio.run(store.pop("token")) is None
+
+    clock.now += 61
+    assert asyncio.run(store.pop("expiring")) is None
@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import Delete
+
+from app.services.outbox import (
+    FakeBroker,
+    OutboxDispatcher,
+    OutboxMessage,
+    QueueSink,
+)
+
+
+def compile_sql(statement):
+    return str(
+        statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    )
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return iter(self.rows)
+
+
+class FakeTransaction:
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, *exc_info):
+        self.db.outcomes.append("rollback" if exc_type else "commit")
+        return False
+
+
+class FakeOutboxDB:
+    """Serves the oldest pending events for a claiming SELECT, records DELETEs."""
+
+    def __init__(self, count):
+        self.events = [
+            SimpleNamespace(
+                id=i,
+                event_type="credential_connected",
+                key=f"uid-{i}",
+                payload={"n": i},
+                created_at=datetime(2026, 1, 1),
+            )
+            for i in range(1, count + 1)
+        ]
+        self.statements = []
+        self.outcomes = []
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def begin(self):
+        return FakeTransaction(self)
+
+    async def execute(self, statement):
+        self.statements.append(compile_sql(statement))
+        if isinstance(statement, Delete):
+            return None
+        return FakeResult(self.events[: statement._limit])
+
+
+class RecordingSink:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def publish(self, messages):
+        if self.fail:
+            raise RuntimeError("broker unavailable")
+        self.batches.append([message.id for message in messages])
+
+
+def make_dispatcher(db, sink, batch_size=2):
+    settings = SimpleNamespace(OUTBOX_BATCH_SIZE=batch_size, OUTBOX_POLL_INTERVAL_SECONDS=0)
+    return OutboxDispatcher(db, sink, settings)
+
+
+def message(id, event_type="credential_connected"):
+    return OutboxMessage(id, event_type, "uid", {}, datetime(2026, 1, 1))
+
+
+def test_dispatch_claims_publishes_and_bulk_deletes_a_batch():
+    db = FakeOutboxDB(count=3)
+    sink = RecordingSink()
+
+    assert asyncio.run(make_dispatcher(db, sink).dispatch_batch()) == 2
+
+    select_sql, delete_sql = db.statements
+    assert "ORDER BY outbox_events.id" in select_sql
+    assert "FOR UPDATE SKIP LOCKED" in select_sql
+    assert "DELETE FROM outbox_events WHERE outbox_events.id IN (1, 2)" in delete_sql
+    assert sink.batches == [[1, 2]]
+    assert db.outcomes == ["commit"]
+
+def test_failed_publish_keeps_the_batch():
+    db = FakeOutboxDB(count=2)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(make_dispatcher(db, RecordingSink(fail=True)).dispatch_batch())
+
+    assert not any(sql.startswith("DELETE") for sql in db.statements)
+    assert db.outcomes == ["rollback"]
+
+def test_empty_outbox_publishes_nothing():
+    sink = RecordingSink()
+    assert asyncio.run(make_dispatcher(FakeOutboxDB(count=0), sink).dispatch_batch()) == 0
+    assert sink.batches == []
+
+def test_queue_sink_accepts_whole_batches_only():
+    async def scenario():
+        sink = QueueSink(maxsize=3)
+        await sink.publish([message(1), message(2)])
+        with pytest.raises(asyncio.QueueFull):
+            await sink.publish([message(3), message(4)])
+        return [sink.queue.get_nowait().id for _ in range(sink.queue.qsize())]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+def test_fake_broker_delivers_to_subscribers_of_each_event_type():
+    broker = FakeBroker()
+    received = []
+
+    async def handler(event):
+        received.append(event.id)
+
+    broker.subscribe("credential_connected", handler)
+    asyncio.run(broker.publish([message(1), message(2, "user_provisioned"), message(3)]))
+
+    assert received == [1, 3]
+    assert broker.published == 3
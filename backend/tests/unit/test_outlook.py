@@ -0,0 +1,172 @@
+import asyncio
+import json
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import pytest
+
+from app.models.database import Credential
+from app.services.credentials import get_credential_for_firebase_uid
+from app.services.encryption import get_keyring
+from app.services.outlook import MailboxSync, OutlookAPIError, OutlookService
+
+GRAPH_URL = "https://graph.test/v1.0"
+
+
+class FakeGraph:
+    """Minimal stand-in for the Graph mail endpoints used by OutlookService."""
+
+    def __init__(self, messages, page_size=2):
+        self.messages = messages
+        self.page_size = page_size
+        self.requests = []
+        self.throttle_once = set()
+        self.expired_tokens = set()
+
+    def __call__(self, request):
+        self.requests.append(request)
+        path = request.url.path.removeprefix("/v1.0")
+        if path == "/$batch":
+            payload = json.loads(request.content)["requests"]
+            assert len(payload) <= 20
+            return httpx.Response(
+                200, json={"responses": [self.handle_batched(item) for item in reversed(payload)]}
+            )
+        if path == "/me/mailFolders/inbox/messages/delta":
+            return self.delta(request.url.params)
+        return httpx.Response(404)
+
+    def handle_batched(self, item):
+        url = urlparse(item["url"])
+        message_id = url.path.rsplit("/", 1)[-1]
+        if message_id in self.throttle_once:
+            self.throttle_once.discard(message_id)
+            return {"id": item["id"], "status": 429, "headers": {"Retry-After": "0"}}
+        for message in self.messages:
+            if message["id"] == message_id:
+                fields = parse_qs(url.query)["$select"][0].split(",")
+                body = {key: message[key] for key in fields if key in message}
+                return {"id": item["id"], "status": 200, "body": body}
+        return {"id": item["id"], "status": 404, "body": {"error": {"code": "ErrorItemNotFound"}}}
+
+    def delta(self, params):
+        token = params.get("$deltatoken")
+        if token in self.expired_tokens:
+            return httpx.Response(410, json={"error": {"code": "SyncStateNotFound"}})
+        since = int(token) if token else 0
+        start = int(params.get("$skiptoken", since))
+        changed = self.messages[start:start + self.page_size]
+        end = start + len(changed)
+        base = f"{GRAPH_URL}/me/mailFolders/inbox/messages/delta"
+        body = {"value": changed}
+        if end < len(self.messages):
+            body["@odata.nextLink"] = f"{base}?$skiptoken={end}"
+        else:
+            body["@odata.deltaLink"] = f"{base}?$deltatoken={end}"
+        return httpx.Response(200, json=body)
+
+
+def make_service(graph):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(graph))
+    return OutlookService(client, "access-token", base_url=GRAPH_URL, backoff_seconds=0)
+
+
+def collect_pages(service, delta_link=None):
+    async def run():
+        return [page async for page in service.iter_delta_pages(delta_link)]
+
+    return asyncio.run(run())
+
+
+def test_batch_sends_at_most_20_requests_per_call_in_order():
+    graph = FakeGraph([{"id": f"m{i}", "subject": f"Subject {i}"} for i in range(45)])
+    service = make_service(graph)
+
+    messages = asyncio.run(service.get_messages([f"m{i}" for i in range(45)] + ["missing"]))
+
+    assert len(graph.requests) == 3
+    assert [message["subject"] for message in messages[:45]] == [
+        f"Subject {i}" for i in range(45)
+    ]
+    assert messages[45] is None
+    assert graph.requests[0].headers["Authorization"] == "Bearer access-token"
+
+
+def test_batch_resends_only_throttled_requests():
+    graph = FakeGraph([{"id": f"m{i}", "subject": f"Subject {i}"} for i in range(3)])
+    graph.throttle_once = {"m1"}
+    service = make_service(graph)
+
+    messages = asyncio.run(service.get_messages(["m0", "m1", "m2"]))
+
+    assert [message["id"] for message in messages] == ["m0", "m1", "m2"]
+    retried = json.loads(graph.requests[1].content)["requests"]
+    assert [item["url"].split("?")[0] for item in retried] == ["/me/messages/m1"]
+
+
+def test_delta_sync_follows_next_links_and_resumes_from_delta_link():
+    graph = FakeGraph([{"id": f"m{i}"} for i in range(5)])
+    service = make_service(graph)
+
+    pages = collect_pages(service)
+    assert [len(page.messages) for page in pages] == [2, 2, 1]
+    assert [page.delta_link for page in pages[:-1]] == [None, None]
+    assert "$select" in graph.requests[0].url.params
+    assert graph.requests[0].headers["Prefer"] == "odata.maxpagesize=50"
+
+    graph.messages.append({"id": "m5"})
+    pages = collect_pages(service, pages[-1].delta_link)
+    assert [message["id"] for page in pages for message in page.messages] == ["m5"]
+    assert pages[-1].delta_link.endswith("$deltatoken=6")
+
+
+def test_delta_sync_restarts_when_delta_link_expired():
+    graph = FakeGraph([{"id": f"m{i}"} for i in range(3)])
+    graph.expired_tokens = {"2"}
+    service = make_service(graph)
+
+    pages = collect_pages(service, f"{GRAPH_URL}/me/mailFolders/inbox/messages/delta?$deltatoken=2")
+
+    assert [message["id"] for page in pages for message in page.messages] == ["m0", "m1", "m2"]
+
+
+def test_request_raises_on_client_errors():
+    service = make_service(lambda request: httpx.Response(401, text="unauthorized"))
+
+    with pytest.raises(OutlookAPIError) as exc_info:
+        asyncio.run(service.request("GET", "me"))
+
+    assert exc_info.value.status_code == 401
+
+
+def test_mailbox_sync_keeps_a_reconnect_from_being_overwritten(credentials_db):
+    credential_id = credentials_db.add_credential("uid-1", service_name="outlook")
+
+    def stored_delta_link():
+        with credentials_db.engine.connect() as conn:
+            return conn.execute(
+                Credential.__table__.select()
+                .with_only_columns(Credential.delta_link)
+                .where(Credential.id == credential_id)
+            ).scalar_one()
+
+    async def sync_once(delta_link, during_sync=None):
+        async with credentials_db.session_factory() as db:
+            credential = await get_credential_for_firebase_uid(db, "uid-1", "outlook")
+        sync = MailboxSync(None, credential)
+        sync.delta_link = delta_link
+        if during_sync is not None:
+            during_sync()
+        async with credentials_db.session_factory() as db:
+            await sync.commit(db)
+
+    asyncio.run(sync_once("delta-1"))
+    assert stored_delta_link() == "delta-1"
+
+    def reconnect():
+        credentials_db.update_credential(
+            credential_id, refresh_token=get_keyring().encrypt("other-mailbox"), delta_link=None
+        )
+
+    asyncio.run(sync_once("delta-2", during_sync=reconnect))
+    assert stored_delta_link() is None
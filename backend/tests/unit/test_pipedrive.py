@@ -0,0 +1,143 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import pipedrive
+from app.services.pipedrive import PipedriveAPIError, PipedriveService
+from app.services.response_cache import ProviderResponseCache
+from app.utils.rate_limit import TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def reset_buckets():
+    pipedrive._company_buckets.clear()
+    yield
+    pipedrive._company_buckets.clear()
+
+
+def make_service(handler, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    kwargs.setdefault("backoff_seconds", 0)
+    return PipedriveService(client, "access-token", base_url="https://pipedrive.test/v1", **kwargs)
+
+
+def test_get_current_user_learns_company():
+    def handler(request):
+        assert request.headers["Authorization"] == "Bearer access-token"
+        assert request.url.path == "/v1/users/me"
+        return httpx.Response(200, json={"data": {"name": "Ada", "company_id": 42}})
+
+    service = make_service(handler)
+    user = asyncio.run(service.get_current_user())
+
+    assert user["name"] == "Ada"
+    assert service.company_id == "42"
+
+def test_retries_rate_limited_requests():
+    responses = iter(
+        [
+            httpx.Response(429, headers={"Retry-After": "0"}),
+            httpx.Response(503),
+            httpx.Response(200, json={"data": {"name": "Ada"}}),
+        ]
+    )
+    service = make_service(lambda request: next(responses))
+
+    assert asyncio.run(service.get_current_user())["name"] == "Ada"
+
+def test_raises_after_exhausting_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500, text="boom")
+
+    service = make_service(handler, max_retries=2)
+    with pytest.raises(PipedriveAPIError) as exc_info:
+        asyncio.run(service.get("deals"))
+
+    assert exc_info.value.status_code == 500
+    assert len(calls) == 3
+
+def test_does_not_retry_non_idempotent_server_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    service = make_service(handler)
+    with pytest.raises(PipedriveAPIError):
+        asyncio.run(service.request("POST", "deals", json={"title": "Deal"}))
+
+    assert len(calls) == 1
+
+def test_iter_deals_streams_all_pages():
+    def handler(request):
+        start = int(request.url.params["start"])
+        assert request.url.params["status"] == "open"
+        items = [{"id": i} for i in range(start, min(start + 2, 5))]
+        more = start + 2 < 5
+        return httpx.Response(
+            200,
+            json={
+                "data": items,
+                "additional_data": {
+                    "pagination": {"more_items_in_collection": more, "next_start": start + 2}
+                },
+            },
+        )
+
+    service = make_service(handler)
+
+    async def collect():
+        return [deal["id"] async for deal in service.iter_collection("deals", {"status": "open"}, page_size=2)]
+
+    assert asyncio.run(collect()) == [0, 1, 2, 3, 4]
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(capacity=2, refill_rate=1, clock=clock)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(1.0)
+    clock.now += 1
+    assert bucket.try_acquire() == 0
+
+def test_token_bucket_sync_with_server_limits(clock):
+    bucket = TokenBucket(capacity=10, refill_rate=5, clock=clock)
+
+    bucket.sync(remaining=0, reset_after=3)
+
+    assert bucket.try_acquire() == pytest.approx(3.0)
+    clock.now += 3
+    assert bucket.try_acquire() == 0
+
+def test_current_user_is_cached_per_tenant_and_revalidated_with_etag(clock):
+    calls = []
+
+    def handler(request):
+        calls.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(
+            200, json={"data": {"name": "Ada", "company_id": 42}}, headers={"ETag": '"v1"'}
+        )
+
+    cache = ProviderResponseCache(
+        max_entries=10, max_bytes=1024, ttl_seconds=60, stale_seconds=0, clock=clock
+    )
+
+    async def scenario():
+        await make_service(handler, tenant="uid-1", cache=cache).get_current_user()
+        service = make_service(handler, tenant="uid-1", cache=cache)
+        user = await service.get_current_user()
+        clock.now += 60
+        await service.get_current_user()
+        return service, user
+
+    service, user = asyncio.run(scenario())
+    assert user["name"] == "Ada"
+    assert service.company_id == "42"
+    assert calls == [None, '"v1"']
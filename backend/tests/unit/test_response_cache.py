@@ -0,0 +1,151 @@
+import asyncio
+
+import httpx
+
+from app.services.response_cache import ProviderResponseCache
+
+
+class FakeProvider:
+    """Serves a JSON resource with an ETag, answering 304 when it matches."""
+
+    def __init__(self, body=b'{"name": "Ada"}', etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    async def fetch(self, headers):
+        self.requests.append(headers)
+        if self.etag and headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        return httpx.Response(200, content=self.body, headers={"ETag": self.etag})
+
+
+def make_cache(clock, **kwargs):
+    kwargs.setdefault("max_entries", 10)
+    kwargs.setdefault("max_bytes", 1024)
+    return ProviderResponseCache(ttl_seconds=60, stale_seconds=30, clock=clock, **kwargs)
+
+
+def test_fresh_entries_are_served_without_contacting_the_provider(clock):
+    cache = make_cache(clock)
+    provider = FakeProvider()
+
+    async def scenario():
+        first = await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+        first["name"] = "changed"
+        clock.now += 59
+        return await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+
+    assert asyncio.run(scenario()) == {"name": "Ada"}
+    assert provider.requests == [{}]
+
+def test_entries_are_partitioned_by_tenant(clock):
+    cache = make_cache(clock)
+    provider = FakeProvider()
+
+    async def scenario():
+        await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+        await cache.get("pipedrive", "tenant-b", "/users/me", provider.fetch)
+
+    asyncio.run(scenario())
+    assert len(provider.requests) == 2
+
+    cache.invalidate_tenant("tenant-a")
+    assert len(cache) == 1
+
+def test_stale_entries_are_served_while_revalidating_with_etag(clock):
+    cache = make_cache(clock)
+    provider = FakeProvider()
+
+    async def scenario():
+        await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+        clock.now += 70
+        provider.body, provider.etag = b'{"name": "Grace"}', '"v2"'
+        stale = await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+        # Let the background revalidation finish.
+        await asyncio.sleep(0.01)
+        fresh = await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale == {"name": "Ada"}
+    assert fresh == {"name": "Grace"}
+    assert provider.requests == [{}, {"If-None-Match": '"v1"'}]
+
+def test_revalidation_in_flight_during_invalidation_is_not_stored(clock):
+    cache = make_cache(clock)
+    old_account = FakeProvider()
+    new_account = FakeProvider(body=b'{"name": "Grace"}', etag='"v2"')
+    release = asyncio.Event()
+
+    async def slow_old_fetch(headers):
+        await release.wait()
+        return await old_account.fetch(headers)
+
+    async def scenario():
+        await cache.get("pipedrive", "tenant-a", "/users/me", old_account.fetch)
+        clock.now += 70
+        await cache.get("pipedrive", "tenant-a", "/users/me", slow_old_fetch)
+        await asyncio.sleep(0)
+        cache.invalidate_tenant("tenant-a")
+        release.set()
+        await asyncio.sleep(0.01)
+        return await cache.get("pipedrive", "tenant-a", "/users/me", new_account.fetch)
+
+    assert asyncio.run(scenario()) == {"name": "Grace"}
+    assert len(old_account.requests) == 2
+    assert new_account.requests == [{}]
+
+def test_expired_entries_are_revalidated_inline_and_kept_on_304(clock):
+    cache = make_cache(clock)
+    provider = FakeProvider()
+
+    async def scenario():
+        await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+        clock.now += 100
+        body = await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+        clock.now += 59
+        await cache.get("pipedrive", "tenant-a", "/users/me", provider.fetch)
+        return body
+
+    assert asyncio.run(scenario()) == {"name": "Ada"}
+    assert provider.requests == [{}, {"If-None-Match": '"v1"'}]
+
+def test_concurrent_misses_share_one_request(clock):
+    cache = make_cache(clock)
+    calls = []
+
+    async def fetch(headers):
+        calls.append(headers)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"ok": True})
+
+    async def scenario():
+        return await asyncio.gather(
+            *(cache.get("pipedrive", "tenant-a", "/pipelines", fetch) for _ in range(5))
+        )
+
+    assert asyncio.run(scenario()) == [{"ok": True}] * 5
+    assert len(calls) == 1
+
+def test_least_recently_used_entries_are_evicted_by_count_and_size(clock):
+    cache = make_cache(clock, max_entries=2, max_bytes=40)
+
+    async def fetch(headers):
+        return httpx.Response(200, content=b'{"data": "0123456789"}')
+
+    async def scenario():
+        await cache.get("pipedrive", "tenant-a", "/a", fetch)
+        await cache.get("pipedrive", "tenant-a", "/b", fetch)
+        return len(cache), cache.size_bytes
+
+    assert asyncio.run(scenario()) == (1, 22)
+
+def test_no_store_responses_are_not_cached(clock):
+    cache = make_cache(clock)
+
+    async def fetch(headers):
+        return httpx.Response(200, json={}, headers={"Cache-Control": "no-store"})
+
+    asyncio.run(cache.get("pipedrive", "tenant-a", "/a", fetch))
+    assert len(cache) == 0
@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils.retry import RetryPolicy, retry_after, send_with_retries
+
+
+def make_sender(*outcomes):
+    calls = []
+
+    async def send():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, headers={"Retry-After": "0"})
+
+    return send, calls
+
+
+def test_retry_after_is_read_case_insensitively():
+    assert retry_after(httpx.Headers({"Retry-After": "2"})) == 2.0
+    assert retry_after({"retry-after": "3"}) == 3.0
+    assert retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) is None
+    assert retry_after({}) is None
+
+def test_policy_decides_per_status_and_idempotency():
+    policy = RetryPolicy(max_retries=3, backoff_seconds=0, retry_status_codes=frozenset({500}))
+
+    assert policy.is_retryable(429, idempotent=False)
+    assert policy.is_retryable(500, idempotent=True)
+    assert not policy.is_retryable(500, idempotent=False)
+    assert not policy.is_retryable(503, idempotent=True)
+
+def test_returns_the_last_response_once_retries_run_out():
+    send, calls = make_sender(503, 503, 503)
+    policy = RetryPolicy(max_retries=2, backoff_seconds=0)
+
+    response = asyncio.run(send_with_retries(send, policy, True, "test"))
+
+    assert response.status_code == 503
+    assert len(calls) == 3
+
+def test_transport_errors_are_only_retried_for_idempotent_requests():
+    policy = RetryPolicy(max_retries=2, backoff_seconds=0)
+    send, calls = make_sender(httpx.ConnectError("reset"), 200)
+    assert asyncio.run(send_with_retries(send, policy, True, "test")).status_code == 200
+
+    send, calls = make_sender(httpx.ConnectError("reset"), 200)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(send_with_retries(send, policy, False, "test"))
+    assert len(calls) == 1
@@ -0,0 +1,89 @@
+import asyncio
+
+from app.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def refresh():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "token"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", refresh) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["token"] * 10
+    assert len(calls) == 1
+    assert len(flight) == 0
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    calls = []
+
+    async def refresh(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("a", lambda: refresh("a")), flight.do("b", lambda: refresh("b"))
+        )
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+def test_waiters_receive_the_exception():
+    flight = SingleFlight()
+
+    async def refresh():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("refresh failed")
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do("key", refresh) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(flight) == 0
+
+def test_key_runs_again_after_completion():
+    flight = SingleFlight()
+    calls = []
+
+    async def refresh():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        first = await flight.do("key", refresh)
+        second = await flight.do("key", refresh)
+        return first, second
+
+    assert asyncio.run(main()) == (1, 2)
+
+def test_cancelling_the_first_caller_does_not_fail_the_others():
+    flight = SingleFlight()
+    calls = []
+
+    async def refresh():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "token"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("key", refresh))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", refresh))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await waiter, leader.cancelled()
+
+    assert asyncio.run(main()) == ("token", True)
+    assert len(calls) == 1
+    assert len(flight) == 0
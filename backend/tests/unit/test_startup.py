@@ -0,0 +1,42 @@
+import sys
+
+import _frozen_importlib
+
+from app.core.startup import StartupReport, import_timing_enabled
+
+
+def test_phases_and_marks_are_timed(clock):
+    report = StartupReport(clock=clock)
+
+    clock.now = 0.5
+    report.mark("imports")
+    with report.phase("warm_up"):
+        clock.now = 0.75
+
+    phases = report.as_dict()["phases_ms"]
+    assert phases == {"imports": 500.0, "warm_up": 250.0}
+
+
+def test_tracks_imports_until_stopped():
+    original = _frozen_importlib._find_and_load
+    sys.modules.pop("colorsys", None)
+    report = StartupReport()
+
+    report.track_imports()
+    try:
+        import colorsys  # noqa: F401
+    finally:
+        report.stop_tracking_imports()
+
+    assert _frozen_importlib._find_and_load is original
+    own, cumulative = report.imports["colorsys"]
+    assert 0 <= own <= cumulative
+    assert report.as_dict()["modules_imported"] == len(report.imports)
+
+
+def test_import_timing_is_off_unless_enabled(monkeypatch):
+    monkeypatch.delenv("STARTUP_IMPORT_TIMING", raising=False)
+    assert not import_timing_enabled()
+
+    monkeypatch.setenv("STARTUP_IMPORT_TIMING", "1")
+    assert import_timing_enabled()
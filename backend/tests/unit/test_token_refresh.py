@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.services.encryption import get_keyring
+from app.services.token_refresh import TokenRefreshScheduler
+
+
+class FakeProvider:
+    """Rotates refresh tokens like Microsoft and Pipedrive do."""
+
+    def __init__(self, fail_for=(), during_refresh=None):
+        self.calls = []
+        self.fail_for = set(fail_for)
+        self.during_refresh = during_refresh
+
+    async def __call__(self, client, service_name, refresh_token):
+        self.calls.append(refresh_token)
+        if self.during_refresh is not None:
+            self.during_refresh(refresh_token)
+        if refresh_token in self.fail_for:
+            raise RuntimeError("invalid_grant")
+        return {
+            "access_token": f"new-access-{refresh_token}",
+            "refresh_token": f"new-{refresh_token}",
+            "expires_in": 3600,
+        }
+
+
+def make_scheduler(credentials_db, provider, concurrency=2):
+    settings = SimpleNamespace(
+        TOKEN_REFRESH_INTERVAL_SECONDS=60,
+        TOKEN_REFRESH_WINDOW_SECONDS=600,
+        TOKEN_REFRESH_BATCH_SIZE=10,
+        TOKEN_REFRESH_CONCURRENCY=concurrency,
+        TOKEN_REFRESH_JITTER_SECONDS=0,
+        TOKEN_REFRESH_TIMEOUT_SECONDS=5,
+    )
+    http_clients = SimpleNamespace(for_service=lambda service_name: None)
+    return TokenRefreshScheduler(
+        credentials_db.session_factory, http_clients, settings, refresh_func=provider
+    )
+
+
+def test_refreshes_only_credentials_expiring_within_the_window(credentials_db):
+    due = credentials_db.add_credential("uid-1", refresh_token="due")
+    later = credentials_db.add_credential("uid-2", expires_in=3600, refresh_token="later")
+    credentials_db.add_credential("uid-3", refresh_token=None)
+    credentials_db.add_credential("uid-4", service_name="other", refresh_token="unknown")
+    provider = FakeProvider()
+
+    assert asyncio.run(make_scheduler(credentials_db, provider).refresh_due()) == 1
+
+    assert provider.calls == ["due"]
+    assert credentials_db.tokens(due) == ("new-access-due", "new-due")
+    assert credentials_db.tokens(later) == ("access", "later")
+
+def test_failed_credentials_are_backed_off(credentials_db):
+    failing = credentials_db.add_credential("uid-1", refresh_token="revoked")
+    working = credentials_db.add_credential("uid-2", refresh_token="valid")
+    provider = FakeProvider(fail_for={"revoked"})
+    scheduler = make_scheduler(credentials_db, provider)
+
+    assert asyncio.run(scheduler.refresh_due()) == 1
+    assert credentials_db.tokens(failing) == ("access", "revoked")
+    assert credentials_db.tokens(working) == ("new-access-valid", "new-valid")
+
+    # Move the refreshed one back into the window: only it is retried.
+    credentials_db.update_credential(working, expires_at=datetime.utcnow())
+    provider.calls.clear()
+    assert asyncio.run(scheduler.refresh_due()) == 1
+    assert provider.calls == ["new-valid"]
+
+def test_refresh_does_not_overwrite_a_concurrent_reconnect(credentials_db):
+    credential_id = credentials_db.add_credential("uid-1", refresh_token="old")
+    keyring = get_keyring()
+
+    def reconnect(_):
+        # save_credential takes no lock, so it can land mid-refresh.
+        credentials_db.update_credential(
+            credential_id,
+            access_token=keyring.encrypt("reconnected"),
+            refresh_token=keyring.encrypt("reconnected-refresh"),
+        )
+
+    provider = FakeProvider(during_refresh=reconnect)
+    assert asyncio.run(make_scheduler(credentials_db, provider).refresh_due()) == 0
+
+    assert credentials_db.tokens(credential_id) == ("reconnected", "reconnected-refresh")
+
+def test_credentials_locked_elsewhere_are_skipped_without_backoff(credentials_db):
+    credential_id = credentials_db.add_credential("uid-1", refresh_token="busy")
+    credentials_db.held_locks.add(credential_id)
+    provider = FakeProvider()
+    scheduler = make_scheduler(credentials_db, provider)
+
+    assert asyncio.run(scheduler.refresh_due()) == 0
+    assert provider.calls == []
+
+    credentials_db.held_locks.clear()
+    assert asyncio.run(scheduler.refresh_due()) == 1
+    assert provider.calls == ["busy"]
+
+def test_credential_refreshed_by_the_lock_holder_is_not_refreshed_again(credentials_db):
+    credential_id = credentials_db.add_credential("uid-1", refresh_token="old")
+    scheduler = make_scheduler(credentials_db, FakeProvider())
+    due = asyncio.run(scheduler._load_due())
+    # Refreshed by a request between the scheduler's read and its lock.
+    credentials_db.update_credential(
+        credential_id, refresh_token=get_keyring().encrypt("rotated")
+    )
+
+    assert asyncio.run(scheduler._refresh_locked(due[0])) is False
+    assert credentials_db.tokens(credential_id) == ("access", "rotated")
+
+def test_each_credential_is_committed_as_soon_as_it_is_refreshed(credentials_db):
+    first = credentials_db.add_credential("uid-1", refresh_token="first")
+    credentials_db.add_credential("uid-2", expires_in=120, refresh_token="second")
+    seen = []
+
+    def check_first_saved(refresh_token):
+        if refresh_token == "second":
+            seen.append(credentials_db.tokens(first))
+
+    provider = FakeProvider(fail_for={"second"}, during_refresh=check_first_saved)
+    asyncio.run(make_scheduler(credentials_db, provider, concurrency=1).refresh_due())
+
+    assert seen == [("new-access-first", "new-first")]
+    assert credentials_db.tokens(first) == ("new-access-first", "new-first")
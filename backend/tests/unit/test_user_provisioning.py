@@ -0,0 +1,104 @@
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import get_settings
+from app.services import user_provisioning
+from app.services.credentials import upsert_user
+from app.services.user_provisioning import ProvisionedUsers, ensure_user
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class FakeSession:
+    def __init__(self, user_id=1):
+        self.user_id = user_id
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return FakeResult(self.user_id)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def test_provisioned_user_matches_same_or_missing_email():
+    users = ProvisionedUsers(max_entries=10, ttl_seconds=60)
+    assert not users.is_current("uid-1", "a@example.com")
+
+    users.add("uid-1", "a@example.com")
+    assert users.is_current("uid-1", "a@example.com")
+    assert users.is_current("uid-1", None)
+    assert not users.is_current("uid-1", "b@example.com")
+
+
+def test_provisioned_user_expires_after_ttl(clock):
+    users = ProvisionedUsers(max_entries=10, ttl_seconds=60, clock=clock)
+    users.add("uid-1", None)
+    assert users.is_current("uid-1", None)
+    assert not users.is_current("uid-1", "a@example.com")
+
+    clock.now += 60
+    assert not users.is_current("uid-1", None)
+
+
+def test_ensure_user_only_writes_when_unknown_or_changed(monkeypatch):
+    users = ProvisionedUsers(max_entries=10, ttl_seconds=60)
+    monkeypatch.setattr(user_provisioning, "get_provisioned_users", lambda: users)
+    sessions = []
+
+    def session_factory():
+        sessions.append(FakeSession())
+        return sessions[-1]
+
+    async def scenario():
+        assert await ensure_user("uid-1", "a@example.com", session_factory)
+        assert not await ensure_user("uid-1", "a@example.com", session_factory)
+        assert not await ensure_user("uid-1", None, session_factory)
+        assert await ensure_user("uid-1", "b@example.com", session_factory)
+
+    asyncio.run(scenario())
+    assert len(sessions) == 2
+    assert all(session.commits == 1 for session in sessions)
+
+
+def test_upsert_user_only_updates_a_changed_email(monkeypatch):
+    monkeypatch.setattr(get_settings(), "OUTBOX_DISPATCH_ENABLED", True)
+    db = FakeSession()
+    asyncio.run(upsert_user(db, "uid-1", "a@example.com"))
+
+    sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (firebase_id) DO UPDATE SET email = excluded.email" in sql
+    assert "WHERE excluded.email IS NOT NULL" in sql
+    assert "users.email IS DISTINCT FROM excluded.email" in sql
+    assert "RETURNING users.id" in sql
+    # The change is announced through the outbox, in the same transaction.
+    assert db.statements[1].table.name == "outbox_events"
+    assert db.commits == 1
+
+
+def test_upsert_user_adds_no_event_when_nothing_changed():
+    db = FakeSession(user_id=None)
+    assert not asyncio.run(upsert_user(db, "uid-1", "a@example.com"))
+    assert len(db.statements) == 1
+
+
+def test_upsert_user_adds_no_event_while_outbox_dispatch_is_disabled(monkeypatch):
+    monkeypatch.setattr(get_settings(), "OUTBOX_DISPATCH_ENABLED", False)
+    db = FakeSession()
+    assert asyncio.run(upsert_user(db, "uid-1", "a@example.com"))
+    assert len(db.statements) == 1
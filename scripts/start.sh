@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # This script is responsible for starting the backend application.
-# Run database migrations before starting the server.
+# The application migrates the database itself as it starts.
 
 # Kill any process running on port 8080
 lsof -t -i :8080 | xargs kill -9 2>/dev/null || true
@@ -16,9 +16,6 @@ if [ -z "$DATABASE_URL" ]; then
   exit 1
 fi
 
-# Run Alembic migrations
-python -m alembic upgrade head
-
 # Start the FastAPI application using Uvicorn
 python -m uvicorn backend.app.main:app --host 0.0.0.0 --port 8080 --log-level info
 